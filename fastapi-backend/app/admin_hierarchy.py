@@ -0,0 +1,231 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.schema import GEOGRAPHY_DTYPE, normalize_geo_name, str_or_none_list
+
+ADMIN_HIERARCHY_CSV = Path(__file__).resolve().parent / "data" / "Geoloction.csv"
+
+# The levels of the two trees, top-down: the administrative divisions and the sales territories.
+ADMIN_LEVELS = ["province", "district", "dsDivision", "gnDivision"]
+SALES_LEVELS = ["salesRegion", "salesArea"]
+
+# The column of every level in Geoloction.csv and in the board/POSM frames.
+HIERARCHY_FILE_COLUMNS = {
+    "province": "PROVINCE_N", "district": "DISTRICT_N", "dsDivision": "DSD_N",
+    "gnDivision": "GND_N", "salesRegion": "SALES_REGION", "salesArea": "SALES_AREA",
+}
+FRAME_COLUMNS = {
+    "province": "PROVINCE", "district": "DISTRICT", "dsDivision": "DS_DIVISION",
+    "gnDivision": "GN_DIVISION", "salesRegion": "SALES_REGION", "salesArea": "SALES_AREA",
+}
+
+
+class AdminNode:
+    """One named division; its children are keyed by their normalized names."""
+
+    __slots__ = ("level", "key", "name", "parent", "children")
+
+    def __init__(self, level: str, key: str, name: str, parent: Optional["AdminNode"]):
+        self.level = level
+        self.key = key
+        self.name = name
+        self.parent = parent
+        self.children: Dict[str, "AdminNode"] = {}
+
+
+class AdminHierarchy:
+    """
+    The province → district → DS division → GN division tree and the sales region →
+    sales area tree of Geoloction.csv, keyed by normalized names (as the filters send them).
+
+    Province, district and DS division names are unique across the country, so every
+    node of those levels (and of the sales regions) is also kept in one dictionary per
+    level: looking up the children of a filter value, or checking that it exists, is a
+    single dictionary lookup. GN division names repeat across DS divisions; they are
+    resolved by their full path, or by name alone where it is unique.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._nodes: Dict[str, Dict[str, AdminNode]] = {level: {} for level in ADMIN_LEVELS + SALES_LEVELS}
+        # GN division → its six names (None where the file is blank or disagrees with itself).
+        self._gn_by_path: Dict[Tuple[str, str, str], Dict[str, Optional[str]]] = {}
+        self._gn_by_name: Dict[str, Optional[Dict[str, Optional[str]]]] = {}
+        # Sales area → the district (and province) it lies in, where that is unique.
+        self._sales_area_district: Dict[str, Optional[Tuple[str, str]]] = {}
+
+        columns = {level: str_or_none_list(df[col]) if col in df.columns else [None] * len(df) for level, col in HIERARCHY_FILE_COLUMNS.items()}
+        for values in zip(*columns.values()):
+            names = {level: name.strip() if name and name.strip() else None for level, name in zip(columns, values)}
+            self._add_path(ADMIN_LEVELS, names)
+            self._add_path(SALES_LEVELS, names)
+            self._add_gn(names)
+            area, district = names["salesArea"], names["district"]
+            if area and district:
+                key = normalize_geo_name(area)
+                place = (names["province"], district)
+                if self._sales_area_district.setdefault(key, place) != place:
+                    self._sales_area_district[key] = None
+
+    def _add_path(self, levels: List[str], names: Dict[str, Optional[str]]) -> None:
+        parent: Optional[AdminNode] = None
+        for level in levels:
+            name = names[level]
+            if not name:
+                return
+            key = normalize_geo_name(name)
+            children = parent.children if parent is not None else self._nodes[level]
+            node = children.get(key)
+            if node is None:
+                node = AdminNode(level, key, name, parent)
+                children[key] = node
+            # GN divisions are only reachable through their DS division (their names repeat).
+            if level != "gnDivision":
+                self._nodes[level].setdefault(key, node)
+            parent = node
+
+    def _add_gn(self, names: Dict[str, Optional[str]]) -> None:
+        if not (names["gnDivision"] and names["dsDivision"] and names["district"]):
+            return
+        path = tuple(normalize_geo_name(names[level]) for level in ("district", "dsDivision", "gnDivision"))
+        record = self._gn_by_path.get(path)
+        if record is None:
+            self._gn_by_path[path] = dict(names)
+        else:
+            # The same GN division listed twice with different sales territories: keep only what agrees.
+            for level in SALES_LEVELS:
+                if record[level] != names[level]:
+                    record[level] = None
+        # A name shared by GN divisions in different places can't be resolved on its own.
+        key = path[2]
+        if key not in self._gn_by_name:
+            self._gn_by_name[key] = self._gn_by_path[path]
+        elif self._gn_by_name[key] is not self._gn_by_path[path]:
+            self._gn_by_name[key] = None
+
+    def node(self, level: str, value: Optional[str]) -> Optional[AdminNode]:
+        """Returns the node of a province, district, DS division or sales region filter value, or None."""
+        if not value:
+            return None
+        return self._nodes.get(level, {}).get(value.lower())
+
+    def is_valid(self, level: str, value: Optional[str]) -> bool:
+        """Whether a filter value names a division of `level` ('all' and empty values always are)."""
+        if not value or value == 'all':
+            return True
+        if level == "gnDivision":
+            return value.lower() in self._gn_by_name
+        return value.lower() in self._nodes.get(level, {})
+
+    def children(self, level: str, value: str) -> List[AdminNode]:
+        """Returns the divisions directly under a filter value (e.g. the districts of a province), by name."""
+        node = self.node(level, value)
+        return sorted(node.children.values(), key=lambda child: child.name) if node is not None else []
+
+    def top_level(self, level: str) -> List[AdminNode]:
+        """Returns the provinces ("province") or the sales regions ("salesRegion"), by name."""
+        return sorted((node for node in self._nodes[level].values() if node.parent is None), key=lambda node: node.name)
+
+    def resolve(self, names: Dict[str, Optional[str]]) -> Dict[str, str]:
+        """
+        Works out the missing levels of one row from the ones it has: the GN division
+        gives every level (through its full path, or its name where that is unique),
+        a DS division or district gives its parents, and a sales area its district and
+        province. Returns only the levels that were missing and could be filled.
+        """
+        keys = {level: normalize_geo_name(name) if name else None for level, name in names.items()}
+        found: Dict[str, Optional[str]] = {}
+
+        if keys["gnDivision"]:
+            record = None
+            if keys["district"] and keys["dsDivision"]:
+                record = self._gn_by_path.get((keys["district"], keys["dsDivision"], keys["gnDivision"]))
+            if record is None:
+                record = self._gn_by_name.get(keys["gnDivision"])
+            # A GN division found by name alone must agree with the levels the row already has.
+            if record is not None and all(
+                not keys[level] or not record[level] or normalize_geo_name(record[level]) == keys[level] for level in ADMIN_LEVELS
+            ):
+                found.update({level: name for level, name in record.items() if name})
+
+        if not found.get("district") and not keys["district"] and keys["salesArea"]:
+            place = self._sales_area_district.get(keys["salesArea"])
+            if place is not None:
+                found["province"], found["district"] = place
+
+        # Walk up from the most specific level of each tree that is known.
+        for level in ("dsDivision", "district", "salesArea"):
+            node = self.node(level, keys[level] or (normalize_geo_name(found[level]) if found.get(level) else None))
+            while node is not None and node.parent is not None:
+                node = node.parent
+                found.setdefault(node.level, node.name)
+
+        return {level: found[level] for level, name in names.items() if not name and found.get(level)}
+
+    def fill_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fills in the blank administrative and sales columns of a board or POSM frame
+        from the hierarchy (see `resolve`). Values already present are kept. Every
+        distinct combination of names is resolved once; a new frame is returned.
+        """
+        columns = {level: col for level, col in FRAME_COLUMNS.items() if col in df.columns}
+        if df.empty or not columns:
+            return df
+        blank = np.zeros(len(df), dtype=bool)
+        for col in columns.values():
+            blank |= df[col].isna().to_numpy()
+        rows = np.flatnonzero(blank)
+        if rows.size == 0:
+            return df
+
+        subset = df.iloc[rows]
+        row_names = zip(*(str_or_none_list(subset[col]) for col in columns.values()))
+        resolved: Dict[tuple, Dict[str, str]] = {}
+        values = {level: None for level in columns}
+        for i, names in enumerate(row_names):
+            fills = resolved.get(names)
+            if fills is None:
+                fills = resolved[names] = self.resolve({**dict.fromkeys(FRAME_COLUMNS), **dict(zip(columns, names))})
+            for level, name in fills.items():
+                if level not in columns:
+                    continue
+                if values[level] is None:
+                    values[level] = df[columns[level]].astype(object).to_numpy(copy=True)
+                values[level][rows[i]] = name
+
+        filled = {
+            columns[level]: pd.Series(column, index=df.index).astype(GEOGRAPHY_DTYPE)
+            for level, column in values.items() if column is not None
+        }
+        return df.assign(**filled) if filled else df
+
+
+# Geoloction.csv never changes while the server runs, so it is read once (at startup)
+# and shared by every dataset version.
+_admin_hierarchy: Optional[AdminHierarchy] = None
+_admin_hierarchy_loaded = False
+_admin_hierarchy_lock = threading.Lock()
+
+
+def load_admin_hierarchy() -> Optional[AdminHierarchy]:
+    """Reads Geoloction.csv on first use. Returns None if it can't be loaded."""
+    global _admin_hierarchy, _admin_hierarchy_loaded
+    if not _admin_hierarchy_loaded:
+        with _admin_hierarchy_lock:
+            if not _admin_hierarchy_loaded:
+                try:
+                    _admin_hierarchy = AdminHierarchy(pd.read_csv(ADMIN_HIERARCHY_CSV, dtype=str))
+                except Exception as e:
+                    print(f"Error loading the administrative hierarchy: {e}")
+                    _admin_hierarchy = None
+                _admin_hierarchy_loaded = True
+    return _admin_hierarchy
+
+
+def fill_admin_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Fills the blank administrative and sales columns of a frame; unchanged without Geoloction.csv."""
+    hierarchy = load_admin_hierarchy()
+    return hierarchy.fill_frame(df) if hierarchy is not None else df
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from app.config import settings
+
+# Rough per-entry bookkeeping cost (key tuple, OrderedDict node), added to the size of the bytes.
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class CachedResponse(NamedTuple):
+    """
+    A serialized response body and the headers that go with it (e.g. the paging headers).
+    `expires_at` (a `time.time()` value) is set for bodies that must not be served after a
+    point in time, such as ones holding presigned URLs.
+    """
+    body: bytes
+    headers: Dict[str, str] = {}
+    expires_at: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + _ENTRY_OVERHEAD_BYTES
+
+
+class ResponseCache:
+    """
+    An in-process LRU cache of serialized responses, bounded by memory size.
+
+    Entries are keyed by a namespace (e.g. "boards"), the dataset version and the
+    normalized filters. When a new dataset version shows up, every entry built from an
+    older version is dropped at once, so a data reload invalidates the cache by itself.
+    Requests that finish on an older snapshot after a reload bypass the cache.
+    Hits and misses are counted per namespace to help size the cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._evictions = 0
+
+    def _check_version(self, version: int) -> bool:
+        """
+        Drops the entries of older versions when a newer one shows up. Returns False for a
+        request still running on an older snapshot, whose responses are neither served nor stored.
+        """
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return True
+
+    def get(self, namespace: str, version: int, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            value = self._entries.get((namespace, key)) if self._check_version(version) else None
+            if value is not None and value.expires_at is not None and value.expires_at <= time.time():
+                self._bytes -= self._entries.pop((namespace, key)).size
+                value = None
+            if value is None:
+                self._misses[namespace] = self._misses.get(namespace, 0) + 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self._hits[namespace] = self._hits.get(namespace, 0) + 1
+            return value
+
+    def put(self, namespace: str, version: int, key: Hashable, value: CachedResponse) -> None:
+        size = value.size
+        if size > self.max_bytes:
+            return  # Too big to ever fit; don't flush everything else for it.
+        with self._lock:
+            if not self._check_version(version):
+                return
+            old = self._entries.pop((namespace, key), None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[(namespace, key)] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = sorted(set(self._hits) | set(self._misses))
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "evictions": self._evictions,
+                "datasetVersion": self._version,
+                "namespaces": {
+                    ns: {"hits": self._hits.get(ns, 0), "misses": self._misses.get(ns, 0)}
+                    for ns in namespaces
+                },
+            }
+
+
+def serialize_response(model_cls: Type[BaseModel], content: Any, exclude: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Validates a response (a model instance or a plain dict) against its response model
+    and returns the JSON bytes, the same way FastAPI would render them.
+    `exclude` leaves out optional fields the request didn't ask for (see `model_dump_json`).
+    """
+    return model_cls.model_validate(content).model_dump_json(exclude=exclude).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model_cls: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model_cls])
+
+
+def serialize_list(model_cls: Type[BaseModel], rows: Iterable[Any]) -> bytes:
+    """Same as `serialize_response`, for a response that is a plain list of `model_cls` items."""
+    adapter = _list_adapter(model_cls)
+    return adapter.dump_json(adapter.validate_python(list(rows)))
+
+
+def normalize_filters(filters: BaseModel, case_insensitive: Iterable[str] = ()) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Turns a filters model into a hashable cache key. Missing values become 'all'
+    (their default meaning) and the fields matched case-insensitively are lower-cased,
+    so requests that are answered the same way share one cache entry.
+    """
+    items = []
+    for name, value in filters.model_dump().items():
+        if value is None or value == "":
+            value = "all"
+        elif name in case_insensitive and isinstance(value, str):
+            value = value.lower()
+        items.append((name, value))
+    return tuple(sorted(items))
+
+
+# Shared by the /boards and /posm/general endpoints.
+response_cache = ResponseCache(max_bytes=settings.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,167 @@
+import gzip
+import zlib
+from typing import Any, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.dataset import DatasetSnapshot
+
+try:
+    import brotli
+except ImportError:  # Without brotli, responses are only gzip-compressed.
+    brotli = None
+
+# The media types worth compressing; images and other binary bodies are left alone.
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "application/geo+json", "application/x-ndjson", "text/")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks the content coding for a request from its Accept-Encoding header: 'br' when
+    brotli is installed and accepted, else 'gzip', else None (no compression).
+    Codings with q=0 are refused, and '*' accepts any coding.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for coding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Compresses a whole body. `best` uses the slowest, smallest settings, for bodies that
+    are compressed once and served many times.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else settings.COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps the output the same for the same body.
+    return gzip.compress(body, compresslevel=9 if best else settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def vary_on_encoding(headers: MutableHeaders) -> None:
+    """Adds Accept-Encoding to the Vary header, once."""
+    vary = [token.strip().lower() for token in headers.get("vary", "").split(",")]
+    if "accept-encoding" not in vary:
+        headers.add_vary_header("Accept-Encoding")
+
+
+class _StreamCompressor:
+    """Compresses a streamed body chunk by chunk, flushing after each so rows arrive as they are sent."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits=31 writes the gzip header and trailer.
+            self._zlib = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.process(data) + (self._brotli.finish() if last else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False  # Already compressed (e.g. a precompressed body).
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_MEDIA_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the coding the client prefers (brotli or gzip).
+
+    A complete body is compressed when it is at least `minimum_size` bytes; a streamed
+    body (e.g. NDJSON) is compressed as it goes, one flushed block per chunk. Responses
+    that already carry a Content-Encoding, such as the precompressed ones of
+    `precompressed_response`, are passed through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether it is worth compressing.
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not is_compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                vary_on_encoding(headers)
+                headers["Content-Encoding"] = encoding
+                compressor = _StreamCompressor(encoding)
+                body = compressor.chunk(body, last=not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            else:
+                body = compressor.chunk(body, last=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def precompressed_response(
+    request: Request, dataset: DatasetSnapshot, key: Hashable, build_body: Callable[[], bytes],
+    media_type: str = "application/json", **response_args: Any
+) -> Response:
+    """
+    Serves a body that is the same for every request on a dataset version (e.g. the
+    district GeoJSON). The body is built once per version under `key`, and compressed
+    once per version and coding, at the best compression level; later requests get
+    the stored bytes.
+    """
+    body = dataset.derived(key, build_body)
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(body) >= settings.COMPRESSION_MIN_BYTES:
+        body = dataset.derived(("compressed", key, encoding), lambda: compress(body, encoding, best=True))
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers, **response_args)
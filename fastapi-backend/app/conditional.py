@@ -0,0 +1,107 @@
+import hashlib
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.compression import negotiate_encoding, vary_on_encoding
+from app.data_loader import get_dataset
+from app.dataset import DatasetSnapshot
+from app.pagination import parse_include
+
+# Endpoints whose responses don't only depend on the dataset: signed image URLs expire,
+# and the diagnostics change with every request.
+ETAG_EXCLUDED_PREFIXES = ("/image-info", "/image-s3-url", "/diagnostics")
+
+
+def _build_id() -> str:
+    """
+    Identifies the deployed code, so that ETags from before a deployment (which may
+    have rendered the same data differently) are not matched by the new code.
+    It is the same in every worker of one deployment.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).resolve().parent.rglob("*.py")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+BUILD_ID = _build_id()
+
+
+def normalize_query(query_string: bytes) -> str:
+    """Sorts the query parameters and drops empty ones, so equivalent URLs share one ETag."""
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=False)
+    return "&".join(f"{key}={value}" for key, value in sorted(params))
+
+
+def compute_etag(snapshot: DatasetSnapshot, path: str, query_string: bytes, encoding: Optional[str]) -> str:
+    """
+    A strong ETag for a GET response: the dataset version (and the source files it was
+    read from, since versions restart with the process), the code, the path, the
+    normalized query and the content coding, which all together fix the response bytes.
+    """
+    key = f"{snapshot.version}|{snapshot.source_fingerprint}|{BUILD_ID}|{path}|{normalize_query(query_string)}|{encoding or 'identity'}"
+    return f'"v{snapshot.version}-{hashlib.sha256(key.encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison, as RFC 9110 asks for GET)."""
+    candidates: Iterable[str] = (tag.strip() for tag in if_none_match.split(','))
+    return any(tag == '*' or tag.removeprefix('W/') == etag for tag in candidates)
+
+
+class ConditionalGetMiddleware:
+    """
+    Adds strong ETags to the GET responses of the API, and answers `If-None-Match`
+    requests with 304 Not Modified before the endpoint runs.
+
+    The dataset snapshot is fixed when the request comes in and stored in the request
+    state, where `get_dataset_snapshot` picks it up, so the ETag always describes the
+    version the body was built from. Responses that also depend on the time (signed
+    image URLs, diagnostics) don't get an ETag.
+    """
+
+    def __init__(self, app: ASGIApp, prefix: str = ""):
+        self.app = app
+        self.prefix = prefix
+
+    def _applies(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return False
+        path = scope["path"]
+        if not path.startswith(self.prefix) or path[len(self.prefix):].startswith(ETAG_EXCLUDED_PREFIXES):
+            return False
+        include = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))).get("include")
+        return 'imageUrls' not in parse_include(include)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        snapshot = get_dataset()
+        scope.setdefault("state", {})["dataset"] = snapshot
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding"))
+        etag = compute_etag(snapshot, scope["path"], scope.get("query_string", b""), encoding)
+        validator_headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            await Response(status_code=304, headers=validator_headers)(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                response_headers["ETag"] = etag
+                response_headers["Cache-Control"] = "no-cache"
+                vary_on_encoding(response_headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
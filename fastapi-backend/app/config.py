@@ -1,5 +1,7 @@
 # fastapi-backend/app/config.py
 
+import tempfile
+from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -21,12 +23,66 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str
     AWS_REGION: str = "ap-ast-1"
     S3_BUCKET_NAME: str
+    # Presigned image URLs are reused until this many seconds before they expire,
+    # and at most this many of them are kept in memory.
+    S3_URL_REFRESH_MARGIN_SECONDS: int = 300
+    S3_URL_CACHE_MAX_ENTRIES: int = 100_000
 
     # --- CORS (Cross-Origin Resource Sharing) ---
     # A list of origins that are allowed to make requests to this backend.
     # Add the URL of your frontend application here.
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:5173", "http://127.0.0.1:5173"] 
 
+    # --- Response Cache ---
+    # Memory budget (in bytes) for the serialized /boards and /posm/general responses
+    # kept in memory per worker. Set to 0 to disable the cache.
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Write the rows of /boards, /posm/general and /retailers straight from their columns
+    # with orjson instead of validating every row against its model again (needs orjson).
+    # `python -m app.serialization` checks that both paths give the same JSON.
+    TRUSTED_SERIALIZATION: bool = True
+
+    # --- Compression ---
+    # Responses of at least this many bytes are compressed with brotli (if installed and
+    # accepted by the client) or gzip. Bodies that are the same for a whole dataset version
+    # (GeoJSON, filter options) are compressed once at the best level and kept in memory.
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+
+    # --- Worker Pools ---
+    # The pandas work of the heavy endpoints runs in thread pools instead of the event
+    # loop, so cheap requests stay fast while it runs. At most *_WORKERS calls of a pool
+    # run at once and *_MAX_QUEUE more wait; requests beyond that get 503 (Retry-After).
+    # The "data" pool serves the row lists (/boards, /posm/general, /retailers) and the
+    # "options" pool the filter options and GeoJSON. Stats: /diagnostics/executors.
+    DATA_POOL_WORKERS: int = 4
+    DATA_POOL_MAX_QUEUE: int = 32
+    OPTIONS_POOL_WORKERS: int = 2
+    OPTIONS_POOL_MAX_QUEUE: int = 64
+
+    # --- Data Reload ---
+    # How often (in seconds) board.csv and posm.csv are checked for changes. Changed files
+    # are loaded in the background and swapped in without a restart. Set to 0 to disable.
+    DATA_RELOAD_INTERVAL_SECONDS: float = 10.0
+
+    # --- Data Cache ---
+    # The parsed CSVs are kept as typed Arrow files (needs pyarrow), which load much faster
+    # than the CSVs. Each cache file is rebuilt when its source CSV changes.
+    DATA_CACHE_ENABLED: bool = True
+    DATA_CACHE_DIR: str = str(Path(__file__).resolve().parent / "data" / ".cache")
+
+    # --- Shared Dataset ---
+    # With several uvicorn workers, the typed board and POSM frames are built once and
+    # kept in shared memory (Arrow files on a tmpfs, needs pyarrow), which every worker
+    # maps read-only instead of holding its own copy. A reload publishes new files and
+    # the workers map those. `python -m app.shared_dataset` builds them before the
+    # workers start. The indexes derived from the frames are still built per worker.
+    SHARED_DATASET_ENABLED: bool = True
+    SHARED_DATASET_DIR: str = str(
+        (Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())) / "retail-dashboard-dataset"
+    )
+
     # Load settings from a .env file
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,71 +1,166 @@
+import threading
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Optional, Tuple
+from app.dataset import DatasetSnapshot
+from app.schema import BOARD_SCHEMA, POSM_SCHEMA, CSV_READ_DTYPES, apply_schema
+from app.frame_cache import load_frame
+from app.districts import SHAPEFILE_PATH, assign_districts
+from app.admin_hierarchy import ADMIN_HIERARCHY_CSV, fill_admin_columns
+from app.shared_dataset import shared_frame
 
 DATA_PATH = Path(__file__).resolve().parent / "data"
 BOARD_CSV = DATA_PATH / "board.csv"
 POSM_CSV = DATA_PATH / "posm.csv"
 
-# Store data in memory (simple cache)
-_board_df = None
-_posm_df = None
+# The snapshot currently served to requests. It is shared by every request and never copied.
+# A reload replaces it with a new snapshot (and a higher version); requests that already
+# hold the old one keep using it until they finish.
+_snapshot: Optional[DatasetSnapshot] = None
+_snapshot_lock = threading.Lock()
+_version = 0
 
-def load_dataframes():
-    global _board_df, _posm_df
-    if _board_df is None:
-        try:
-            _board_df = pd.read_csv(BOARD_CSV)
-            # Basic preprocessing similar to host (4).py if needed
-            # e.g., convert date columns, handle NaNs for key columns
-            _board_df['FETCHED_DATE'] = pd.to_datetime(_board_df['FETCHED_DATE'], errors='coerce')
-            _board_df['RECEIVED_DATE'] = pd.to_datetime(_board_df['RECEIVED_DATE'], errors='coerce')
-        except FileNotFoundError:
-            print(f"Error: {BOARD_CSV} not found.")
-            _board_df = pd.DataFrame()
-    
-    if _posm_df is None:
+
+def read_board_csv() -> pd.DataFrame:
+    try:
+        board_df = pd.read_csv(BOARD_CSV, dtype=CSV_READ_DTYPES)
+        # Basic preprocessing similar to host (4).py if needed
+        # e.g., convert date columns, handle NaNs for key columns
+        board_df['FETCHED_DATE'] = pd.to_datetime(board_df['FETCHED_DATE'], errors='coerce')
+        board_df['RECEIVED_DATE'] = pd.to_datetime(board_df['RECEIVED_DATE'], errors='coerce')
+        # Convert the counts, percentages and names to their declared types once, here,
+        # so the routers never have to coerce them per request.
+        board_df = apply_schema(board_df, BOARD_SCHEMA, "board.csv")
+    except FileNotFoundError:
+        print(f"Error: {BOARD_CSV} not found.")
+        board_df = pd.DataFrame()
+    return board_df
+
+
+def read_posm_csv() -> pd.DataFrame:
+    try:
+        posm_df = pd.read_csv(POSM_CSV, dtype=CSV_READ_DTYPES)
+        posm_df.columns = posm_df.columns.str.strip()
+
+        # --- FIX: Specify the exact format for the date/time columns ---
+        # This format string tells pandas to expect Minutes:Seconds.Microseconds
+        time_format = "%M:%S.%f"
+
+        # Apply the conversion with the specified format
+        posm_df['FETCHED_DATE'] = pd.to_datetime(posm_df['FETCHED_DATE'], format=time_format, errors='coerce')
+        posm_df['RECEIVED_DATE'] = pd.to_datetime(posm_df['RECEIVED_DATE'], format=time_format, errors='coerce')
+        posm_df = apply_schema(posm_df, POSM_SCHEMA, "posm.csv")
+    except FileNotFoundError:
+        print(f"Error: {POSM_CSV} not found.")
+        posm_df = pd.DataFrame()
+    return posm_df
+
+
+# The source CSV and the parser of every frame.
+DATA_SOURCES = {
+    "board": (BOARD_CSV, read_board_csv),
+    "posm": (POSM_CSV, read_posm_csv),
+}
+
+
+def load_board_frame() -> pd.DataFrame:
+    # Blank administrative columns are filled from Geoloction.csv, once per snapshot.
+    # With several workers, the first one builds the frame and the others map it from shared memory.
+    return shared_frame(
+        "board", [BOARD_CSV, ADMIN_HIERARCHY_CSV],
+        lambda: fill_admin_columns(load_frame("board", BOARD_CSV, read_board_csv)),
+    )
+
+
+def load_posm_frame() -> pd.DataFrame:
+    # The rows without a district get one from their coordinates, and the remaining
+    # blank administrative columns are filled from Geoloction.csv, once per snapshot.
+    return shared_frame(
+        "posm", [POSM_CSV, ADMIN_HIERARCHY_CSV, SHAPEFILE_PATH],
+        lambda: fill_admin_columns(assign_districts(load_frame("posm", POSM_CSV, read_posm_csv))),
+    )
+
+
+def source_fingerprint() -> Tuple[Optional[Tuple[int, int]], ...]:
+    """
+    Returns the modification time and size of each source CSV (None for a missing file).
+    A different fingerprint means the data on disk has changed.
+    """
+    fingerprint = []
+    for path in (BOARD_CSV, POSM_CSV):
         try:
-            if _posm_df is None:
-                _posm_df = pd.read_csv(POSM_CSV)
-                _posm_df.columns = _posm_df.columns.str.strip()
-                
-                # --- FIX: Specify the exact format for the date/time columns ---
-                # This format string tells pandas to expect Minutes:Seconds.Microseconds
-                time_format = "%M:%S.%f"
-
-                # Apply the conversion with the specified format
-                _posm_df['FETCHED_DATE'] = pd.to_datetime(_posm_df['FETCHED_DATE'], format=time_format, errors='coerce')
-                _posm_df['RECEIVED_DATE'] = pd.to_datetime(_posm_df['RECEIVED_DATE'], format=time_format, errors='coerce')
-            
-        except FileNotFoundError:
-            print(f"Error: {POSM_CSV} not found.")
-            _posm_df = pd.DataFrame()
-            
-    return _board_df.copy() if _board_df is not None else pd.DataFrame(), \
-           _posm_df.copy() if _posm_df is not None else pd.DataFrame()
+            stat = path.stat()
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def new_snapshot() -> DatasetSnapshot:
+    """Creates a snapshot of the source CSVs with the next version number. Its frames load lazily."""
+    global _version
+    with _snapshot_lock:
+        _version += 1
+        version = _version
+    return DatasetSnapshot(
+        version, {"board": load_board_frame, "posm": load_posm_frame}, source_fingerprint=source_fingerprint()
+    )
+
+
+def get_dataset() -> DatasetSnapshot:
+    """
+    Returns the dataset snapshot shared by all requests.
+    The frames inside it are loaded lazily, one at a time, the first time they are used.
+    """
+    global _snapshot
+    if _snapshot is None:
+        snapshot = new_snapshot()
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = snapshot
+    return _snapshot
+
+
+def swap_dataset(snapshot: DatasetSnapshot) -> None:
+    """Makes `snapshot` the one served to new requests. A snapshot never replaces a newer one."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or snapshot.version > _snapshot.version:
+            _snapshot = snapshot
+
+
+def load_dataframes():
+    """Loads both frames into the shared snapshot and returns them (without copying)."""
+    snapshot = get_dataset()
+    return snapshot.board, snapshot.posm
 
 def get_board_data():
-    df, _ = load_dataframes()
-    return df
+    return get_dataset().board
 
 def get_posm_data():
-    _, df = load_dataframes()
-    return df
+    return get_dataset().posm
 
 
 
 
+def max_capture_phase_mask(df: pd.DataFrame) -> np.ndarray:
+    """
+    Returns a boolean mask selecting the rows of the latest capture phase.
+    Rows with no capture phase are treated as belonging to the latest one.
+    """
+    if df is None or df.empty or 'CAPTURE_PHASE' not in df.columns:
+        return np.ones(0 if df is None else len(df), dtype=bool)
+
+    max_capture_phase_val = df['CAPTURE_PHASE'].max()
+    if pd.isna(max_capture_phase_val):
+        return np.ones(len(df), dtype=bool)
+
+    phases = df['CAPTURE_PHASE']
+    return ((phases == max_capture_phase_val) | phases.isna()).to_numpy(dtype=bool, na_value=False, copy=True)
+
+
 def filter_by_max_capture_phase(df: pd.DataFrame, df_name_for_log=""):
     if df is None or df.empty:
         return pd.DataFrame()
-    
-    df_copy = df.copy()
-    if 'CAPTURE_PHASE' not in df_copy.columns:
-        return df_copy
-
-    max_capture_phase_val = df_copy['CAPTURE_PHASE'].dropna().max()
-    if pd.isna(max_capture_phase_val):
-        return df_copy 
-    
-    df_copy['CAPTURE_PHASE'] = df_copy['CAPTURE_PHASE'].fillna(max_capture_phase_val)
-    filtered_df = df_copy[df_copy['CAPTURE_PHASE'] == max_capture_phase_val]
-    return filtered_df
\ No newline at end of file
+    return df[max_capture_phase_mask(df)]
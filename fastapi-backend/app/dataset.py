@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+
+class DatasetSnapshot:
+    """
+    A versioned, read-only view of the board and POSM data.
+
+    Every request receives the same snapshot object, so the frames are never copied
+    per request. The frames must be treated as immutable: routers select rows with
+    boolean masks or positional indexes and never assign columns on them.
+    Each frame is loaded the first time it is asked for, so an endpoint that only
+    needs the board data never pays for loading the POSM data (and vice versa).
+    """
+
+    def __init__(self, version: int, loaders: Dict[str, Callable[[], pd.DataFrame]], source_fingerprint: Optional[Any] = None):
+        self.version = version
+        # Identifies the source files the snapshot was read from, to detect changes on disk.
+        self.source_fingerprint = source_fingerprint
+        self._loaders = loaders
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._derived: Dict[Any, Any] = {}
+        # Re-entrant so that a derived builder can ask for a frame or another derived value.
+        self._lock = threading.RLock()
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """Returns the shared frame for a context ("board" or "posm"), loading it on first use."""
+        df = self._frames.get(name)
+        if df is None:
+            with self._lock:
+                df = self._frames.get(name)
+                if df is None:
+                    df = self._loaders[name]()
+                    self._frames[name] = df
+        return df
+
+    @property
+    def board(self) -> pd.DataFrame:
+        return self.frame("board")
+
+    @property
+    def posm(self) -> pd.DataFrame:
+        return self.frame("posm")
+
+    def derived(self, key: Any, builder: Callable[[], Any]) -> Any:
+        """
+        Returns a value computed from this snapshot, building it once on first use.
+        Because a snapshot never changes, anything derived from it can be cached here
+        for as long as the snapshot is in use.
+        """
+        value = self._derived.get(key, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                value = self._derived.get(key, _MISSING)
+                if value is _MISSING:
+                    value = builder()
+                    self._derived[key] = value
+        return value
+
+
+_MISSING = object()
@@ -1,7 +1,15 @@
-from .data_loader import get_board_data, get_posm_data
+from fastapi import Request
+
+from .data_loader import get_board_data, get_posm_data, get_dataset
+from .dataset import DatasetSnapshot
 
 def get_boards_df():
     return get_board_data()
 
 def get_posm_df():
-    return get_posm_data()
\ No newline at end of file
+    return get_posm_data()
+
+def get_dataset_snapshot(request: Request) -> DatasetSnapshot:
+    # The conditional GET middleware fixes the snapshot of a request when it computes its ETag.
+    snapshot = getattr(request.state, "dataset", None)
+    return snapshot if snapshot is not None else get_dataset()
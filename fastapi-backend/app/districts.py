@@ -0,0 +1,103 @@
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from app.schema import GEOGRAPHY_DTYPE
+
+# IMPORTANT: Update this path to where your shapefiles are located within the Docker container or server.
+# This path assumes a 'geo' folder inside the app's data folder.
+SHAPEFILE_PATH = Path(__file__).resolve().parent / "data" / "geo" / "sri_lanka_districts.shp"
+
+# The POSM columns filled in from the district shapes, and the shapefile column each comes from.
+DISTRICT_FILL_COLUMNS = {
+    "SHAPEISO": "shapeISO",
+    "SHAPEID": "shapeID",
+    "DISTRICT": "shapeName",
+}
+
+# The district geometry never changes while the server runs, so the shapefile is read
+# once (at startup) and shared by every dataset version.
+_district_geometry: Optional[gpd.GeoDataFrame] = None
+_district_geometry_loaded = False
+_district_geometry_lock = threading.Lock()
+
+
+def load_district_geometry() -> Optional[gpd.GeoDataFrame]:
+    """Reads the district shapefile on first use. Returns None if it can't be loaded."""
+    global _district_geometry, _district_geometry_loaded
+    if not _district_geometry_loaded:
+        with _district_geometry_lock:
+            if not _district_geometry_loaded:
+                try:
+                    _district_geometry = gpd.read_file(SHAPEFILE_PATH)
+                except Exception as e:
+                    print(f"Error loading shapefile: {e}")
+                    _district_geometry = None
+                _district_geometry_loaded = True
+    return _district_geometry
+
+
+def district_name(shape_name) -> Optional[str]:
+    """Turns a shape name like "Kandy District" into the district name used in the data ("Kandy")."""
+    if shape_name is None or pd.isna(shape_name):
+        return None
+    name = str(shape_name).strip()
+    return name[:-len(" District")] if name.endswith(" District") else name
+
+
+def assign_districts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fills in SHAPEISO, SHAPEID and DISTRICT for the rows that are missing any of them
+    but have coordinates, from the district shape containing the point. Values already
+    present are kept. Returns the frame unchanged when the shapefile can't be loaded.
+
+    The points are matched in bulk against the spatial index (an STR-tree) of the
+    district shapes, and each distinct coordinate is looked up only once.
+    """
+    gdf_districts = load_district_geometry()
+    if gdf_districts is None or df.empty or 'LATITUDE' not in df.columns or 'LONGITUDE' not in df.columns:
+        return df
+    fills = {col: source for col, source in DISTRICT_FILL_COLUMNS.items() if source in gdf_districts.columns}
+    if not fills:
+        return df
+
+    started = time.perf_counter()
+    lat = df['LATITUDE'].to_numpy(dtype=np.float64, na_value=np.nan)
+    lon = df['LONGITUDE'].to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.zeros(len(df), dtype=bool)
+    for col in fills:
+        missing |= df[col].isna().to_numpy() if col in df.columns else True
+    positions = np.flatnonzero(missing & np.isfinite(lat) & np.isfinite(lon))
+    if positions.size == 0:
+        return df
+
+    if gdf_districts.crs is not None and not gdf_districts.crs.equals("EPSG:4326"):
+        gdf_districts = gdf_districts.to_crs("EPSG:4326")
+    coords, inverse = np.unique(np.column_stack([lon[positions], lat[positions]]), axis=0, return_inverse=True)
+    point_indexes, shape_indexes = gdf_districts.sindex.query(shapely.points(coords), predicate="intersects")
+    # A point on the border of two districts matches both; the first match is kept.
+    shape_of_point = np.full(len(coords), -1, dtype=np.intp)
+    shape_of_point[point_indexes[::-1]] = shape_indexes[::-1]
+    row_shapes = shape_of_point[inverse.ravel()]
+    matched = row_shapes >= 0
+    rows, row_shapes = positions[matched], row_shapes[matched]
+
+    filled = {}
+    for col, source in fills.items():
+        shape_values = gdf_districts[source].to_numpy(dtype=object)
+        if col == "DISTRICT":
+            shape_values = np.array([district_name(value) for value in shape_values], dtype=object)
+        values = df[col].astype(object).to_numpy(copy=True) if col in df.columns else np.full(len(df), None, dtype=object)
+        empty = pd.isna(values[rows])
+        values[rows[empty]] = shape_values[row_shapes[empty]]
+        filled[col] = pd.Series(values, index=df.index).astype(GEOGRAPHY_DTYPE)
+
+    print(f"Assigned districts to {len(rows)} of {positions.size} rows without one in {time.perf_counter() - started:.2f}s.")
+    # A new frame is returned; the frame passed in is left as it was.
+    return df.assign(**filled)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    A thread pool for the CPU-heavy (pandas/numpy) work of request handlers.
+
+    Running that work here keeps the event loop free, so cheap requests (cache hits,
+    image lookups) are answered while a heavy one is being computed. At most
+    `max_workers` calls run at once and at most `max_queue` more wait for a thread;
+    beyond that a request is turned away with 503 instead of piling up. Threads (not
+    processes) are used because the calls share the in-memory dataset snapshot, and
+    pandas and numpy release the GIL in most of their bulk operations.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Started on first use, so the pool can be shut down with the app and used again after a restart.
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.max_queued_seen = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs `fn(*args, **kwargs)` on the pool and returns its result. Raises 503 when the queue is full."""
+        with self._lock:
+            if self._active + self._queued >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+            self._queued += 1
+            self.submitted += 1
+            self.max_queued_seen = max(self.max_queued_seen, self._queued)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-pool")
+            executor = self._executor
+        submitted_at = time.perf_counter()
+        # Whether the call has left the queue: started on a thread, or abandoned by a
+        # cancelled request before a thread picked it up.
+        state = {"dequeued": False}
+
+        def call() -> T:
+            started_at = time.perf_counter()
+            with self._lock:
+                if state["dequeued"]:
+                    raise asyncio.CancelledError()
+                state["dequeued"] = True
+                self._queued -= 1
+                self._active += 1
+                self._wait_seconds += started_at - submitted_at
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self.completed += 1
+                    self._run_seconds += time.perf_counter() - started_at
+            return result
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        finally:
+            # A request cancelled (e.g. the client went away) while its call was still
+            # queued: the call never runs, so its queue slot is released here.
+            with self._lock:
+                if not state["dequeued"]:
+                    state["dequeued"] = True
+                    self._queued -= 1
+                    self.cancelled += 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self._active
+            return {
+                "maxWorkers": self.max_workers,
+                "maxQueue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+                "maxQueuedSeen": self.max_queued_seen,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avgWaitMs": round(1000 * self._wait_seconds / started, 3) if started else None,
+                "avgRunMs": round(1000 * self._run_seconds / self.completed, 3) if self.completed else None,
+            }
+
+
+# The row-heavy list endpoints (/boards, /posm/general, /retailers) and the smaller
+# per-version bodies (filter options, GeoJSON) get separate pools, so a burst of list
+# requests doesn't hold up the dropdowns.
+data_executor = BoundedExecutor("data", settings.DATA_POOL_WORKERS, settings.DATA_POOL_MAX_QUEUE)
+options_executor = BoundedExecutor("options", settings.OPTIONS_POOL_WORKERS, settings.OPTIONS_POOL_MAX_QUEUE)
+
+EXECUTORS: Dict[str, BoundedExecutor] = {pool.name: pool for pool in (data_executor, options_executor)}
+
+
+def executor_stats() -> Dict[str, Any]:
+    return {name: pool.stats() for name, pool in EXECUTORS.items()}
+
+
+def shutdown_executors() -> None:
+    for pool in EXECUTORS.values():
+        pool.shutdown()
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pandas as pd
+
+from app.config import settings
+from app.schema import PROFILE_ID_COLUMN
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # The cache is optional; without pyarrow the CSVs are parsed on every start.
+    feather = None
+
+# Bump when the parsing or the schema of the frames changes, so old cache files are rebuilt.
+CACHE_FORMAT_VERSION = 1
+
+# How each frame was loaded the last time, for the startup report.
+load_report: Dict[str, Dict[str, Any]] = {}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FrameCache:
+    """
+    A typed binary copy (Arrow IPC / Feather, uncompressed) of a parsed source CSV.
+
+    The cache file is written next to a small JSON file describing the source it was
+    built from (modification time, size and SHA-256). It is used only while it matches
+    the source: a changed mtime or size triggers a hash check, and a changed hash a
+    rebuild. Reading the cache memory-maps the file, so the text parsing, date parsing
+    and schema conversion of the CSV are skipped.
+    """
+
+    def __init__(self, name: str, source: Path, cache_dir: Path):
+        self.name = name
+        self.source = source
+        self.path = cache_dir / f"{name}.arrow"
+        self.meta_path = cache_dir / f"{name}.json"
+
+    def _source_meta(self) -> Dict[str, Any]:
+        stat = self.source.stat()
+        return {"format": CACHE_FORMAT_VERSION, "pandas": pd.__version__, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def is_valid(self) -> bool:
+        try:
+            meta = json.loads(self.meta_path.read_text())
+            current = self._source_meta()
+        except (OSError, ValueError):
+            return False
+        if not self.path.exists() or any(meta.get(k) != v for k, v in current.items() if k != "mtime_ns"):
+            return False
+        if meta.get("mtime_ns") == current["mtime_ns"]:
+            return True
+        # Touched but maybe not changed (e.g. copied again): compare the contents.
+        if meta.get("sha256") != file_sha256(self.source):
+            return False
+        self._write_meta({**meta, "mtime_ns": current["mtime_ns"]})
+        return True
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        tmp = self.meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.meta_path)
+
+    def read(self) -> pd.DataFrame:
+        df = feather.read_table(self.path, memory_map=True).to_pandas()
+        if PROFILE_ID_COLUMN in df.columns:
+            # Arrow turns the object column back into a string column; keep the loaded dtype.
+            df = df.assign(**{PROFILE_ID_COLUMN: df[PROFILE_ID_COLUMN].astype(object)})
+        return df
+
+    def write(self, df: pd.DataFrame) -> None:
+        meta = {**self._source_meta(), "sha256": file_sha256(self.source)}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to temporary files and renamed, so a reader never sees half a file.
+        tmp = self.path.with_suffix(".arrow.tmp")
+        feather.write_feather(df, tmp, compression="uncompressed")
+        os.replace(tmp, self.path)
+        self._write_meta(meta)
+
+
+def load_frame(name: str, source: Path, parse_csv: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Loads a frame from its binary cache when it is up to date, and otherwise parses
+    the CSV and (re)builds the cache. Falls back to the CSV whenever the cache can't be used.
+    """
+    started = time.perf_counter()
+    cache = FrameCache(name, source, Path(settings.DATA_CACHE_DIR)) if settings.DATA_CACHE_ENABLED and feather else None
+
+    if cache is not None and source.exists() and cache.is_valid():
+        try:
+            df = cache.read()
+            _report(name, "cache", started, len(df))
+            return df
+        except Exception as e:
+            print(f"Warning: could not read the data cache for {name}, parsing the CSV instead: {e}")
+
+    df = parse_csv()
+    _report(name, "csv", started, len(df))
+    if cache is not None and not df.empty:
+        try:
+            cache.write(df)
+        except Exception as e:
+            print(f"Warning: could not write the data cache for {name}: {e}")
+    return df
+
+
+def _report(name: str, source: str, started: float, rows: int) -> None:
+    seconds = time.perf_counter() - started
+    load_report[name] = {"source": source, "seconds": round(seconds, 4), "rows": rows}
+    label = "binary cache" if source == "cache" else "CSV"
+    print(f"Loaded {name} ({rows} rows) from the {label} in {seconds:.3f}s.")
+
+
+def startup_time_report() -> None:
+    """
+    Builds the caches and compares the two load paths of every source: parsing the CSV
+    against reading the binary cache. Run with `python -m app.frame_cache`.
+    """
+    from app.data_loader import DATA_SOURCES
+
+    if feather is None:
+        print("pyarrow is not installed; the data cache is disabled.")
+        return
+    for name, (source, parse_csv) in DATA_SOURCES.items():
+        cache = FrameCache(name, source, Path(settings.DATA_CACHE_DIR))
+        started = time.perf_counter()
+        df = parse_csv()
+        csv_seconds = time.perf_counter() - started
+        cache.write(df)
+        started = time.perf_counter()
+        cached = cache.read()
+        cache_seconds = time.perf_counter() - started
+        pd.testing.assert_frame_equal(df, cached)
+        speedup = csv_seconds / cache_seconds if cache_seconds else float("inf")
+        print(f"{name}: {len(df)} rows, CSV {csv_seconds:.3f}s, cache {cache_seconds:.3f}s ({speedup:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    startup_time_report()
@@ -0,0 +1,428 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.dataset import DatasetSnapshot
+from app.data_loader import max_capture_phase_mask
+from app.schema import PERCENTAGE_COLUMNS, PROFILE_ID_COLUMN, normalize_geo_name, value_matrix
+
+# The geography filter levels and the columns that can hold them. The first column
+# present in a frame is used, e.g. the board data falls back from PROVINCE to SALES_REGION.
+GEO_LEVEL_COLUMNS: Dict[str, List[str]] = {
+    "province": ["PROVINCE", "SALES_REGION"],
+    "district": ["DISTRICT", "SALES_DISTRICT"],
+    "dsDivision": ["DS_DIVISION"],
+}
+
+_EMPTY_POSITIONS = np.empty(0, dtype=np.intp)
+
+
+class GeoIndex:
+    """
+    An inverted index from normalized geography names to row positions.
+
+    For each filter level the names are normalized once per dataset version (on the
+    categories, not on every row), and every name maps to a sorted array of the row
+    positions that carry it. A geography filter is then a dictionary lookup, and
+    several filters are combined by intersecting the position arrays.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.row_count = len(df)
+        self.columns: Dict[str, Optional[str]] = {}
+        self._positions: Dict[str, Dict[str, np.ndarray]] = {}
+        for level, candidates in GEO_LEVEL_COLUMNS.items():
+            column = next((c for c in candidates if c in df.columns), None)
+            self.columns[level] = column
+            self._positions[level] = self._build_level(df[column]) if column else {}
+
+    @staticmethod
+    def _build_level(values: pd.Series) -> Dict[str, np.ndarray]:
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            names = values.cat.categories
+        else:
+            codes, names = pd.factorize(values)
+
+        # Group the row positions by category code with one stable sort.
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        groups = np.split(order, starts[1:])
+
+        index: Dict[str, List[np.ndarray]] = {}
+        for code, positions in zip(sorted_codes[starts], groups):
+            if code < 0:
+                continue  # Missing names never match a filter.
+            index.setdefault(normalize_geo_name(names[code]), []).append(positions)
+
+        # Names that only differ in case or spacing share one key.
+        return {
+            key: parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+            for key, parts in index.items()
+        }
+
+    def positions(self, level: str, value: str) -> np.ndarray:
+        """Returns the sorted row positions whose name at `level` matches a filter value."""
+        return self._positions.get(level, {}).get(value.lower(), _EMPTY_POSITIONS)
+
+    def keys(self, level: str) -> List[str]:
+        return list(self._positions.get(level, {}).keys())
+
+    def lookup(self, **filters: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Intersects the row positions of several filters, e.g. `lookup(province='western', district='all')`.
+        Filters that are empty, 'all', or refer to a level the frame has no column for are ignored.
+        Returns None when no filter applies (every row matches).
+        """
+        result: Optional[np.ndarray] = None
+        for level, value in filters.items():
+            if not value or value == 'all' or not self.columns.get(level):
+                continue
+            positions = self.positions(level, value)
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+            if result.size == 0:
+                break
+        return result
+
+    def mask(self, **filters: Optional[str]) -> np.ndarray:
+        """Same as `lookup`, but returns a boolean mask over all the rows."""
+        positions = self.lookup(**filters)
+        if positions is None:
+            return np.ones(self.row_count, dtype=bool)
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[positions] = True
+        return mask
+
+
+class PhasePartitions:
+    """
+    The rows of each capture phase, computed once per dataset version.
+
+    `latest_positions`/`latest_mask` select the latest capture phase (rows without a phase
+    count as the latest, as in `filter_by_max_capture_phase`); `positions_by_phase` holds
+    the sorted row positions of every phase. The arrays are read-only so they can be
+    shared by all requests; callers that narrow a mask down further start from `latest_mask.copy()`.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.row_count = len(df)
+        self.latest_mask = max_capture_phase_mask(df)
+        self.latest_positions = np.flatnonzero(self.latest_mask)
+        self.latest_phase = None
+        self.positions_by_phase: Dict[int, np.ndarray] = {}
+
+        if 'CAPTURE_PHASE' in df.columns and len(df):
+            phases = df['CAPTURE_PHASE']
+            present = phases.notna().to_numpy()
+            if present.any():
+                self.latest_phase = int(phases.max())
+                phase_values = phases.to_numpy(dtype=np.int64, na_value=-1)
+                positions = np.flatnonzero(present)
+                order = np.argsort(phase_values[positions], kind="stable")
+                sorted_positions = positions[order]
+                sorted_phases = phase_values[sorted_positions]
+                starts = np.flatnonzero(np.r_[True, sorted_phases[1:] != sorted_phases[:-1]])
+                for phase, group in zip(sorted_phases[starts], np.split(sorted_positions, starts[1:])):
+                    group.flags.writeable = False
+                    self.positions_by_phase[int(phase)] = group
+
+        self.latest_mask.flags.writeable = False
+        self.latest_positions.flags.writeable = False
+
+    def phase_mask(self, phase: int) -> np.ndarray:
+        """Returns a new boolean mask selecting the rows of one capture phase."""
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[self.positions_by_phase.get(phase, _EMPTY_POSITIONS)] = True
+        return mask
+
+
+class RetailerTimeline:
+    """
+    The capture batches of every retailer, computed once per dataset version.
+
+    Each retailer ID maps to its row positions sorted by CAPTURE_PHASE (rows without a
+    phase first; rows of the same phase keep their file order), so the rows of one
+    retailer or of one of its batches are found without scanning the frame.
+    For the retailers with at least two batches, the change of every provider's
+    visibility share between the previous and the latest batch is precomputed (the
+    first row of each batch is used, missing shares count as 0).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._positions: Dict[str, np.ndarray] = {}
+        self._phases: Dict[str, np.ndarray] = {}
+        self._row_phases: Dict[str, np.ndarray] = {}
+        self.changed_ids: List[str] = []
+        # One row per retailer in `changed_ids`, one column per PERCENTAGE_COLUMNS entry.
+        self.deltas = np.zeros((0, len(PERCENTAGE_COLUMNS)))
+        if df.empty or PROFILE_ID_COLUMN not in df.columns:
+            return
+
+        codes, profile_ids = pd.factorize(df[PROFILE_ID_COLUMN])
+        if 'CAPTURE_PHASE' in df.columns:
+            phases = df['CAPTURE_PHASE'].to_numpy(dtype=np.int64, na_value=-1)
+        else:
+            phases = np.full(len(df), -1, dtype=np.int64)
+
+        # One stable sort by retailer, then phase.
+        order = np.lexsort((phases, codes))
+        order = order[codes[order] >= 0]  # Rows without a retailer ID belong to no timeline.
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if order.size else np.empty(0, dtype=np.intp)
+
+        latest_rows, previous_rows = [], []
+        for code, positions in zip(sorted_codes[starts], np.split(order, starts[1:])):
+            profile_id = profile_ids[code]
+            positions.flags.writeable = False
+            self._positions[profile_id] = positions
+            row_phases = phases[positions]
+            self._row_phases[profile_id] = row_phases
+            batch_phases, first_rows = np.unique(row_phases, return_index=True)
+            keep = batch_phases >= 0
+            batch_phases, first_rows = batch_phases[keep], first_rows[keep]
+            self._phases[profile_id] = batch_phases
+            if batch_phases.size >= 2:
+                self.changed_ids.append(profile_id)
+                latest_rows.append(positions[first_rows[-1]])
+                previous_rows.append(positions[first_rows[-2]])
+
+        if self.changed_ids:
+            shares = value_matrix(df, PERCENTAGE_COLUMNS)
+            self.deltas = shares[latest_rows] - shares[previous_rows]
+
+    def positions(self, profile_id: str) -> np.ndarray:
+        """Returns the row positions of a retailer, sorted by capture phase."""
+        return self._positions.get(profile_id, _EMPTY_POSITIONS)
+
+    def phases(self, profile_id: str) -> List[int]:
+        """Returns the capture phases (batches) of a retailer, in ascending order."""
+        return self._phases.get(profile_id, _EMPTY_POSITIONS).tolist()
+
+    def batch_position(self, profile_id: str, phase: int) -> Optional[int]:
+        """Returns the position of the first row of one batch of a retailer, or None."""
+        positions = self.positions(profile_id)
+        if positions.size == 0 or phase < 0:
+            return None
+        matches = positions[self._row_phases[profile_id] == phase]
+        return int(matches[0]) if matches.size else None
+
+    def changed_profile_ids(self, percentage_column: str, change_status: str) -> List[str]:
+        """Returns the retailers whose share in `percentage_column` went up ('increase') or down ('decrease')."""
+        deltas = self.deltas[:, PERCENTAGE_COLUMNS.index(percentage_column)]
+        selected = deltas > 0 if change_status == 'increase' else deltas < 0
+        return [profile_id for profile_id, keep in zip(self.changed_ids, selected) if keep]
+
+
+# Mean Earth radius, for distances between coordinates.
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat: np.ndarray, lon: np.ndarray, center_lat: float, center_lon: float) -> np.ndarray:
+    """Great-circle distances (in km) from one point to arrays of points."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    center_lat, center_lon = np.radians(center_lat), np.radians(center_lon)
+    a = np.sin((lat - center_lat) / 2) ** 2 + np.cos(lat) * np.cos(center_lat) * np.sin((lon - center_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    A uniform grid over the LATITUDE/LONGITUDE of the rows, built once per dataset version.
+
+    The rows with coordinates are sorted by grid cell (row-major), so the cells of one
+    grid row that overlap a bounding box form one contiguous slice. A box query reads
+    one slice per grid row and then checks the exact coordinates of only those rows;
+    a radius query does the same with the box around the circle and then checks the
+    great-circle distance.
+    """
+
+    # About 5.5 km; a query touches few cells and a cell holds few retailers.
+    DEFAULT_CELL_DEGREES = 0.05
+    MAX_CELLS_PER_AXIS = 2048
+
+    def __init__(self, df: pd.DataFrame, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.row_count = len(df)
+        if df.empty or 'LATITUDE' not in df.columns or 'LONGITUDE' not in df.columns:
+            lat = lon = np.empty(0)
+        else:
+            lat = df['LATITUDE'].to_numpy(dtype=np.float64, na_value=np.nan)
+            lon = df['LONGITUDE'].to_numpy(dtype=np.float64, na_value=np.nan)
+        positions = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+
+        if positions.size == 0:
+            self.positions = _EMPTY_POSITIONS
+            self.lat = self.lon = np.empty(0)
+            self.origin = (0.0, 0.0)
+            self.cell_degrees = cell_degrees
+            self.shape = (0, 0)
+            self.cell_starts = np.zeros(1, dtype=np.intp)
+            return
+
+        lat, lon = lat[positions], lon[positions]
+        self.origin = (float(lat.min()), float(lon.min()))
+        # Widen the cells for very spread-out data, to keep the grid small.
+        extent = max(float(lat.max()) - self.origin[0], float(lon.max()) - self.origin[1])
+        self.cell_degrees = max(cell_degrees, extent / self.MAX_CELLS_PER_AXIS)
+        cell_rows, cell_cols = self._cells(lat, lon)
+        self.shape = (int(cell_rows.max()) + 1, int(cell_cols.max()) + 1)
+
+        keys = cell_rows * self.shape[1] + cell_cols
+        order = np.argsort(keys, kind="stable")
+        self.positions = positions[order]
+        self.lat, self.lon = lat[order], lon[order]
+        self.cell_starts = np.searchsorted(keys[order], np.arange(self.shape[0] * self.shape[1] + 1))
+        for array in (self.positions, self.lat, self.lon, self.cell_starts):
+            array.flags.writeable = False
+
+    def _cells(self, lat, lon):
+        cell_rows = np.floor((np.asarray(lat) - self.origin[0]) / self.cell_degrees).astype(np.int64)
+        cell_cols = np.floor((np.asarray(lon) - self.origin[1]) / self.cell_degrees).astype(np.int64)
+        return cell_rows, cell_cols
+
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Returns the indexes (into the sorted arrays) of the rows in the cells overlapping a box."""
+        if self.positions.size == 0 or min_lat > max_lat or min_lon > max_lon:
+            return _EMPTY_POSITIONS
+        (row0, row1), (col0, col1) = self._cells([min_lat, max_lat], [min_lon, max_lon])
+        row0, col0 = max(int(row0), 0), max(int(col0), 0)
+        row1, col1 = min(int(row1), self.shape[0] - 1), min(int(col1), self.shape[1] - 1)
+        if row0 > row1 or col0 > col1:
+            return _EMPTY_POSITIONS
+        starts = self.cell_starts[np.arange(row0, row1 + 1) * self.shape[1] + col0]
+        ends = self.cell_starts[np.arange(row0, row1 + 1) * self.shape[1] + col1 + 1]
+        return np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+
+    def within_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> np.ndarray:
+        """Returns the sorted row positions inside a bounding box (edges included)."""
+        candidates = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.lat[candidates], self.lon[candidates]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(self.positions[candidates[inside]])
+
+    def within_radius(self, center_lat: float, center_lon: float, radius_km: float) -> np.ndarray:
+        """Returns the sorted row positions within `radius_km` of a point."""
+        lat_margin = np.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = max(np.cos(np.radians(min(abs(center_lat) + lat_margin, 89.9))), 1e-6)
+        lon_margin = min(lat_margin / cos_lat, 180.0)
+        candidates = self._candidates(center_lat - lat_margin, center_lon - lon_margin, center_lat + lat_margin, center_lon + lon_margin)
+        distances = haversine_km(self.lat[candidates], self.lon[candidates], center_lat, center_lon)
+        return np.sort(self.positions[candidates[distances <= radius_km]])
+
+    def mask(self, positions: np.ndarray) -> np.ndarray:
+        """Turns row positions from a query into a boolean mask over all the rows."""
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[positions] = True
+        return mask
+
+
+class ClusterLevel(NamedTuple):
+    """The clusters of one zoom level, as columns sorted by grid cell."""
+    cell_x: np.ndarray
+    cell_y: np.ndarray
+    count: np.ndarray
+    lat_sum: np.ndarray
+    lon_sum: np.ndarray
+    totals: np.ndarray
+    # The index of the first point of each cluster (its only point when count is 1).
+    first: np.ndarray
+
+
+class ClusterHierarchy:
+    """
+    Marker clusters of a set of points for every map zoom level, built once.
+
+    The points are placed on a grid in Web Mercator pixel space with cells of
+    CELL_PIXELS pixels at each zoom level. A cell at one zoom level covers exactly
+    four cells of the next one, so only the finest level is computed from the points;
+    every coarser level is merged from the clusters of the level below it. A cluster
+    carries its point count, its centroid and the column sums of the `totals` matrix
+    (one column per provider).
+    """
+
+    CELL_PIXELS = 64
+    MAX_ZOOM = 18
+    # Web Mercator is undefined at the poles; map tiles stop at this latitude.
+    MAX_LATITUDE = 85.05112878
+
+    def __init__(self, ids: List[str], lat: np.ndarray, lon: np.ndarray, totals: np.ndarray):
+        self.ids = ids
+        self.point_count = len(ids)
+        # Cells per axis at zoom z: 2 ** z tiles of 256 pixels, split into CELL_PIXELS cells.
+        extra_bits = int(np.log2(256 // self.CELL_PIXELS))
+        scale = float(1 << (self.MAX_ZOOM + extra_bits))
+        x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+        sin_lat = np.sin(np.radians(np.clip(np.asarray(lat, dtype=np.float64), -self.MAX_LATITUDE, self.MAX_LATITUDE)))
+        y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+        cell_x = np.clip(np.floor(x * scale), 0, scale - 1).astype(np.int64)
+        cell_y = np.clip(np.floor(y * scale), 0, scale - 1).astype(np.int64)
+
+        level = self._merge(
+            cell_x, cell_y, np.ones(self.point_count, dtype=np.int64),
+            np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+            np.asarray(totals, dtype=np.int64),
+            np.arange(self.point_count, dtype=np.int64),
+        )
+        self.levels: List[ClusterLevel] = [level]
+        for _ in range(self.MAX_ZOOM):
+            level = self._merge(level.cell_x >> 1, level.cell_y >> 1, *level[2:])
+            self.levels.append(level)
+        # levels[z] holds zoom level z.
+        self.levels.reverse()
+
+    @staticmethod
+    def _merge(cell_x, cell_y, count, lat_sum, lon_sum, totals, first) -> ClusterLevel:
+        """Sums the entries that fall into the same cell, with one sort and one pass of reduceat."""
+        if cell_x.size == 0:
+            return ClusterLevel(cell_x, cell_y, count, lat_sum, lon_sum, totals, first)
+        keys = (cell_x << 32) | cell_y
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        heads = order[starts]
+        return ClusterLevel(
+            cell_x[heads], cell_y[heads],
+            np.add.reduceat(count[order], starts),
+            np.add.reduceat(lat_sum[order], starts),
+            np.add.reduceat(lon_sum[order], starts),
+            np.add.reduceat(totals[order], starts, axis=0),
+            np.minimum.reduceat(first[order], starts),
+        )
+
+    def clusters(self, zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None) -> Dict[str, np.ndarray]:
+        """
+        Returns the clusters of a zoom level (capped at MAX_ZOOM) as columns: latitude,
+        longitude (the centroid), count, totals and first. With a 'minLon,minLat,maxLon,maxLat'
+        bbox, only the clusters whose centroid lies inside it are returned.
+        """
+        level = self.levels[min(max(zoom, 0), self.MAX_ZOOM)]
+        lat = level.lat_sum / np.maximum(level.count, 1)
+        lon = level.lon_sum / np.maximum(level.count, 1)
+        selected = slice(None)
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            selected = np.flatnonzero((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon))
+        return {
+            "latitude": lat[selected], "longitude": lon[selected], "count": level.count[selected],
+            "totals": level.totals[selected], "first": level.first[selected],
+        }
+
+
+def get_phase_partitions(dataset: DatasetSnapshot, context: str) -> PhasePartitions:
+    """Returns the capture-phase partitions of the "board" or "posm" frame, built once per dataset version."""
+    return dataset.derived(("phase_partitions", context), lambda: PhasePartitions(dataset.frame(context)))
+
+
+def get_geo_index(dataset: DatasetSnapshot, context: str) -> GeoIndex:
+    """Returns the geography index of the "board" or "posm" frame, built once per dataset version."""
+    return dataset.derived(("geo_index", context), lambda: GeoIndex(dataset.frame(context)))
+
+
+def get_retailer_timeline(dataset: DatasetSnapshot) -> RetailerTimeline:
+    """Returns the capture-batch timeline of every retailer in the POSM frame, built once per dataset version."""
+    return dataset.derived("retailer_timeline", lambda: RetailerTimeline(dataset.posm))
+
+
+def get_spatial_index(dataset: DatasetSnapshot, context: str) -> SpatialIndex:
+    """Returns the coordinate grid of the "board" or "posm" frame, built once per dataset version."""
+    return dataset.derived(("spatial_index", context), lambda: SpatialIndex(dataset.frame(context)))
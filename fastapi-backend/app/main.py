@@ -2,24 +2,40 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.config import settings
-from app.data_loader import load_dataframes
-from app.routers import boards, posm, retailers, images, geo, options
+from app.data_loader import load_dataframes, get_dataset
+from app.routers import boards, posm, retailers, images, geo, options, diagnostics
+from app.routers.geo import load_district_geometry
+from app.admin_hierarchy import load_admin_hierarchy
+from app.reloader import data_reloader, warm_snapshot
+from app.pagination import TOTAL_COUNT_HEADER, NEXT_CURSOR_HEADER
+from app.compression import CompressionMiddleware
+from app.conditional import ConditionalGetMiddleware
+from app.executors import shutdown_executors
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
     # --- Startup Logic ---
     print("Application startup: loading data...")
+    # The administrative hierarchy is static; it is read first since loading the frames uses it.
+    load_admin_hierarchy()
     # Load the dataframes into memory when the application starts.
     # This is more efficient than loading the data on every API request.
     load_dataframes()
+    warm_snapshot(get_dataset())
+    # The district shapes never change, so they are read once here rather than per request.
+    load_district_geometry()
     print("Data loading complete.")
+    # Watch the CSV files and swap in new data when they change.
+    data_reloader.start()
     
     # The 'yield' keyword passes control back to the application.
     yield
     
     # --- Shutdown Logic ---
     # Any cleanup code can be placed here. It will be executed when the application is shutting down.
+    data_reloader.stop()
+    shutdown_executors()
     print("Application shutdown.")
 
 # Create the main FastAPI application instance
@@ -28,6 +44,15 @@ app = FastAPI(
     lifespan=lifespan  # Register the lifespan context manager
 )
 
+# --- Compression Middleware ---
+# Large JSON responses are sent brotli- or gzip-compressed, depending on what the client accepts.
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
+# --- Conditional GET Middleware ---
+# API responses carry an ETag tied to the dataset version; repeated requests with a
+# matching If-None-Match get a 304 without running the endpoint.
+app.add_middleware(ConditionalGetMiddleware, prefix=settings.API_V1_STR)
+
 # --- CORS Middleware ---
 # Configure Cross-Origin Resource Sharing (CORS) to allow the frontend application
 # to communicate with this backend. Without this, browser security policies would block the requests.
@@ -38,6 +63,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],  # Allow all standard HTTP methods
         allow_headers=["*"],  # Allow all headers
+        expose_headers=[TOTAL_COUNT_HEADER, NEXT_CURSOR_HEADER],  # Let the frontend read the paging headers
     )
 
 # --- API Routers ---
@@ -50,6 +76,7 @@ app.include_router(retailers.router, prefix=settings.API_V1_STR, tags=["Retailer
 app.include_router(images.router, prefix=settings.API_V1_STR, tags=["Image Handling"])
 app.include_router(geo.router, prefix=settings.API_V1_STR, tags=["Geospatial Data"])
 app.include_router(options.router, prefix=settings.API_V1_STR, tags=["Filter Options"])
+app.include_router(diagnostics.router, prefix=settings.API_V1_STR, tags=["Diagnostics"])
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -5,6 +5,16 @@ class FilterOption(BaseModel):
     value: str
     label: str
 
+class FacetOption(BaseModel):
+    value: str
+    label: str
+    count: int
+
+class FilterFacets(BaseModel):
+    provinces: List[FacetOption]
+    districts: List[FacetOption]
+    dsDivisions: List[FacetOption]
+
 class Retailer(BaseModel):
     id: str
     name: str
@@ -14,6 +24,20 @@ class Retailer(BaseModel):
     province: Optional[str] = None
     district: Optional[str] = None
 
+class RetailerCluster(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+    # Per provider value (e.g. "dialog"): its boards (board context) or the retailers showing it (POSM context).
+    providerTotals: Dict[str, int]
+    # Set when the cluster is a single retailer.
+    retailerId: Optional[str] = None
+
+class RetailerClustersResponse(BaseModel):
+    zoom: int
+    count: int
+    clusters: List[RetailerCluster]
+
 class BoardData(BaseModel):
     id: str
     retailerId: Optional[str] = None
@@ -42,6 +66,9 @@ class BoardData(BaseModel):
     AIRTEL_TIN_BOARD: Optional[int] = Field(default=0)
     originalBoardImageIdentifier: Optional[str] = None
     detectedBoardImageIdentifier: Optional[str] = None
+    # Signed image URLs, only sent with `include=imageUrls`.
+    originalBoardImageUrl: Optional[str] = None
+    detectedBoardImageUrl: Optional[str] = None
 
 class ProviderMetric(BaseModel):
     provider: str
@@ -62,6 +89,17 @@ class BoardFiltersState(BaseModel):
     dsDivision: Optional[str] = 'all'
     retailerId: Optional[str] = 'all'
 
+class PageParams(BaseModel):
+    # Paging and sorting of list responses. Without them the full, unsorted list is returned.
+    offset: int = Field(default=0, ge=0)
+    limit: Optional[int] = Field(default=None, ge=0)
+    # A response field to sort by, e.g. 'PROFILE_NAME', or '-visibilityPercentage' for descending.
+    sort: Optional[str] = None
+    # The opaque `X-Next-Cursor` header of the previous page; takes the place of `offset`.
+    cursor: Optional[str] = None
+    # 'json' (default) or 'ndjson' to stream one row per line.
+    format: Optional[str] = 'json'
+
 class PosmData(BaseModel):
     id: str
     retailerId: Optional[str] = None
@@ -81,6 +119,9 @@ class PosmData(BaseModel):
     visibilityPercentage: Optional[float] = Field(default=0.0)
     originalPosmImageIdentifier: Optional[str] = None
     detectedPosmImageIdentifier: Optional[str] = None
+    # Signed image URLs, only sent with `include=imageUrls`.
+    originalPosmImageUrl: Optional[str] = None
+    detectedPosmImageUrl: Optional[str] = None
 
 class FetchPosmGeneralResponse(BaseModel):
     data: List[PosmData]
@@ -122,6 +163,10 @@ class ImageInfo(BaseModel):
     url: str
     type: str
 
+class ImageInfoBatchRequest(BaseModel):
+    # S3 ARNs or picsum seeds, as accepted by /image-info/{image_identifier}. Duplicates are resolved once.
+    identifiers: List[str] = Field(..., max_length=1000)
+
 class PosmBatchShare(BaseModel):
     provider: str
     percentage: float
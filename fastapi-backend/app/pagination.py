@@ -0,0 +1,143 @@
+import base64
+import json
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.models import PageParams
+from app.s3_utils import generate_presigned_urls
+from app.serialization import serialize_row
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Response headers with the paging information. They are listed in the CORS
+# `expose_headers` so that the frontend can read them.
+TOTAL_COUNT_HEADER = "X-Total-Count"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class RowTable:
+    """
+    Response rows held as columns (one list per field) until they are needed.
+    Sorting and paging work on the columns, so only the rows of the requested page
+    are ever turned into dicts and serialized.
+    """
+
+    def __init__(self, columns: Dict[str, list]):
+        self.columns = columns
+        self.length = len(next(iter(columns.values()))) if columns else 0
+
+    def order(self, sort: Optional[str]) -> np.ndarray:
+        """
+        Returns the row positions sorted by a field ('name' for ascending, '-name' for
+        descending). The sort is stable and missing values always come last.
+        """
+        if not sort:
+            return np.arange(self.length)
+        descending = sort.startswith('-')
+        values = self.columns.get(sort.lstrip('-'))
+        if values is None or self.length == 0:
+            return np.arange(self.length)
+        ordered = pd.Series(values, dtype=object).sort_values(ascending=not descending, kind='stable', na_position='last')
+        return ordered.index.to_numpy()
+
+    def take(self, positions: Iterable[int]) -> "RowTable":
+        """Returns a new table with only the rows at `positions` (e.g. one page), in that order."""
+        positions = list(positions)
+        return RowTable({name: [column[i] for i in positions] for name, column in self.columns.items()})
+
+    def rows(self, positions: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_rows(positions))
+
+    def iter_rows(self, positions: Optional[Iterable[int]] = None) -> Iterator[Dict[str, Any]]:
+        keys = list(self.columns.keys())
+        values = list(self.columns.values())
+        for i in range(self.length) if positions is None else positions:
+            yield dict(zip(keys, [column[i] for column in values]))
+
+
+def encode_cursor(offset: int, sort: Optional[str], limit: Optional[int]) -> str:
+    payload = json.dumps({"offset": offset, "sort": sort, "limit": limit}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _is_count(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not _is_count(payload.get("offset")):
+            raise ValueError("bad offset")
+        # The cursor comes from the client: its limit and sort are checked like the query parameters.
+        if payload.get("limit") is not None and not _is_count(payload["limit"]):
+            raise ValueError("bad limit")
+        if payload.get("sort") is not None and not isinstance(payload["sort"], str):
+            raise ValueError("bad sort")
+        return payload
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def resolve_page(page: PageParams, table: RowTable, row_model: Type[BaseModel]) -> Tuple[np.ndarray, Dict[str, str]]:
+    """
+    Applies the sort and the offset/limit (or cursor) of a request to a table.
+    Returns the row positions of the page and the paging headers.
+    """
+    offset, sort, limit = page.offset, page.sort, page.limit
+    if page.cursor:
+        cursor = decode_cursor(page.cursor)
+        offset = cursor["offset"]
+        sort = sort or cursor.get("sort")
+        limit = limit if limit is not None else cursor.get("limit")
+
+    if sort and sort.lstrip('-') not in row_model.model_fields:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort}'")
+
+    end = table.length if limit is None else min(offset + limit, table.length)
+    positions = table.order(sort)[offset:end]
+
+    headers = {TOTAL_COUNT_HEADER: str(table.length)}
+    if end < table.length:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(end, sort, limit)
+    return positions, headers
+
+
+def parse_include(include: Optional[str]) -> FrozenSet[str]:
+    """Splits the comma-separated `include` query parameter (extra response parts) into a set."""
+    return frozenset(part.strip() for part in include.split(',') if part.strip()) if include else frozenset()
+
+
+def add_image_urls(table: RowTable, url_fields: Dict[str, str]) -> Optional[float]:
+    """
+    Adds URL columns to a (page) table, e.g. {'originalBoardImageUrl': 'originalBoardImageIdentifier'}.
+    All the identifiers of the table are signed in one pass, each distinct one once, through
+    the shared presigned URL cache. Returns the time the first of the URLs expires, if any.
+    """
+    identifier_columns = [table.columns.get(identifier_field, [None] * table.length) for identifier_field in url_fields.values()]
+    urls, expires_at = generate_presigned_urls(identifier for column in identifier_columns for identifier in column)
+    for url_field, column in zip(url_fields, identifier_columns):
+        table.columns[url_field] = [urls.get(identifier) if identifier else None for identifier in column]
+    return expires_at
+
+
+def page_cache_key(page: PageParams) -> Tuple[Any, ...]:
+    return (page.offset, page.limit, page.sort, page.cursor)
+
+
+def ndjson_lines(
+    summary: Dict[str, Any], rows: Iterable[Dict[str, Any]], row_model: Type[BaseModel], exclude: Optional[Set[str]] = None
+) -> Iterator[bytes]:
+    """
+    Streams a response as newline-delimited JSON. The first line holds the summary
+    (e.g. `count` and `providerMetrics`), so a client can read it before any rows
+    arrive; every following line is one row, serialized as it is sent.
+    """
+    yield json.dumps(summary, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+    encode = serialize_row(row_model, exclude)
+    for row in rows:
+        yield encode(row) + b"\n"
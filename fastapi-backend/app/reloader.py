@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.cache import response_cache
+from app.config import settings
+from app.dataset import DatasetSnapshot
+from app.data_loader import get_dataset, new_snapshot, source_fingerprint, swap_dataset
+from app.frame_cache import load_report
+from app.shared_dataset import segment_report
+from app.indexes import get_geo_index, get_phase_partitions, get_retailer_timeline, get_spatial_index
+from app.routers.retailers import get_retailer_clusters
+
+
+def warm_snapshot(snapshot: DatasetSnapshot) -> None:
+    """Loads the frames of a snapshot and builds the indexes every filtered endpoint uses."""
+    for context in ("board", "posm"):
+        snapshot.frame(context)
+        get_phase_partitions(snapshot, context)
+        get_geo_index(snapshot, context)
+        get_spatial_index(snapshot, context)
+        # The unfiltered marker clusters, which every map opens with.
+        get_retailer_clusters(snapshot, context)
+    get_retailer_timeline(snapshot)
+
+
+class DataReloader:
+    """
+    Watches the source CSVs and swaps in a new dataset snapshot when they change.
+
+    The files are polled by their modification time and size. A change is only picked
+    up once the files have stopped changing for one poll interval, so a file that is
+    still being written is not read half-way. The new snapshot is loaded and its
+    indexes are built on the watcher thread; it then replaces the served snapshot in one
+    step. Requests that already hold the old snapshot finish on it, and caches keyed by
+    the dataset version stop serving the old entries.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Only one reload runs at a time (the watcher and a manual trigger may race).
+        self._reload_lock = threading.Lock()
+        self._pending_fingerprint = None
+        self.reloads = 0
+        self.last_reload_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def reload(self) -> DatasetSnapshot:
+        """Loads the current files into a new snapshot, warms it up and swaps it in."""
+        with self._reload_lock:
+            started = time.perf_counter()
+            snapshot = new_snapshot()
+            warm_snapshot(snapshot)
+            if snapshot.board.empty and snapshot.posm.empty:
+                raise RuntimeError("the new data is empty; keeping the current snapshot")
+            swap_dataset(snapshot)
+            # The old entries can never be served again; free their memory now.
+            response_cache.clear()
+            self.reloads += 1
+            self.last_reload_seconds = time.perf_counter() - started
+            print(f"Data reloaded as version {snapshot.version} in {self.last_reload_seconds:.2f}s.")
+            return snapshot
+
+    def check(self) -> bool:
+        """Reloads the data if the source files changed and have settled. Returns True after a reload."""
+        current = source_fingerprint()
+        if current == get_dataset().source_fingerprint or None in current:
+            self._pending_fingerprint = None
+            return False
+        if current != self._pending_fingerprint:
+            # Seen for the first time; wait one more interval for the writes to finish.
+            self._pending_fingerprint = current
+            return False
+        self._pending_fingerprint = None
+        try:
+            self.reload()
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error reloading data: {e}")
+            return False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.check()
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="data-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = get_dataset()
+        return {
+            "datasetVersion": snapshot.version,
+            "watching": self._thread is not None,
+            "intervalSeconds": self.interval_seconds,
+            "reloads": self.reloads,
+            "lastReloadSeconds": self.last_reload_seconds,
+            "lastError": self.last_error,
+            # How each frame was last loaded (from the binary cache or the CSV) and how long it took.
+            "frameLoads": dict(load_report),
+            # The shared-memory segment each frame is mapped from, when the dataset is shared.
+            "sharedSegments": dict(segment_report),
+        }
+
+
+# Started and stopped by the application lifespan.
+data_reloader = DataReloader(interval_seconds=settings.DATA_RELOAD_INTERVAL_SECONDS)
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, Set, Tuple
 import pandas as pd
-from app.models import FetchBoardsResponse, BoardFiltersState, ProviderMetric, BoardData
-from app.dependencies import get_boards_df
-from app.data_loader import filter_by_max_capture_phase
+import numpy as np
+from app.models import FetchBoardsResponse, BoardFiltersState, ProviderMetric, BoardData, PageParams
+from app.dependencies import get_dataset_snapshot
+from app.dataset import DatasetSnapshot
+from app.indexes import get_geo_index, get_phase_partitions
+from app.cache import CachedResponse, response_cache, normalize_filters
+from app.executors import data_executor
+from app.serialization import serialize_table_response
+from app.pagination import RowTable, resolve_page, page_cache_key, ndjson_lines, parse_include, add_image_urls, NDJSON_MEDIA_TYPE
+from app.config import settings
+from app.schema import positive_mask, str_or_none_list, int_or_none_list, count_matrix
 
 # Create an APIRouter instance. This helps organize endpoints into separate files.
 router = APIRouter()
@@ -26,23 +35,96 @@ def get_provider_name_from_value_boards(value: str) -> Optional[str]:
             return p_config["name"]
     return None
 
-def safe_int_convert(value, default_value: int = 0) -> Optional[int]:
-    
-    if pd.isna(value):
-        return None 
-    try:
-        # First convert to float to handle string representations of floats (e.g., "10.0")
-        numeric_value = float(value)
-        return int(numeric_value)
-    except (ValueError, TypeError):
-        # Return the default value if conversion fails.
-        return default_value
-
-def safe_str_convert(value) -> Optional[str]:
-    """Safely converts a value to a string, returning None for pandas NA/NaN values."""
-    if pd.isna(value):
-        return None
-    return str(value)
+# Board types in the order they are checked, with the suffix of their count columns.
+BOARD_TYPES_IN_ORDER = [('dealer', '_NAME_BOARD'), ('tin', '_TIN_BOARD'), ('vertical', '_SIDE_BOARD')]
+
+# Columns holding the image with the detected boards, for each board type.
+INF_S3_ARN_COL_SUFFIXES = {
+    "dealer": "_NAME_BOARD_INF_S3_ARN", "tin": "_TIN_BOARD_INF_S3_ARN", "vertical": "_SIDE_BOARD_INF_S3_ARN"
+}
+
+# The URL fields added with `include=imageUrls`, and the identifier field each one is signed from.
+BOARD_IMAGE_URL_FIELDS = {
+    'originalBoardImageUrl': 'originalBoardImageIdentifier',
+    'detectedBoardImageUrl': 'detectedBoardImageIdentifier',
+}
+
+BOARD_TEXT_FIELDS = ['PROFILE_NAME', 'PROVINCE', 'DISTRICT', 'DS_DIVISION', 'GN_DIVISION', 'SALES_DISTRICT', 'SALES_AREA', 'SALES_REGION']
+BOARD_COUNT_FIELDS = [
+    'DIALOG_NAME_BOARD', 'MOBITEL_NAME_BOARD', 'HUTCH_NAME_BOARD', 'AIRTEL_NAME_BOARD',
+    'DIALOG_SIDE_BOARD', 'MOBITEL_SIDE_BOARD', 'HUTCH_SIDE_BOARD', 'AIRTEL_SIDE_BOARD',
+    'DIALOG_TIN_BOARD', 'MOBITEL_TIN_BOARD', 'HUTCH_TIN_BOARD', 'AIRTEL_TIN_BOARD',
+]
+
+
+def determine_entry_provider_and_board_type(df: pd.DataFrame, provider_name_filter: Optional[str], board_type_filter: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Works out the primary provider and board type shown for every row (for display on the frontend).
+
+    - If filtering by a provider, that is the provider. The board type is the filtered one,
+      or otherwise the first type (dealer, tin, vertical) with a count > 0 for that provider.
+    - Otherwise the provider and board type come from the cell with the highest board count.
+      Ties go to the first cell in provider order, then board type order.
+    Rows without any boards are "Unknown" / "N/A". Missing counts are treated as 0.
+    """
+    row_count = len(df)
+    providers = np.full(row_count, "Unknown", dtype=object)
+    board_types = np.full(row_count, "N/A", dtype=object)
+
+    if provider_name_filter:
+        providers[:] = provider_name_filter
+        if board_type_filter != 'all':
+            board_types[:] = board_type_filter
+        else:
+            counts = count_matrix(df, [f"{provider_name_filter.upper()}{suffix}" for _, suffix in BOARD_TYPES_IN_ORDER])
+            has_board = counts > 0
+            first_type = has_board.argmax(axis=1)
+            found = has_board.any(axis=1)
+            type_values = np.array([bt for bt, _ in BOARD_TYPES_IN_ORDER], dtype=object)
+            board_types[found] = type_values[first_type[found]]
+        return providers, board_types
+
+    # Lay out the provider x board type counts as one row of cells per entry, in the
+    # order they would be checked one by one, and take the argmax (first maximum).
+    cells = [
+        (p_cfg['name'], bt_val, f"{p_cfg['name'].upper()}{suffix}")
+        for p_cfg in PROVIDERS_CONFIG_SIMPLE_BOARDS if p_cfg['name'] != 'All'
+        for bt_val, suffix in BOARD_TYPES_IN_ORDER
+        if board_type_filter == 'all' or bt_val == board_type_filter
+    ]
+    if not cells:
+        return providers, board_types
+
+    counts = count_matrix(df, [col for _, _, col in cells])
+    best_cell = counts.argmax(axis=1)
+    found = counts[np.arange(row_count), best_cell] > 0
+    providers[found] = np.array([p for p, _, _ in cells], dtype=object)[best_cell[found]]
+    board_types[found] = np.array([bt for _, bt, _ in cells], dtype=object)[best_cell[found]]
+    return providers, board_types
+
+
+def select_detected_image_ids(df: pd.DataFrame, providers: np.ndarray, board_types: np.ndarray) -> list:
+    """
+    Picks the image ARN (Amazon Resource Name) of the detected board for every row.
+    The provider-specific column (e.g. DIALOG_NAME_BOARD_INF_S3_ARN) is preferred, with a
+    fallback to the generic one (e.g. NAME_BOARD_INF_S3_ARN). Rows without a known
+    provider and board type get None.
+    """
+    detected = np.full(len(df), None, dtype=object)
+    for p_cfg in PROVIDERS_CONFIG_SIMPLE_BOARDS:
+        if p_cfg['name'] == 'All': continue
+        provider_rows = providers == p_cfg['name']
+        if not provider_rows.any(): continue
+        for bt_val, inf_col_suffix in INF_S3_ARN_COL_SUFFIXES.items():
+            rows = np.flatnonzero(provider_rows & (board_types == bt_val))
+            if rows.size == 0: continue
+            for col in (inf_col_suffix.lstrip('_'), f"{p_cfg['name'].upper()}{inf_col_suffix}"):
+                # The specific column is applied last, so it wins where it has a value.
+                if col in df.columns:
+                    values = df[col].iloc[rows]
+                    present = values.notna().to_numpy()
+                    detected[rows[present]] = str_or_none_list(values[present])
+    return detected.tolist()
 
 
 # --- API Endpoint Definition ---
@@ -51,28 +133,100 @@ def safe_str_convert(value) -> Optional[str]:
 async def fetch_boards_api(
     # `filters` are query parameters parsed into a Pydantic model by FastAPI.
     filters: BoardFiltersState = Depends(),
-    # `board_df_raw` is the main DataFrame, injected by the `get_boards_df` dependency.
-    board_df_raw: pd.DataFrame = Depends(get_boards_df)
+    # Optional paging, sorting and streaming of the rows.
+    page: PageParams = Depends(),
+    # Extra response parts: 'imageUrls' adds signed URLs for the image identifiers of every row.
+    include: Optional[str] = Query(None),
+    # The shared dataset snapshot, injected by the `get_dataset_snapshot` dependency.
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
+    """
+    Returns the board entries matching the filters, with the board counts per provider.
+    `count` and `providerMetrics` always cover every matching entry, while `data` only
+    holds the requested page. With `format=ndjson` the summary is sent on the first line
+    and the rows are streamed one per line. With `include=imageUrls` every row also carries
+    signed URLs for its images, resolved in one pass over the page.
+    Serialized JSON responses are cached per filter combination, page and dataset version.
+    """
+    include_image_urls = 'imageUrls' in parse_include(include)
+    # The URL fields are left out of the response unless they were asked for.
+    url_fields = set() if include_image_urls else set(BOARD_IMAGE_URL_FIELDS)
+
+    # The filtering and serialization run in the data pool, off the event loop.
+    if page.format == 'ndjson':
+        return await data_executor.run(stream_boards_page, filters, page, include_image_urls, url_fields, dataset)
+
+    cache_key = (normalize_filters(filters, case_insensitive=('salesRegion', 'salesDistrict', 'dsDivision')), page_cache_key(page), include_image_urls)
+    cached = response_cache.get("boards", dataset.version, cache_key)
+    if cached is None:
+        cached = await data_executor.run(render_boards_page, filters, page, include_image_urls, url_fields, dataset)
+        response_cache.put("boards", dataset.version, cache_key, cached)
+    return Response(content=cached.body, media_type="application/json", headers=cached.headers)
+
+
+def stream_boards_page(
+    filters: BoardFiltersState, page: PageParams, include_image_urls: bool, url_fields: Set[str], dataset: DatasetSnapshot
+) -> StreamingResponse:
+    """Builds the requested page and streams it as NDJSON, the summary on the first line."""
+    table, provider_metrics = build_boards_response(filters, dataset)
+    positions, headers = resolve_page(page, table, BoardData)
+    page_table = table.take(positions)
+    if include_image_urls:
+        add_image_urls(page_table, BOARD_IMAGE_URL_FIELDS)
+    summary = {"count": table.length, "providerMetrics": [m.model_dump() for m in provider_metrics]}
+    return StreamingResponse(
+        ndjson_lines(summary, page_table.iter_rows(), BoardData, exclude=url_fields),
+        media_type=NDJSON_MEDIA_TYPE, headers=headers,
+    )
+
+
+def render_boards_page(
+    filters: BoardFiltersState, page: PageParams, include_image_urls: bool, url_fields: Set[str], dataset: DatasetSnapshot
+) -> CachedResponse:
+    """Builds and serializes the requested page, as it is kept in the response cache."""
+    table, provider_metrics = build_boards_response(filters, dataset)
+    positions, headers = resolve_page(page, table, BoardData)
+    page_table = table.take(positions)
+    expires_at = None
+    if include_image_urls:
+        urls_expire_at = add_image_urls(page_table, BOARD_IMAGE_URL_FIELDS)
+        # Stop serving the cached body before its URLs would be signed again.
+        if urls_expire_at is not None:
+            expires_at = urls_expire_at - settings.S3_URL_REFRESH_MARGIN_SECONDS
+    body = serialize_table_response(
+        FetchBoardsResponse, "data", page_table, exclude=url_fields,
+        count=table.length, providerMetrics=provider_metrics,
+    )
+    return CachedResponse(body, headers, expires_at)
+
+def build_boards_response(filters: BoardFiltersState, dataset: DatasetSnapshot) -> Tuple[RowTable, List[ProviderMetric]]:
+    """
+    Filters the board entries and builds the response rows (as columns, see `RowTable`)
+    and the per-provider board counts of all the matching entries.
+    """
+    # `board_df_raw` is the main DataFrame.
+    board_df_raw = dataset.board
    
     # --- Initial Data Validation ---
     if board_df_raw.empty:
-        return FetchBoardsResponse(data=[], count=0, providerMetrics=[])
+        return RowTable({}), []
 
-    # Filter the DataFrame to only include rows from the latest capture phase.
-    df = filter_by_max_capture_phase(board_df_raw, "board_data_for_api")
-    if df.empty:
-        return FetchBoardsResponse(data=[], count=0, providerMetrics=[])
+    # The injected frame is shared by every request, so it is never modified here.
+    # Each filter narrows down a boolean mask over the full frame, and the matching
+    # rows are only taken out once all the filters have been applied.
+    # Start with the rows from the latest capture phase, which are worked out once per dataset version.
+    mask = get_phase_partitions(dataset, "board").latest_mask.copy()
+    if not mask.any():
+        return RowTable({}), []
 
     # --- Filtering Logic ---
 
     # 1. Filter by Retailer ID (PROFILE_ID)
-    if filters.retailerId and filters.retailerId != 'all' and 'PROFILE_ID' in df.columns:
-        # Ensure PROFILE_ID is string type for reliable comparison
-        df['PROFILE_ID_STR'] = df['PROFILE_ID'].astype(str)
-        df = df[df['PROFILE_ID_STR'] == filters.retailerId]
-        if df.empty:
-            return FetchBoardsResponse(data=[], count=0, providerMetrics=[])
+    if filters.retailerId and filters.retailerId != 'all' and 'PROFILE_ID' in board_df_raw.columns:
+        # PROFILE_ID is stored as a canonical string key, so it can be compared directly.
+        mask &= (board_df_raw['PROFILE_ID'] == filters.retailerId).to_numpy()
+        if not mask.any():
+            return RowTable({}), []
 
     # 2. Complex Filtering by Provider and Board Type
     provider_name_filter = get_provider_name_from_value_boards(filters.provider) if filters.provider and filters.provider != 'all' else None
@@ -80,8 +234,8 @@ async def fetch_boards_api(
 
     # This block applies filters if a specific provider or board type is selected.
     if provider_name_filter or board_type_filter != 'all':
-        # Start with a Series of all False values. We will OR conditions into this.
-        conditions = pd.Series(False, index=df.index)
+        # Start with all False values. We will OR conditions into this.
+        conditions = np.zeros(len(board_df_raw), dtype=bool)
         
         # Determine which providers to check. If a specific one is filtered, use it. Otherwise, use all.
         providers_to_check_for_filtering = [provider_name_filter] if provider_name_filter else [p['name'] for p in PROVIDERS_CONFIG_SIMPLE_BOARDS if p['name'] != 'All']
@@ -98,141 +252,61 @@ async def fetch_boards_api(
             p_prefix_check = p_name_check.upper()
             for suffix_check in suffixes_to_check_for_filtering:
                 col_check = f"{p_prefix_check}{suffix_check}"
-                if col_check in df.columns:
+                if col_check in board_df_raw.columns:
                     # The '|' is a bitwise OR. A row is kept if it meets ANY of the conditions.
                     # We check if the board count in the column is greater than 0.
-                    conditions = conditions | (pd.to_numeric(df[col_check], errors='coerce').fillna(0) > 0)
+                    conditions |= positive_mask(board_df_raw[col_check])
         
-        # Apply the combined conditions to the DataFrame.
-        if conditions.any():
-            df = df[conditions]
-        # If any filter was applied but resulted in no matches, return an empty result set.
-        elif provider_name_filter or board_type_filter != 'all':
-            df = pd.DataFrame(columns=df.columns)
-            
-        if df.empty:
-            return FetchBoardsResponse(data=[], count=0, providerMetrics=[])
+        # Keep only the rows that meet the combined conditions. If none of the remaining
+        # rows match, the result is empty.
+        mask &= conditions
+        if not mask.any():
+            return RowTable({}), []
 
     # 3. Geographical Filtering
-    temp_df_for_geo_filtering = df.copy() # Use a copy to avoid SettingWithCopyWarning
+    # Province (falling back to 'SALES_REGION'), district (falling back to 'SALES_DISTRICT')
+    # and DS division are looked up in the precomputed geography index of this dataset version.
+    mask &= get_geo_index(dataset, "board").mask(
+        province=filters.salesRegion, district=filters.salesDistrict, dsDivision=filters.dsDivision
+    )
     
-    # Use 'PROVINCE' if it exists, otherwise fall back to 'SALES_REGION'.
-    province_col_actual = 'PROVINCE' if 'PROVINCE' in temp_df_for_geo_filtering.columns else 'SALES_REGION'
-    if filters.salesRegion and filters.salesRegion != 'all' and province_col_actual in temp_df_for_geo_filtering.columns:
-        # Create a temporary column for case-insensitive matching.
-        temp_df_for_geo_filtering[f"{province_col_actual}_LOWER_UNDERSCORE"] = temp_df_for_geo_filtering[province_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        temp_df_for_geo_filtering = temp_df_for_geo_filtering[temp_df_for_geo_filtering[f"{province_col_actual}_LOWER_UNDERSCORE"] == filters.salesRegion.lower()]
-
-    # Similar fallback and case-insensitive matching for District.
-    district_col_actual = 'DISTRICT' if 'DISTRICT' in temp_df_for_geo_filtering.columns else 'SALES_DISTRICT'
-    if filters.salesDistrict and filters.salesDistrict != 'all' and district_col_actual in temp_df_for_geo_filtering.columns:
-        temp_df_for_geo_filtering[f"{district_col_actual}_LOWER_UNDERSCORE"] = temp_df_for_geo_filtering[district_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        temp_df_for_geo_filtering = temp_df_for_geo_filtering[temp_df_for_geo_filtering[f"{district_col_actual}_LOWER_UNDERSCORE"] == filters.salesDistrict.lower()]
-    
-    # Filtering for DS Division.
-    if filters.dsDivision and filters.dsDivision != 'all' and 'DS_DIVISION' in temp_df_for_geo_filtering.columns:
-        temp_df_for_geo_filtering["DS_DIVISION_LOWER_UNDERSCORE"] = temp_df_for_geo_filtering['DS_DIVISION'].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        temp_df_for_geo_filtering = temp_df_for_geo_filtering[temp_df_for_geo_filtering["DS_DIVISION_LOWER_UNDERSCORE"] == filters.dsDivision.lower()]
-    
-    df = temp_df_for_geo_filtering
-    
-    if df.empty:
-        return FetchBoardsResponse(data=[], count=0, providerMetrics=[])
+    if not mask.any():
+        return RowTable({}), []
+
+    # Take out the matching rows once, after all the filters have been applied.
+    df = board_df_raw[mask]
 
     # --- Data Processing and Transformation ---
-    # Convert the filtered DataFrame rows into a list of Pydantic models.
-    board_data_list: List[BoardData] = []
-    for rowIndex, row_series in df.iterrows():
-        row = row_series.to_dict()
-        
-        # Logic to determine the primary provider and board type for this specific entry.
-        # This is for display purposes on the frontend.
-        determined_provider_for_entry = "Unknown"
-        determined_board_type_for_entry = "N/A"
-        highest_count_for_entry = 0
-
-        if provider_name_filter:
-            # If filtering by a provider, that is the determined provider.
-            determined_provider_for_entry = provider_name_filter
-            # If also filtering by a board type, that is the determined board type.
-            if board_type_filter != 'all':
-                determined_board_type_for_entry = board_type_filter
-            else:
-                # Otherwise, find the first board type with a count > 0 for that provider.
-                for bt_val_iter_entry, _, suffix_iter_entry in [('dealer', 'Dealer Board', '_NAME_BOARD'), ('tin', 'Tin Plate', '_TIN_BOARD'), ('vertical', 'Vertical Board', '_SIDE_BOARD')]:
-                    col_name_iter_entry = f"{determined_provider_for_entry.upper()}{suffix_iter_entry}"
-                    current_val_board_type_check = safe_int_convert(row.get(col_name_iter_entry), 0)
-                    if current_val_board_type_check > 0:
-                        determined_board_type_for_entry = bt_val_iter_entry
-                        break
-        else: 
-            # If no provider filter, find the provider with the highest board count for this row.
-            for p_cfg_iter_entry in PROVIDERS_CONFIG_SIMPLE_BOARDS:
-                if p_cfg_iter_entry['name'] == 'All': continue
-                p_key_iter_entry = p_cfg_iter_entry['name'].upper()
-                for bt_val_iter_entry, _, suffix_iter_entry in [('dealer', 'Dealer Board', '_NAME_BOARD'), ('tin', 'Tin Plate', '_TIN_BOARD'), ('vertical', 'Vertical Board', '_SIDE_BOARD')]:
-                    if board_type_filter != 'all' and bt_val_iter_entry != board_type_filter:
-                        continue
-                    col_name_iter_entry = f"{p_key_iter_entry}{suffix_iter_entry}"
-                    current_val_entry = safe_int_convert(row.get(col_name_iter_entry), 0)
-                    if current_val_entry > 0:
-                        if current_val_entry > highest_count_for_entry:
-                            highest_count_for_entry = current_val_entry
-                            determined_provider_for_entry = p_cfg_iter_entry['name']
-                            determined_board_type_for_entry = bt_val_iter_entry
-                        elif determined_provider_for_entry == "Unknown":
-                             # Fallback to the first one found if none have a higher count
-                            determined_provider_for_entry = p_cfg_iter_entry['name']
-                            determined_board_type_for_entry = bt_val_iter_entry
-        
-        # Logic to find the correct image ARN (Amazon Resource Name) for the detected board.
-        original_id = safe_str_convert(row.get('S3_ARN'))
-        detected_id = None
-        inf_s3_arn_col_map = {
-            "dealer": "_NAME_BOARD_INF_S3_ARN", "tin": "_TIN_BOARD_INF_S3_ARN", "vertical": "_SIDE_BOARD_INF_S3_ARN"
-        }
-        if determined_provider_for_entry != "Unknown" and determined_board_type_for_entry in inf_s3_arn_col_map:
-            inf_col_suffix = inf_s3_arn_col_map[determined_board_type_for_entry]
-            detected_id_col_specific = f'{determined_provider_for_entry.upper()}{inf_col_suffix}'
-            detected_id_col_generic_key = inf_col_suffix.lstrip('_')
-            
-            # Prefer the specific ARN column (e.g., DIALOG_NAME_BOARD_INF_S3_ARN) but fall back to a generic one if needed.
-            if detected_id_col_specific in row and pd.notna(row.get(detected_id_col_specific)):
-                detected_id = safe_str_convert(row.get(detected_id_col_specific))
-            elif detected_id_col_generic_key in row and pd.notna(row.get(detected_id_col_generic_key)):
-                detected_id = safe_str_convert(row.get(detected_id_col_generic_key))
-
-        # Create a Pydantic model instance for the current row. This validates the data types.
-        item = BoardData(
-            id=safe_str_convert(row.get('IMAGE_REF_ID', f"board_{rowIndex}_{row.get('PROFILE_ID', '')}")),
-            retailerId=safe_str_convert(row.get('PROFILE_ID')),
-            PROFILE_ID=safe_str_convert(row.get('PROFILE_ID')),
-            PROFILE_NAME=safe_str_convert(row.get('PROFILE_NAME')),
-            PROVINCE=safe_str_convert(row.get('PROVINCE')),
-            DISTRICT=safe_str_convert(row.get('DISTRICT')),
-            DS_DIVISION=safe_str_convert(row.get('DS_DIVISION')),
-            GN_DIVISION=safe_str_convert(row.get('GN_DIVISION')),
-            SALES_DISTRICT=safe_str_convert(row.get('SALES_DISTRICT')),
-            SALES_AREA=safe_str_convert(row.get('SALES_AREA')),
-            SALES_REGION=safe_str_convert(row.get('SALES_REGION')),
-            boardType=determined_board_type_for_entry,
-            provider=determined_provider_for_entry,
-            DIALOG_NAME_BOARD=safe_int_convert(row.get('DIALOG_NAME_BOARD')),
-            MOBITEL_NAME_BOARD=safe_int_convert(row.get('MOBITEL_NAME_BOARD')),
-            HUTCH_NAME_BOARD=safe_int_convert(row.get('HUTCH_NAME_BOARD')),
-            AIRTEL_NAME_BOARD=safe_int_convert(row.get('AIRTEL_NAME_BOARD')),
-            DIALOG_SIDE_BOARD=safe_int_convert(row.get('DIALOG_SIDE_BOARD')),
-            MOBITEL_SIDE_BOARD=safe_int_convert(row.get('MOBITEL_SIDE_BOARD')),
-            HUTCH_SIDE_BOARD=safe_int_convert(row.get('HUTCH_SIDE_BOARD')),
-            AIRTEL_SIDE_BOARD=safe_int_convert(row.get('AIRTEL_SIDE_BOARD')),
-            DIALOG_TIN_BOARD=safe_int_convert(row.get('DIALOG_TIN_BOARD')),
-            MOBITEL_TIN_BOARD=safe_int_convert(row.get('MOBITEL_TIN_BOARD')),
-            HUTCH_TIN_BOARD=safe_int_convert(row.get('HUTCH_TIN_BOARD')),
-            AIRTEL_TIN_BOARD=safe_int_convert(row.get('AIRTEL_TIN_BOARD')),
-            originalBoardImageIdentifier=original_id,
-            detectedBoardImageIdentifier=detected_id
-        )
-        board_data_list.append(item)
+    # The display provider, board type and detected image are worked out for all the
+    # rows at once, and the response rows are then emitted in bulk.
+    determined_providers, determined_board_types = determine_entry_provider_and_board_type(df, provider_name_filter, board_type_filter)
+    detected_ids = select_detected_image_ids(df, determined_providers, determined_board_types)
+
+    if 'IMAGE_REF_ID' in df.columns:
+        ids = str_or_none_list(df['IMAGE_REF_ID'])
+    else:
+        profile_ids = df['PROFILE_ID'].tolist() if 'PROFILE_ID' in df.columns else [''] * len(df)
+        ids = [f"board_{row_index}_{profile_id}" for row_index, profile_id in zip(df.index, profile_ids)]
+
+    def str_column(col: str) -> list:
+        return str_or_none_list(df[col]) if col in df.columns else [None] * len(df)
+
+    def int_column(col: str) -> list:
+        return int_or_none_list(df[col]) if col in df.columns else [None] * len(df)
+
+    profile_id_values = str_column('PROFILE_ID')
+    columns: Dict[str, list] = {
+        'id': ids,
+        'retailerId': profile_id_values,
+        'PROFILE_ID': profile_id_values,
+        **{col: str_column(col) for col in BOARD_TEXT_FIELDS},
+        'boardType': determined_board_types.tolist(),
+        'provider': determined_providers.tolist(),
+        **{col: int_column(col) for col in BOARD_COUNT_FIELDS},
+        'originalBoardImageIdentifier': str_column('S3_ARN'),
+        'detectedBoardImageIdentifier': detected_ids,
+    }
+    table = RowTable(columns)
     
     # --- Metric Calculation ---
     # Calculate the total board counts for each provider based on the filtered data.
@@ -260,14 +334,11 @@ async def fetch_boards_api(
             for suffix_metric in suffixes_to_sum_metrics:
                 col_metric = f"{p_prefix_metric}{suffix_metric}"
                 if col_metric in df.columns:
-                    total_boards_for_provider += pd.to_numeric(df[col_metric], errors='coerce').fillna(0).sum()
+                    total_boards_for_provider += df[col_metric].sum()
             
             provider_metrics_list_updated.append(ProviderMetric(provider=p_name_metric, count=int(total_boards_for_provider)))
     
     # --- Final Response Construction ---
-    # Assemble the final response object according to the FetchBoardsResponse model.
-    return FetchBoardsResponse(
-        data=board_data_list,
-        count=len(board_data_list),
-        providerMetrics=provider_metrics_list_updated
-    )
\ No newline at end of file
+    # The rows are only built for the requested page; they are validated once against
+    # the response model when the page is serialized.
+    return table, provider_metrics_list_updated
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict
+from starlette.concurrency import run_in_threadpool
+from app.cache import response_cache
+from app.executors import executor_stats
+from app.s3_utils import presigned_url_cache
+from app.reloader import data_reloader
+
+router = APIRouter()
+
+
+@router.get("/diagnostics/cache")
+async def get_cache_stats_api() -> Dict[str, Any]:
+    """
+    Reports the size of the response cache and its hit/miss counters per endpoint,
+    to help choose RESPONSE_CACHE_MAX_BYTES, and the same for the presigned URL cache.
+    """
+    return {**response_cache.stats(), "presignedUrls": presigned_url_cache.stats()}
+
+
+@router.get("/diagnostics/executors")
+async def get_executor_stats_api() -> Dict[str, Any]:
+    """
+    Reports the load of the worker pools (running and waiting calls, rejections, average
+    wait and run times), to help choose the *_POOL_WORKERS and *_POOL_MAX_QUEUE settings.
+    """
+    return executor_stats()
+
+
+@router.get("/diagnostics/dataset")
+async def get_dataset_status_api() -> Dict[str, Any]:
+    """Reports the dataset version being served and the state of the data reloader."""
+    return data_reloader.stats()
+
+
+@router.post("/diagnostics/reload")
+async def reload_dataset_api() -> Dict[str, Any]:
+    """Reloads the CSV files now, without waiting for the reloader to notice a change."""
+    try:
+        await run_in_threadpool(data_reloader.reload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return data_reloader.stats()
@@ -1,48 +1,58 @@
-from fastapi import APIRouter, Depends
+import json
+
+from fastapi import APIRouter, Depends, Request
 from app.models import GeoJsonCollection
-from app.dependencies import get_posm_df
-import geopandas as gpd
+from app.dependencies import get_dataset_snapshot
+from app.dataset import DatasetSnapshot
+from app.districts import load_district_geometry
+from app.cache import serialize_response
+from app.compression import precompressed_response
+from app.executors import options_executor
 import pandas as pd
 
 router = APIRouter()
 
-# IMPORTANT: Update this path to where your shapefiles are located within the Docker container or server.
-# This path assumes a 'data/geo' folder relative to your app's root.
-SHAPEFILE_PATH = "app/data/geo/sri_lanka_districts.shp"
+PERCENTAGE_COLUMNS = [
+    'DIALOG_AREA_PERCENTAGE', 'AIRTEL_AREA_PERCENTAGE',
+    'MOBITEL_AREA_PERCENTAGE', 'HUTCH_AREA_PERCENTAGE'
+]
 
-@router.get("/geo/districts", response_model=GeoJsonCollection)
-async def fetch_geo_districts_api(posm_df: pd.DataFrame = Depends(get_posm_df)):
+
+def aggregate_district_visibility(posm_df: pd.DataFrame) -> pd.DataFrame:
+    """Computes the mean visibility of each provider per district shape ID (SHAPEISO)."""
+    # Only the columns needed for the aggregation are pulled out of the shared frame.
+    # The percentages are already numeric; they are widened to float64 for the means.
+    df_metrics = posm_df[PERCENTAGE_COLUMNS].astype('float64').fillna(0)
+    return df_metrics.groupby(posm_df['SHAPEISO'])[PERCENTAGE_COLUMNS].mean().reset_index()
+
+
+def build_districts_geojson(dataset: DatasetSnapshot) -> bytes:
     """
-    Loads district shapefile, merges it with aggregated POSM data,
-    and returns a GeoJsonCollection for choropleth mapping.
+    Merges the district geometry with the POSM aggregates of a dataset version and
+    returns the serialized GeoJSON collection.
     """
-    try:
-        gdf_districts = gpd.read_file(SHAPEFILE_PATH)
-    except Exception as e:
-        print(f"Error loading shapefile: {e}")
-        # Return an empty feature collection if the shapefile can't be loaded
-        return GeoJsonCollection(type="FeatureCollection", features=[])
-
-    if posm_df.empty or 'SHAPEISO' not in posm_df.columns:
-        return GeoJsonCollection(type="FeatureCollection", features=[])
-
-    df_metrics = posm_df.copy()
-    percentage_columns = [
-        'DIALOG_AREA_PERCENTAGE', 'AIRTEL_AREA_PERCENTAGE',
-        'MOBITEL_AREA_PERCENTAGE', 'HUTCH_AREA_PERCENTAGE'
-    ]
-    
-    for col in percentage_columns:
-        df_metrics[col] = pd.to_numeric(df_metrics[col], errors='coerce')
-    df_metrics.fillna(0, inplace=True)
-
-    # Group by district shape ID and calculate the mean visibility for each provider
-    df_agg = df_metrics.groupby('SHAPEISO')[percentage_columns].mean().reset_index()
-    
+    gdf_districts = load_district_geometry()
+    posm_df = dataset.posm
+    if gdf_districts is None or posm_df.empty or 'SHAPEISO' not in posm_df.columns:
+        return serialize_response(GeoJsonCollection, GeoJsonCollection(type="FeatureCollection", features=[]))
+
+    df_agg = aggregate_district_visibility(posm_df)
+
     # Merge the geographic data with the calculated POSM metrics
     merged_gdf = gdf_districts.merge(df_agg, left_on='shapeISO', right_on='SHAPEISO', how='left')
-    merged_gdf[percentage_columns] = merged_gdf[percentage_columns].fillna(0)
+    merged_gdf[PERCENTAGE_COLUMNS] = merged_gdf[PERCENTAGE_COLUMNS].fillna(0)
+
+    # Convert the final GeoDataFrame to a GeoJSON structure and check it against the response model.
+    return serialize_response(GeoJsonCollection, json.loads(merged_gdf.to_json()))
+
 
-    # Convert the final GeoDataFrame to a GeoJSON structure
-    # The Pydantic model will handle the conversion, so we can directly return the dict
-    return merged_gdf.to_json()
\ No newline at end of file
+@router.get("/geo/districts", response_model=GeoJsonCollection)
+async def fetch_geo_districts_api(request: Request, dataset: DatasetSnapshot = Depends(get_dataset_snapshot)):
+    """
+    Returns the district shapes merged with the average POSM visibility per provider,
+    as a GeoJsonCollection for choropleth mapping.
+    The GeoJSON is built (and compressed) once per dataset version and served from memory afterwards.
+    """
+    return await options_executor.run(
+        precompressed_response, request, dataset, "geo_districts_geojson", lambda: build_districts_geojson(dataset)
+    )
@@ -1,31 +1,62 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-from app.models import ImageInfo
+from typing import Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from app.models import ImageInfo, ImageInfoBatchRequest
 from app.s3_utils import generate_presigned_url
 
 router = APIRouter()
 
-@router.get("/image-info/{image_identifier}", response_model=ImageInfo)
-async def fetch_image_info_api(image_identifier: str):
+
+def resolve_image_info(image_identifier: str) -> Optional[ImageInfo]:
     """
-    Frontend's api.ts directly uses picsum. This endpoint can be a proxy 
-    or modified if imageIdentifier is actually an S3 ARN or an ID that maps to one.
-    Assuming image_identifier could be a simple seed for picsum as in api.ts,
-    OR it could be an S3 ARN.
+    Resolves an image identifier to a URL. S3 ARNs get a presigned URL; anything else
+    is treated as a seed for picsum, matching the frontend. Returns None if no URL can be made.
     """
     if "arn:aws:s3:::" in image_identifier: # If it looks like an S3 ARN
         url = generate_presigned_url(image_identifier)
         if not url:
-            raise HTTPException(status_code=404, detail="Could not generate URL for S3 ARN")
+            return None
         return ImageInfo(id=image_identifier, url=url, type="s3_presigned")
     else: # Treat as a seed for picsum, matching frontend
         url = f"https://picsum.photos/seed/{image_identifier}/400/300"
         return ImageInfo(id=image_identifier, url=url, type="original_mock")
 
+
+@router.get("/image-info/{image_identifier}", response_model=ImageInfo)
+async def fetch_image_info_api(image_identifier: str):
+    """
+    Frontend's api.ts directly uses picsum. This endpoint can be a proxy 
+    or modified if imageIdentifier is actually an S3 ARN or an ID that maps to one.
+    Assuming image_identifier could be a simple seed for picsum as in api.ts,
+    OR it could be an S3 ARN.
+    """
+    image_info = resolve_image_info(image_identifier)
+    if image_info is None:
+        raise HTTPException(status_code=404, detail="Could not generate URL for S3 ARN")
+    return image_info
+
+
+@router.post("/image-info/batch", response_model=Dict[str, ImageInfo])
+async def fetch_image_info_batch_api(request: ImageInfoBatchRequest):
+    """
+    Resolves many image identifiers in one request (e.g. all the images of a table page),
+    instead of one /image-info call per image. Each distinct identifier is resolved once;
+    the result maps every identifier to its ImageInfo. Identifiers that can't be resolved
+    are left out.
+    """
+    identifiers = list(dict.fromkeys(i for i in request.identifiers if i))
+
+    def resolve_all() -> Dict[str, ImageInfo]:
+        resolved = {identifier: resolve_image_info(identifier) for identifier in identifiers}
+        return {identifier: info for identifier, info in resolved.items() if info is not None}
+
+    # Signing is CPU work, so a large batch runs in the thread pool instead of the event loop.
+    return await run_in_threadpool(resolve_all)
+
 # Endpoint to specifically get S3 presigned URLs if ARNs are passed
 @router.get("/image-s3-url", response_model=ImageInfo)
 async def get_s3_image_url(s3_arn: str = Query(...)):
     url = generate_presigned_url(s3_arn)
     if not url:
         raise HTTPException(status_code=404, detail="Image not found or URL generation failed.")
-    return ImageInfo(id=s3_arn, url=url, type="s3_presigned")
\ No newline at end of file
+    return ImageInfo(id=s3_arn, url=url, type="s3_presigned")
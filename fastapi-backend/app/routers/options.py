@@ -1,9 +1,17 @@
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Optional
 import pandas as pd 
-from app.models import FilterOption 
-from app.dependencies import get_boards_df, get_posm_df 
+import numpy as np
+from app.models import FilterOption, FacetOption, FilterFacets
+from app.dependencies import get_dataset_snapshot
+from app.dataset import DatasetSnapshot
+from app.schema import positive_mask
+from app.indexes import get_geo_index, normalize_geo_name
+from app.admin_hierarchy import load_admin_hierarchy
+from app.cache import serialize_list, serialize_response
+from app.compression import precompressed_response
+from app.executors import options_executor
 
 router = APIRouter()
 
@@ -16,6 +24,13 @@ PROVIDERS_CONFIG_OPTIONS_INTERNAL = [
     {"value": "hutch", "name": "Hutch"},
 ]
 
+# Map the simple board type name to the endings of the column names in our data.
+BOARD_TYPE_SUFFIXES = {
+    'dealer': ['_NAME_BOARD'],
+    'tin': ['_TIN_BOARD'],
+    'vertical': ['_SIDE_BOARD'],
+}
+
 
 
 def get_provider_name_from_value_options(value: str) -> Optional[str]:
@@ -27,45 +42,48 @@ def get_provider_name_from_value_options(value: str) -> Optional[str]:
             return p_config["name"]
     return None
 
-def get_unique_options_from_df_options(df: pd.DataFrame, column_name: str) -> List[FilterOption]:
+def get_facet_options(values: pd.Series, mask: np.ndarray) -> List[FacetOption]:
     """
-    This function takes a column from our data, finds all the unique values,
-    and formats them perfectly for the frontend dropdowns.
-    For example, it turns "Western Province" into { value: 'western_province', label: 'Western Province' }.
+    This function takes a column from our data, finds the unique values among the
+    selected rows, and formats them perfectly for the frontend dropdowns, together
+    with the number of rows that have each value.
+    For example, it turns "Western Province" into { value: 'western_province', label: 'Western Province', count: 12 }.
     """
-    if df.empty or column_name not in df.columns:
+    if not mask.any():
         return []
-    # Get unique values, remove any empty ones, sort them, and put them in a list.
-    unique_values = pd.Series(df[column_name].dropna().unique()).astype(str).sort_values().tolist()
-    
-    # Create the list of {value, label} objects.
-    options = [
-        FilterOption(
-            value=str(val).lower().replace(' ', '_'), 
-            label=str(val)                           
-        ) for val in unique_values if str(val).strip() != "" and str(val).lower() != "nan"
+    # Count the selected rows per value. Categorical columns are counted on their codes.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories))
+        counts_by_label = {str(label): int(n) for label, n in zip(values.cat.categories, counts) if n}
+    else:
+        counts_by_label = {}
+        for label, n in values[mask].dropna().value_counts(sort=False).items():
+            counts_by_label[str(label)] = counts_by_label.get(str(label), 0) + int(n)
+
+    # Remove any empty values, sort them, and create the list of {value, label, count} objects.
+    return [
+        FacetOption(value=normalize_geo_name(label), label=label, count=count)
+        for label, count in sorted(counts_by_label.items())
+        if label.strip() != "" and label.lower() != "nan"
     ]
-    return options
 
-def filter_df_by_board_type(df: pd.DataFrame, board_type: Optional[str]) -> pd.DataFrame:
-   
-   
+
+def board_type_mask(df: pd.DataFrame, board_type: Optional[str]) -> np.ndarray:
+    """
+    Returns a boolean mask of the rows that have at least one board of the given type
+    (for any provider). Every row is selected when no board type is given.
+    """
     if not board_type or board_type == 'all' or df.empty:
-        return df
+        return np.ones(len(df), dtype=bool)
 
-    # This will keep track of which rows to keep.
-    board_type_conditions = pd.Series(False, index=df.index)
-    
-    # Map the simple board type name to the endings of the column names in our data.
-    board_type_suffixes_map = {
-        'dealer': ['_NAME_BOARD'],
-        'tin': ['_TIN_BOARD'],
-        'vertical': ['_SIDE_BOARD'],
-    }
-    suffixes_to_check = board_type_suffixes_map.get(board_type.lower(), [])
+    suffixes_to_check = BOARD_TYPE_SUFFIXES.get(board_type.lower(), [])
 
     if not suffixes_to_check:
-        return df 
+        return np.ones(len(df), dtype=bool)
+
+    # This will keep track of which rows to keep.
+    board_type_conditions = np.zeros(len(df), dtype=bool)
 
     # Check for each provider and each board type suffix.
     for p_config in PROVIDERS_CONFIG_OPTIONS_INTERNAL:
@@ -75,188 +93,293 @@ def filter_df_by_board_type(df: pd.DataFrame, board_type: Optional[str]) -> pd.D
             col_name = f"{p_prefix}{suffix}" 
             if col_name in df.columns:
                 
-                board_type_conditions = board_type_conditions | (pd.to_numeric(df[col_name], errors='coerce').fillna(0) > 0)
-    
-    if board_type_conditions.any():
-        return df[board_type_conditions] # Return only the rows that matched.
-        
-    return pd.DataFrame(columns=df.columns) 
+                board_type_conditions |= positive_mask(df[col_name])
+
+    return board_type_conditions
+
+
+def filter_df_by_board_type(df: pd.DataFrame, board_type: Optional[str]) -> pd.DataFrame:
+    if not board_type or board_type == 'all' or df.empty:
+        return df
+    return df[board_type_mask(df, board_type)]
+
+
+def provider_mask(df: pd.DataFrame, context: str, provider: Optional[str], board_type: Optional[str]) -> np.ndarray:
+    """
+    Returns a boolean mask of the rows where the selected provider is present.
+    For POSM data that means a non-zero area percentage; for board data it means a
+    non-zero board count (restricted to the selected board type, if any).
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if not provider or provider == 'all':
+        return mask
+    provider_name_actual = get_provider_name_from_value_options(provider)
+    if not provider_name_actual:
+        return mask
+
+    #  provider's area percentage.
+    if context == "posm" and f"{provider_name_actual.upper()}_AREA_PERCENTAGE" in df.columns:
+        return positive_mask(df[f"{provider_name_actual.upper()}_AREA_PERCENTAGE"])
+    #  board-count columns are greater than 0.
+    elif context == "board":
+        provider_prefix = provider_name_actual.upper()
+        # Check all possible board columns for that provider.
+        board_cols_for_provider = [f"{provider_prefix}{s}" for s in ['_NAME_BOARD', '_SIDE_BOARD', '_TIN_BOARD']]
+        if board_type and board_type != 'all':
+            specific_suffixes = BOARD_TYPE_SUFFIXES.get(board_type.lower(), [])
+            board_cols_for_provider = [f"{provider_prefix}{s}" for s in specific_suffixes]
+
+        condition = np.zeros(len(df), dtype=bool)
+        for col in board_cols_for_provider:
+            if col in df.columns:
+                condition |= positive_mask(df[col])
+        return condition
+    return mask
+
+
+def filtered_options_mask(
+    dataset: DatasetSnapshot,
+    context: str,
+    provider: Optional[str],
+    board_type: Optional[str],
+    province: Optional[str] = None,
+    district: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Applies the filters shared by all the option endpoints (board type, provider,
+    province and district) and returns the resulting boolean mask.
+    The shared frame itself is never copied or modified.
+    """
+    df = dataset.board if context == "board" else dataset.posm
+
+    # 1. filter by the selected board type.
+    if context == "board":
+        mask = board_type_mask(df, board_type)
+    else:
+        mask = np.ones(len(df), dtype=bool)
+
+    # 2. If a specific provider is selected, filter the data to only include that provider.
+    mask &= provider_mask(df, context, provider, board_type)
+
+    # 3. Filter by province and district with the precomputed geography index.
+    # It uses the 'PROVINCE'/'DISTRICT' columns, with fallbacks to 'SALES_REGION'/'SALES_DISTRICT'.
+    mask &= get_geo_index(dataset, context).mask(province=province, district=district)
+
+    return mask
+
+
+def build_filter_facets(
+    dataset: DatasetSnapshot,
+    context: str,
+    provider: Optional[str],
+    board_type: Optional[str],
+    province: Optional[str],
+    district: Optional[str],
+) -> FilterFacets:
+    """
+    Works out the options of every level of the geography hierarchy in one pass:
+    provinces under the board type and provider filters, districts under those plus
+    the province, and DS divisions under those plus the district.
+    """
+    df = dataset.board if context == "board" else dataset.posm
+    if df.empty:
+        return FilterFacets(provinces=[], districts=[], dsDivisions=[])
+
+    geo_index = get_geo_index(dataset, context)
+    mask = filtered_options_mask(dataset, context, provider, board_type)
+
+    # It checks for a 'PROVINCE' column, but has a fallback to 'SALES_REGION' (the same for districts).
+    province_col = geo_index.columns["province"]
+    provinces = get_facet_options(df[province_col], mask) if province_col else []
+
+    if province and province != "all" and province_col:
+        mask = mask & geo_index.mask(province=province)
+    district_col = geo_index.columns["district"]
+    districts = get_facet_options(df[district_col], mask) if district_col else []
+
+    if district and district != "all" and district_col:
+        mask = mask & geo_index.mask(district=district)
+    ds_divisions = get_facet_options(df['DS_DIVISION'], mask) if 'DS_DIVISION' in df.columns else []
+
+    return FilterFacets(provinces=provinces, districts=districts, dsDivisions=ds_divisions)
+
+
+def filter_facets_key(
+    dataset: DatasetSnapshot,
+    context: str,
+    provider: Optional[str],
+    board_type: Optional[str],
+    province: Optional[str] = None,
+    district: Optional[str] = None,
+) -> tuple:
+    """
+    Returns the cache key of the filter facets for one combination of filters.
+
+    The filter values are normalized before they are used as the cache key: values that
+    behave the same (e.g. an unknown provider and 'all') share one entry, and geography
+    names that don't exist in the data collapse into one, so the number of cached
+    entries is bounded by the data rather than by the requests.
+    """
+    context_key = context if context in ("board", "posm") else "other"
+    provider_key = provider if get_provider_name_from_value_options(provider) not in (None, "All") else "all"
+    board_type_key = (board_type or "all").lower()
+    if board_type_key not in BOARD_TYPE_SUFFIXES:
+        # An unknown board type matches nothing when a provider is selected, and is ignored otherwise.
+        board_type_key = "<unknown>" if provider_key != "all" else "all"
+
+    geo_index = get_geo_index(dataset, context)
+    def geo_key(level: str, value: Optional[str]) -> str:
+        if not value or value == "all" or not geo_index.columns.get(level):
+            return "all"
+        return value.lower() if value.lower() in geo_index.keys(level) else "<unknown>"
+
+    return ("filter_facets", context_key, provider_key, board_type_key, geo_key("province", province), geo_key("district", district))
+
+
+def get_filter_facets(
+    dataset: DatasetSnapshot,
+    context: str,
+    provider: Optional[str],
+    board_type: Optional[str],
+    province: Optional[str] = None,
+    district: Optional[str] = None,
+) -> FilterFacets:
+    """Returns the filter facets for one combination of filters, cached for the current dataset version."""
+    key = filter_facets_key(dataset, context, provider, board_type, province, district)
+    return dataset.derived(key, lambda: build_filter_facets(dataset, context, provider, board_type, province, district))
+
+
+def options_response(
+    request: Request,
+    dataset: DatasetSnapshot,
+    part: str,
+    context: str,
+    provider: Optional[str],
+    board_type: Optional[str],
+    province: Optional[str] = None,
+    district: Optional[str] = None,
+) -> Response:
+    """
+    Serves one part of the filter facets ('provinces', 'districts' or 'dsDivisions' as
+    plain options, or 'facets' for all of them). The body is serialized and compressed
+    once per dataset version and filter combination.
+    """
+    key = filter_facets_key(dataset, context, provider, board_type, province, district)
+
+    def build_body() -> bytes:
+        facets = get_filter_facets(dataset, context, provider, board_type, province, district)
+        if part == "facets":
+            return serialize_response(FilterFacets, facets)
+        return serialize_list(FilterOption, [FilterOption(value=o.value, label=o.label) for o in getattr(facets, part)])
+
+    return precompressed_response(request, dataset, key + (part,), build_body)
 
 
 # --- API Endpoints ---
 
 @router.get("/options/provinces", response_model=List[FilterOption])
 async def get_province_options_api(
- 
+    request: Request,
     provider: Optional[str] = Query(None),
     context: str = Query("board"),
     boardType: Optional[str] = Query(None, alias="boardType"), 
    
-    board_df: pd.DataFrame = Depends(get_boards_df),
-    posm_df: pd.DataFrame = Depends(get_posm_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
     
-    # 1. Select the correct dataset based on the context.
-    df_source = board_df if context == "board" else posm_df
-    if df_source.empty: return []
-    df_to_filter = df_source.copy() # Use a copy to avoid changing the original data.
-
-    # 2. filter by the selected board type.
-    if context == "board":
-        df_to_filter = filter_df_by_board_type(df_to_filter, boardType)
-        if df_to_filter.empty: return []
-
-    # 3. If a specific provider is selected, filter the data to only include that provider.
-    if provider and provider != 'all':
-        provider_name_actual = get_provider_name_from_value_options(provider)
-        if provider_name_actual:
-            # provider's area percentage.
-            if context == "posm" and f"{provider_name_actual.upper()}_AREA_PERCENTAGE" in df_to_filter.columns:
-                df_to_filter = df_to_filter[pd.to_numeric(df_to_filter[f"{provider_name_actual.upper()}_AREA_PERCENTAGE"], errors='coerce').fillna(0) > 0]
-            #  board-count columns are greater than 0.
-            elif context == "board":
-                provider_prefix = provider_name_actual.upper()
-                # Check all possible board columns for that provider.
-                board_cols_for_provider = [f"{provider_prefix}{s}" for s in ['_NAME_BOARD', '_SIDE_BOARD', '_TIN_BOARD']]
-                
-                # 
-                if boardType and boardType != 'all':
-                    bt_map = {'dealer': ['_NAME_BOARD'], 'tin': ['_TIN_BOARD'], 'vertical': ['_SIDE_BOARD']}
-                    specific_suffixes = bt_map.get(boardType.lower(), [])
-                    board_cols_for_provider = [f"{provider_prefix}{s}" for s in specific_suffixes]
-                
-                condition = pd.Series(False, index=df_to_filter.index)
-                for col in board_cols_for_provider:
-                    if col in df_to_filter.columns:
-                        condition = condition | (pd.to_numeric(df_to_filter[col], errors='coerce').fillna(0) > 0)
-                
-                if condition.any(): df_to_filter = df_to_filter[condition]
-                else: df_to_filter = pd.DataFrame(columns=df_to_filter.columns) # No matches, so empty the dataframe.
-
-    if df_to_filter.empty: return []
-
-    # 4. After all filtering, get the unique provinces from the remaining data.
-    # It checks for a 'PROVINCE' column, but has a fallback to 'SALES_REGION'.
-    col_to_use = 'PROVINCE' if 'PROVINCE' in df_to_filter.columns else 'SALES_REGION'
-    return get_unique_options_from_df_options(df_to_filter, col_to_use)
+    # The options come from the cached facets of these filters, shared with the other option endpoints.
+    return await options_executor.run(options_response, request, dataset, "provinces", context, provider, boardType)
 
 
 @router.get("/options/districts", response_model=List[FilterOption])
 async def get_district_options_api(
+    request: Request,
     # It takes the same filters as the province endpoint, plus the selected province.
     provider: Optional[str] = Query(None),
     province: Optional[str] = Query(None),
     context: str = Query("board"),
     boardType: Optional[str] = Query(None, alias="boardType"),
-    board_df: pd.DataFrame = Depends(get_boards_df),
-    posm_df: pd.DataFrame = Depends(get_posm_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
     """
     This endpoint creates a list of Districts for the dropdown menu,
     based on the selected province and any other active filters.
     """
-    # Steps 1-2: This initial filtering by context, board type, and provider is the same as the province endpoint.
-    df_source = board_df if context == "board" else posm_df
-    if df_source.empty: return []
-    df_to_filter = df_source.copy()
-
-    if context == "board":
-        df_to_filter = filter_df_by_board_type(df_to_filter, boardType)
-        if df_to_filter.empty: return []
-
-    if provider and provider != 'all':
-        # ... (Same provider filtering logic as above) ...
-        provider_name_actual = get_provider_name_from_value_options(provider)
-        if provider_name_actual:
-            if context == "posm" and f"{provider_name_actual.upper()}_AREA_PERCENTAGE" in df_to_filter.columns:
-                df_to_filter = df_to_filter[pd.to_numeric(df_to_filter[f"{provider_name_actual.upper()}_AREA_PERCENTAGE"], errors='coerce').fillna(0) > 0]
-            elif context == "board":
-                provider_prefix = provider_name_actual.upper()
-                board_cols_for_provider = [f"{provider_prefix}{s}" for s in ['_NAME_BOARD', '_SIDE_BOARD', '_TIN_BOARD']]
-                if boardType and boardType != 'all':
-                    bt_map = {'dealer': ['_NAME_BOARD'], 'tin': ['_TIN_BOARD'], 'vertical': ['_SIDE_BOARD']}
-                    specific_suffixes = bt_map.get(boardType.lower(), [])
-                    board_cols_for_provider = [f"{provider_prefix}{s}" for s in specific_suffixes]
-                condition = pd.Series(False, index=df_to_filter.index)
-                for col in board_cols_for_provider:
-                    if col in df_to_filter.columns: condition = condition | (pd.to_numeric(df_to_filter[col], errors='coerce').fillna(0) > 0)
-                if condition.any(): df_to_filter = df_to_filter[condition]
-                else: df_to_filter = pd.DataFrame(columns=df_to_filter.columns)
-    if df_to_filter.empty: return []
-
-    # 3. NOW, apply the province filter.
-    province_col_actual = 'PROVINCE' if 'PROVINCE' in df_to_filter.columns else 'SALES_REGION'
-    if province and province != "all" and province_col_actual in df_to_filter.columns:
-        # Create a temporary column to do a case-insensitive match.
-        df_to_filter[f"{province_col_actual}_LOWER_UNDERSCORE"] = df_to_filter[province_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        df_to_filter = df_to_filter[df_to_filter[f"{province_col_actual}_LOWER_UNDERSCORE"] == province.lower()]
-    if df_to_filter.empty: return []
-
-    # 4. Finally, get the unique districts from the data that is left.
-    district_col_actual = 'DISTRICT' if 'DISTRICT' in df_to_filter.columns else 'SALES_DISTRICT'
-    return get_unique_options_from_df_options(df_to_filter, district_col_actual)
+    return await options_executor.run(options_response, request, dataset, "districts", context, provider, boardType, province=province)
 
 
 @router.get("/options/ds-divisions", response_model=List[FilterOption])
 async def get_ds_division_options_api(
+    request: Request,
     # Takes all the same filters, plus the selected district.
     provider: Optional[str] = Query(None),
     province: Optional[str] = Query(None),
     district: Optional[str] = Query(None),
     context: str = Query("board"),
     boardType: Optional[str] = Query(None, alias="boardType"),
-    board_df: pd.DataFrame = Depends(get_boards_df),
-    posm_df: pd.DataFrame = Depends(get_posm_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
     """
     This endpoint creates a list of DS Divisions for the dropdown menu,
     based on the selected province and district, plus other filters.
     """
-    # The initial filtering logic is identical to the other endpoints.
-    df_source = board_df if context == "board" else posm_df
-    if df_source.empty: return []
-    df_to_filter = df_source.copy()
+    return await options_executor.run(options_response, request, dataset, "dsDivisions", context, provider, boardType, province=province, district=district)
 
-    if context == "board":
-        df_to_filter = filter_df_by_board_type(df_to_filter, boardType)
-        if df_to_filter.empty: return []
-
-    if provider and provider != 'all':
-        # ... (Same provider filtering logic as above) ...
-        provider_name_actual = get_provider_name_from_value_options(provider)
-        if provider_name_actual:
-            if context == "posm" and f"{provider_name_actual.upper()}_AREA_PERCENTAGE" in df_to_filter.columns:
-                df_to_filter = df_to_filter[pd.to_numeric(df_to_filter[f"{provider_name_actual.upper()}_AREA_PERCENTAGE"], errors='coerce').fillna(0) > 0]
-            elif context == "board":
-                provider_prefix = provider_name_actual.upper()
-                board_cols_for_provider = [f"{provider_prefix}{s}" for s in ['_NAME_BOARD', '_SIDE_BOARD', '_TIN_BOARD']]
-                if boardType and boardType != 'all':
-                    bt_map = {'dealer': ['_NAME_BOARD'], 'tin': ['_TIN_BOARD'], 'vertical': ['_SIDE_BOARD']}
-                    specific_suffixes = bt_map.get(boardType.lower(), [])
-                    board_cols_for_provider = [f"{provider_prefix}{s}" for s in specific_suffixes]
-                condition = pd.Series(False, index=df_to_filter.index)
-                for col in board_cols_for_provider:
-                    if col in df_to_filter.columns: condition = condition | (pd.to_numeric(df_to_filter[col], errors='coerce').fillna(0) > 0)
-                if condition.any(): df_to_filter = df_to_filter[condition]
-                else: df_to_filter = pd.DataFrame(columns=df_to_filter.columns)
-    if df_to_filter.empty: return []
-
-    # Filter by Province 
-    province_col_actual = 'PROVINCE' if 'PROVINCE' in df_to_filter.columns else 'SALES_REGION'
-    if province and province != "all" and province_col_actual in df_to_filter.columns:
-        df_to_filter[f"{province_col_actual}_LOWER_UNDERSCORE"] = df_to_filter[province_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        df_to_filter = df_to_filter[df_to_filter[f"{province_col_actual}_LOWER_UNDERSCORE"] == province.lower()]
-    if df_to_filter.empty: return []
-
-    #  District.
-    district_col_actual = 'DISTRICT' if 'DISTRICT' in df_to_filter.columns else 'SALES_DISTRICT'
-    if district and district != "all" and district_col_actual in df_to_filter.columns:
-        df_to_filter[f"{district_col_actual}_LOWER_UNDERSCORE"] = df_to_filter[district_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-        df_to_filter = df_to_filter[df_to_filter[f"{district_col_actual}_LOWER_UNDERSCORE"] == district.lower()]
-    if df_to_filter.empty: return []
-    
-    #  get the unique DS Divisions from the remaining data.
-    if 'DS_DIVISION' in df_to_filter.columns:
-        return get_unique_options_from_df_options(df_to_filter, "DS_DIVISION")
-        
-    return []
\ No newline at end of file
+
+@router.get("/options/facets", response_model=FilterFacets)
+async def get_filter_facets_api(
+    request: Request,
+    provider: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    district: Optional[str] = Query(None),
+    context: str = Query("board"),
+    boardType: Optional[str] = Query(None, alias="boardType"),
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
+):
+    """
+    Returns the province, district and DS division options for the current filters in
+    one call, each with the number of matching rows. This replaces calling
+    /options/provinces, /options/districts and /options/ds-divisions one after another.
+    """
+    return await options_executor.run(options_response, request, dataset, "facets", context, provider, boardType, province=province, district=district)
+
+
+@router.get("/options/admin-children", response_model=List[FilterOption])
+async def get_admin_children_api(
+    province: Optional[str] = Query(None),
+    district: Optional[str] = Query(None),
+    dsDivision: Optional[str] = Query(None),
+    salesRegion: Optional[str] = Query(None),
+):
+    """
+    Returns the divisions directly under the most specific value given, from the
+    administrative hierarchy (Geoloction.csv) rather than from the data: the districts
+    of a province, the DS divisions of a district, the GN divisions of a DS division or
+    the sales areas of a sales region. Without any value, the provinces are returned.
+    Unknown values, or a value that isn't part of the parent given with it, are rejected.
+    """
+    hierarchy = load_admin_hierarchy()
+    if hierarchy is None:
+        return []
+
+    if salesRegion and salesRegion != 'all':
+        if not hierarchy.is_valid("salesRegion", salesRegion):
+            raise HTTPException(status_code=400, detail=f"Unknown sales region '{salesRegion}'")
+        nodes = hierarchy.children("salesRegion", salesRegion)
+    else:
+        parent = None
+        for level, value in (("province", province), ("district", district), ("dsDivision", dsDivision)):
+            if not value or value == 'all':
+                continue
+            node = hierarchy.node(level, value)
+            if node is None:
+                raise HTTPException(status_code=400, detail=f"Unknown {level} '{value}'")
+            ancestor = node.parent
+            while ancestor is not None and ancestor is not parent:
+                ancestor = ancestor.parent
+            if parent is not None and ancestor is None:
+                raise HTTPException(status_code=400, detail=f"'{value}' is not in {parent.level} '{parent.name}'")
+            parent = node
+        nodes = hierarchy.children(parent.level, parent.key) if parent is not None else hierarchy.top_level("province")
+
+    return [FilterOption(value=node.key, label=node.name) for node in nodes]
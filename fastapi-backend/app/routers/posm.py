@@ -1,16 +1,25 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional, Dict, Any, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any, Set, Tuple
 import pandas as pd
 import random
 import numpy as np
 from app.models import (
     FetchPosmGeneralResponse, PosmGeneralFiltersState, PosmData, ProviderMetric,
-    PosmComparisonData, PosmBatchDetails, PosmBatchShare, FilterOption, Retailer
+    PosmComparisonData, PosmBatchDetails, PosmBatchShare, FilterOption, Retailer, PageParams
 )
 
-from app.dependencies import get_posm_df, get_boards_df
-from app.data_loader import filter_by_max_capture_phase
+from app.dependencies import get_dataset_snapshot
+from app.dataset import DatasetSnapshot
+from app.indexes import get_geo_index, get_phase_partitions, get_retailer_timeline
+from app.cache import CachedResponse, response_cache, serialize_list, normalize_filters
+from app.executors import data_executor, options_executor
+from app.serialization import serialize_table_response
+from app.compression import precompressed_response
+from app.pagination import RowTable, resolve_page, page_cache_key, ndjson_lines, parse_include, add_image_urls, NDJSON_MEDIA_TYPE
+from app.config import settings
+from app.schema import positive_mask, str_or_none_list, value_matrix
 
 from .options import get_provider_name_from_value_options
 
@@ -27,6 +36,12 @@ PROVIDERS_CONFIG_API_POSM_ROUTER = [
 
 PROVIDER_NAMES_FOR_COMPARISON = [p["name"] for p in PROVIDERS_CONFIG_API_POSM_ROUTER if p["name"] != "All"]
 
+# The URL fields added with `include=imageUrls`, and the identifier field each one is signed from.
+POSM_IMAGE_URL_FIELDS = {
+    'originalPosmImageUrl': 'originalPosmImageIdentifier',
+    'detectedPosmImageUrl': 'detectedPosmImageIdentifier',
+}
+
 
 
 
@@ -37,7 +52,8 @@ def get_provider_name_map_posm_router():
 def to_numeric_or_default(value, default=0.0):
     """Safely tries to convert a value to a number, returning a default if it fails."""
     num = pd.to_numeric(value, errors='coerce') # 'coerce' turns failures into Not-a-Number (NaN)
-    return default if pd.isna(num) else num
+    # float() turns numpy float32 values from the typed columns into plain Python floats before rounding.
+    return default if pd.isna(num) else float(num)
 
 def safe_str_convert_posm_router(value) -> Optional[str]:
     """Safely converts a value to a string, returning None if the value is missing."""
@@ -45,51 +61,131 @@ def safe_str_convert_posm_router(value) -> Optional[str]:
         return None
     return str(value)
 
+def determine_main_posm_provider(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the main provider (the one with the highest visibility share) for every row at once.
+    Returns the provider's position in PROVIDER_NAMES_FOR_COMPARISON (ties go to the first
+    provider; len(PROVIDER_NAMES_FOR_COMPARISON) means "Unknown") and its share.
+    Missing shares count as 0.
+    """
+    shares = value_matrix(df, [f"{p_name.upper()}_AREA_PERCENTAGE" for p_name in PROVIDER_NAMES_FOR_COMPARISON])
+    if shares.shape[0] == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+    best = shares.argmax(axis=1)
+    best_shares = shares[np.arange(len(best)), best]
+    # Matches the original row-by-row scan, which started from a share of -1.
+    unknown = best_shares <= -1.0
+    best[unknown] = len(PROVIDER_NAMES_FOR_COMPARISON)
+    best_shares[unknown] = 0.0
+    return best, best_shares
+
 # --- API Endpoints ---
 
 @router.get("/posm/general", response_model=FetchPosmGeneralResponse)
 async def fetch_posm_general_api(
    
     filters: PosmGeneralFiltersState = Depends(),
+    # Optional paging, sorting and streaming of the rows.
+    page: PageParams = Depends(),
+    # Extra response parts: 'imageUrls' adds signed URLs for the image identifiers of every row.
+    include: Optional[str] = Query(None),
     
-    posm_df_raw: pd.DataFrame = Depends(get_posm_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
     """
     This is the main endpoint for the POSM dashboard. It fetches and filters all POSM data
     based on the user's selections on the frontend.
+    `count` and `providerMetrics` always cover every matching row, while `data` only holds
+    the requested page. With `format=ndjson` the summary is sent on the first line and the
+    rows are streamed one per line. With `include=imageUrls` every row also carries signed
+    URLs for its images, resolved in one pass over the page.
+    Serialized JSON responses are cached per filter combination, page and dataset version.
     """
+    include_image_urls = 'imageUrls' in parse_include(include)
+    # The URL fields are left out of the response unless they were asked for.
+    url_fields = set() if include_image_urls else set(POSM_IMAGE_URL_FIELDS)
+
+    # The filtering and serialization run in the data pool, off the event loop.
+    if page.format == 'ndjson':
+        return await data_executor.run(stream_posm_general_page, filters, page, include_image_urls, url_fields, dataset)
+
+    cache_key = (normalize_filters(filters, case_insensitive=('province', 'district', 'dsDivision')), page_cache_key(page), include_image_urls)
+    cached = response_cache.get("posm_general", dataset.version, cache_key)
+    if cached is None:
+        cached = await data_executor.run(render_posm_general_page, filters, page, include_image_urls, url_fields, dataset)
+        response_cache.put("posm_general", dataset.version, cache_key, cached)
+    return Response(content=cached.body, media_type="application/json", headers=cached.headers)
+
+
+def stream_posm_general_page(
+    filters: PosmGeneralFiltersState, page: PageParams, include_image_urls: bool, url_fields: Set[str], dataset: DatasetSnapshot
+) -> StreamingResponse:
+    """Builds the requested page and streams it as NDJSON, the summary on the first line."""
+    table, provider_metrics = build_posm_general_response(filters, dataset)
+    positions, headers = resolve_page(page, table, PosmData)
+    page_table = table.take(positions)
+    if include_image_urls:
+        add_image_urls(page_table, POSM_IMAGE_URL_FIELDS)
+    summary = {"count": table.length, "providerMetrics": [m.model_dump() for m in provider_metrics]}
+    return StreamingResponse(
+        ndjson_lines(summary, page_table.iter_rows(), PosmData, exclude=url_fields),
+        media_type=NDJSON_MEDIA_TYPE, headers=headers,
+    )
+
+
+def render_posm_general_page(
+    filters: PosmGeneralFiltersState, page: PageParams, include_image_urls: bool, url_fields: Set[str], dataset: DatasetSnapshot
+) -> CachedResponse:
+    """Builds and serializes the requested page, as it is kept in the response cache."""
+    table, provider_metrics = build_posm_general_response(filters, dataset)
+    positions, headers = resolve_page(page, table, PosmData)
+    page_table = table.take(positions)
+    expires_at = None
+    if include_image_urls:
+        urls_expire_at = add_image_urls(page_table, POSM_IMAGE_URL_FIELDS)
+        # Stop serving the cached body before its URLs would be signed again.
+        if urls_expire_at is not None:
+            expires_at = urls_expire_at - settings.S3_URL_REFRESH_MARGIN_SECONDS
+    body = serialize_table_response(
+        FetchPosmGeneralResponse, "data", page_table, exclude=url_fields,
+        count=table.length, providerMetrics=provider_metrics,
+    )
+    return CachedResponse(body, headers, expires_at)
+
+def build_posm_general_response(filters: PosmGeneralFiltersState, dataset: DatasetSnapshot) -> Tuple[RowTable, List[ProviderMetric]]:
+    """
+    Filters the POSM rows and builds the response rows (as columns, see `RowTable`)
+    and the average visibility per provider of all the matching rows.
+    """
+    posm_df_raw = dataset.posm
 
     if posm_df_raw.empty:
-        return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+        return RowTable({}), []
 
-    # Get only the data from the latest "capture phase" (the most recent set of photos).
-    df = filter_by_max_capture_phase(posm_df_raw, "posm_data_for_api")
-    if df.empty:
-       return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+    # The injected frame is shared by every request, so it is never modified here.
+    # Each filter narrows down a boolean mask over the full frame instead of copying it.
+    # Start with only the data from the latest "capture phase" (the most recent set of photos).
+    # Those rows are worked out once per dataset version.
+    mask = get_phase_partitions(dataset, "posm").latest_mask.copy()
+    if not mask.any():
+       return RowTable({}), []
 
     provider_name_map_local = get_provider_name_map_posm_router()
 
     # 2. --- Apply Filters from User Selections ---
 
     # Filter by a specific Retailer ID if one is provided.
-    if filters.retailerId and filters.retailerId != 'all' and 'PROFILE_ID' in df.columns:
-        df['PROFILE_ID_STR'] = df['PROFILE_ID'].astype(str)
-        df = df[df['PROFILE_ID_STR'] == filters.retailerId]
-        if df.empty: return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+    if filters.retailerId and filters.retailerId != 'all' and 'PROFILE_ID' in posm_df_raw.columns:
+        mask &= (posm_df_raw['PROFILE_ID'] == filters.retailerId).to_numpy()
+        if not mask.any(): return RowTable({}), []
 
     
-    geo_col_map = {'province': ['PROVINCE', 'SALES_REGION'], 'district': ['DISTRICT', 'SALES_DISTRICT'], 'dsDivision': ['DS_DIVISION']}
-    for filter_key, df_cols_options in geo_col_map.items():
-        filter_val = getattr(filters, filter_key, 'all') # Get the filter value, e.g., filters.province
-        if filter_val and filter_val != 'all':
-            # This logic tries the main column first (e.g., 'PROVINCE') and then a fallback ('SALES_REGION').
-            for df_col in df_cols_options:
-                if df_col in df.columns:
-                    # Create a temporary column for case-insensitive matching.
-                    df[f"{df_col}_LOWER_UNDERSCORE"] = df[df_col].astype(str).str.lower().str.replace(' ', '_', regex=False)
-                    df = df[df[f"{df_col}_LOWER_UNDERSCORE"] == filter_val.lower()]
-                    break # Stop after the first successful filter.
-    if df.empty: return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+    # Geography filters are looked up in the precomputed index of this dataset version.
+    # The index uses the main column first (e.g., 'PROVINCE') and then a fallback ('SALES_REGION').
+    mask &= get_geo_index(dataset, "posm").mask(
+        province=filters.province, district=filters.district, dsDivision=filters.dsDivision
+    )
+    if not mask.any(): return RowTable({}), []
 
     # Filter by a specific Provider if one is selected.
     selected_provider_name_filter: Optional[str] = None
@@ -98,12 +194,12 @@ async def fetch_posm_general_api(
         if selected_provider_name_filter:
             # For POSM, provider presence is measured by their area percentage.
             provider_col_filter = f"{selected_provider_name_filter.upper()}_AREA_PERCENTAGE"
-            if provider_col_filter in df.columns:
+            if provider_col_filter in posm_df_raw.columns:
                 # Keep only rows where the selected provider has more than 0% visibility.
-                df = df[pd.to_numeric(df[provider_col_filter], errors='coerce').fillna(0) > 0]
+                mask &= positive_mask(posm_df_raw[provider_col_filter])
             else:
-                df = pd.DataFrame(columns=df.columns) # If the column doesn't exist, return no results.
-    if df.empty: return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+                mask[:] = False # If the column doesn't exist, return no results.
+    if not mask.any(): return RowTable({}), []
 
     # Filter by the Visibility Percentage range slider.
     if filters.visibilityRange and isinstance(filters.visibilityRange, str) and selected_provider_name_filter:
@@ -112,61 +208,53 @@ async def fetch_posm_general_api(
             min_vis, max_vis = float(min_val_str), float(max_val_str)
             
             provider_col_filter = f"{selected_provider_name_filter.upper()}_AREA_PERCENTAGE"
-            if provider_col_filter in df.columns:
-                provider_percentages = pd.to_numeric(df[provider_col_filter], errors='coerce').fillna(0)
+            if provider_col_filter in posm_df_raw.columns:
+                provider_percentages = posm_df_raw[provider_col_filter].fillna(0)
                 # Keep rows where the percentage is between the min and max slider values.
-                df = df[(provider_percentages >= min_vis) & (provider_percentages <= max_vis)]
+                mask &= ((provider_percentages >= min_vis) & (provider_percentages <= max_vis)).to_numpy()
         except (ValueError, IndexError):
             pass # Ignore if the range is not formatted correctly.
-    if df.empty: return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
+    if not mask.any(): return RowTable({}), []
             
+    # Work out the main provider (the one with the highest visibility) of every remaining
+    # row in one pass. The result is shared by the POSM status filter and the row builder.
+    main_provider_idx, visibility_shares = determine_main_posm_provider(posm_df_raw.loc[mask])
+
     # Filter by POSM status ('increase' or 'decrease').
     if filters.posmStatus and filters.posmStatus != 'all' and selected_provider_name_filter:
-        provider_col_filter = f"{selected_provider_name_filter.upper()}_AREA_PERCENTAGE"
-        percentage_cols = [f"{p_name.upper()}_AREA_PERCENTAGE" for p_name in PROVIDER_NAMES_FOR_COMPARISON]
-        
-        # Find out which provider has the highest visibility in each row.
-        df['max_provider_col'] = df[percentage_cols].idxmax(axis=1)
+        selected_provider_idx = PROVIDER_NAMES_FOR_COMPARISON.index(selected_provider_name_filter)
 
         if filters.posmStatus == 'increase':
             # 'Increase' means we only want to see retailers where our selected provider is dominant.
-            df = df[df['max_provider_col'] == provider_col_filter]
+            keep = main_provider_idx == selected_provider_idx
         elif filters.posmStatus == 'decrease':
             # 'Decrease' means we want to see retailers where some OTHER provider is dominant.
-            df = df[df['max_provider_col'] != provider_col_filter]
-    if df.empty: return FetchPosmGeneralResponse(data=[], count=0, providerMetrics=[])
-
-   
-    posm_data_list: List[PosmData] = []
-  
-    for rowIndex, row_series in df.iterrows():
-        row = row_series.to_dict()
-        
-        # For each row, determine the main provider (the one with the highest visibility).
-        main_provider_for_row_display = "Unknown"
-        visibility_perc_for_row_display = 0.0
-        max_share = -1.0
-        for p_config_iter in PROVIDERS_CONFIG_API_POSM_ROUTER:
-            if p_config_iter['name'] == "All": continue
-            col_name_iter = f"{p_config_iter['name'].upper()}_AREA_PERCENTAGE"
-            current_share = to_numeric_or_default(row.get(col_name_iter))
-            if current_share > max_share:
-                max_share = current_share
-                main_provider_for_row_display = p_config_iter['name']
-                visibility_perc_for_row_display = max_share
-        
-        # Create a clean data object for the frontend using our Pydantic model.
-        item = PosmData(
-            id=safe_str_convert_posm_router(row.get('IMAGE_REF_ID')),
-            retailerId=safe_str_convert_posm_router(row.get('PROFILE_ID')),
-            provider=main_provider_for_row_display,
-            visibilityPercentage=round(visibility_perc_for_row_display, 1),
-            PROFILE_NAME=safe_str_convert_posm_router(row.get('PROFILE_NAME')),
-            # ... and all other fields ...
-            originalPosmImageIdentifier=safe_str_convert_posm_router(row.get('S3_ARN')),
-            detectedPosmImageIdentifier=safe_str_convert_posm_router(row.get('INF_S3_ARN'))
-        )
-        posm_data_list.append(item)
+            keep = main_provider_idx != selected_provider_idx
+        else:
+            keep = np.ones(len(main_provider_idx), dtype=bool)
+        mask[mask] = keep
+        main_provider_idx, visibility_shares = main_provider_idx[keep], visibility_shares[keep]
+    if not mask.any(): return RowTable({}), []
+
+    # Take out the matching rows once, after all the filters have been applied.
+    df = posm_df_raw[mask]
+
+    # Build the row columns for the frontend in bulk. Only the rows of the requested page are
+    # validated against the response model, which also fills in the fields that aren't set here.
+    def str_column(col: str) -> list:
+        return str_or_none_list(df[col]) if col in df.columns else [None] * len(df)
+
+    provider_names = np.array(PROVIDER_NAMES_FOR_COMPARISON + ["Unknown"], dtype=object)
+    columns: Dict[str, list] = {
+        'id': str_column('IMAGE_REF_ID'),
+        'retailerId': str_column('PROFILE_ID'),
+        'provider': provider_names[main_provider_idx].tolist(),
+        'visibilityPercentage': [round(share, 1) for share in visibility_shares.tolist()],
+        'PROFILE_NAME': str_column('PROFILE_NAME'),
+        'originalPosmImageIdentifier': str_column('S3_ARN'),
+        'detectedPosmImageIdentifier': str_column('INF_S3_ARN'),
+    }
+    table = RowTable(columns)
 
  
     # Calculate the average visibility for each provider across all the filtered data.
@@ -176,83 +264,66 @@ async def fetch_posm_general_api(
             if p_config_metric['name'] == "All": continue
             col_name_metric = f"{p_config_metric['name'].upper()}_AREA_PERCENTAGE"
             if col_name_metric in df.columns:
-                valid_shares = pd.to_numeric(df[col_name_metric], errors='coerce').dropna()
-                avg_perc = valid_shares.mean() if not valid_shares.empty else 0.0
+                valid_shares = df[col_name_metric].dropna()
+                # Average in float64; the column itself is stored as float32.
+                avg_perc = valid_shares.astype('float64').mean() if not valid_shares.empty else 0.0
                 provider_metrics_list.append(ProviderMetric(
                     provider=p_config_metric['name'],
                     percentage=round(float(avg_perc), 1)
                 ))
 
-    return FetchPosmGeneralResponse(
-        data=posm_data_list,
-        count=len(posm_data_list),
-        providerMetrics=provider_metrics_list
-    )
+    return table, provider_metrics_list
 
 
 @router.get("/posm/retailers-by-change", response_model=List[Retailer])
-async def get_retailers_by_posm_change():
+async def get_retailers_by_posm_change(
+    request: Request,
     provider: str = Query(...),
     change_status: str = Query(..., alias="changeStatus"),
-    posm_df: pd.DataFrame = Depends(get_posm_df),
-    board_df: pd.DataFrame = Depends(get_boards_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
+):
     """
     Finds retailers whose POSM visibility for a specific provider has increased or decreased
     between their two most recent photo capture batches.
+    The changes come from the retailer timeline, and each list is built once per dataset version.
     """
-    if posm_df.empty or provider == 'all' or change_status not in ['increase', 'decrease']:
+    if dataset.posm.empty or provider == 'all' or change_status not in ['increase', 'decrease']:
         return []
 
     provider_name = get_provider_name_from_value_options(provider)
     if not provider_name: return []
     
     provider_col = f"{provider_name.upper()}_AREA_PERCENTAGE"
-    if provider_col not in posm_df.columns: return []
-
-    # 1. Prepare a smaller, cleaner dataframe for this specific task.
-    df = posm_df[['PROFILE_ID', 'CAPTURE_PHASE', provider_col]].copy()
-    df['PROFILE_ID'] = df['PROFILE_ID'].astype(str)
-    df[provider_col] = pd.to_numeric(df[provider_col], errors='coerce').fillna(0)
-    df['CAPTURE_PHASE'] = pd.to_numeric(df['CAPTURE_PHASE'], errors='coerce')
-    df.dropna(subset=['CAPTURE_PHASE'], inplace=True)
-    df.sort_values(by=['PROFILE_ID', 'CAPTURE_PHASE'], ascending=[True, False], inplace=True)
-    
-    # 2. Find only the retailers that have data from at least 2 different batches.
-    retailer_batch_counts = df.groupby('PROFILE_ID')['CAPTURE_PHASE'].nunique()
-    retailers_with_multiple_batches = retailer_batch_counts[retailer_batch_counts >= 2].index
-    
-    df_multi_batch = df[df['PROFILE_ID'].isin(retailers_with_multiple_batches)]
-    if df_multi_batch.empty: return []
-
-    # 3. For each retailer, get their latest two batches.
-    latest_two_batches = df_multi_batch.groupby('PROFILE_ID').head(2)
-    latest_batch = latest_two_batches.groupby('PROFILE_ID').first() 
-    previous_batch = latest_two_batches.groupby('PROFILE_ID').last() 
-
-    # 4. Compare the latest and previous batches to find the change.
-    comparison_df = pd.merge(latest_batch, previous_batch, on='PROFILE_ID', suffixes=('_latest', '_previous'))
-    comparison_df['change'] = comparison_df[f"{provider_col}_latest"] - comparison_df[f"{provider_col}_previous"]
-
-    # 5. Select the retailers based on whether their visibility increased or decreased.
-    if change_status == 'increase':
-        changed_retailer_ids = comparison_df[comparison_df['change'] > 0].index.tolist()
-    else: # 'decrease'
-        changed_retailer_ids = comparison_df[comparison_df['change'] < 0].index.tolist()
+    if provider_col not in dataset.posm.columns: return []
 
-    if not changed_retailer_ids: return []
+    return await options_executor.run(
+        precompressed_response, request, dataset, ("retailers_by_change", provider_col, change_status),
+        lambda: build_retailers_by_change(dataset, provider_col, change_status),
+    )
 
-    # 6. Get the full retailer info (name, location) for the ones that changed.
-    retailer_info_df = board_df[board_df['PROFILE_ID'].astype(str).isin(changed_retailer_ids)].drop_duplicates(subset=['PROFILE_ID'])
-    if retailer_info_df.empty: return []
 
-    return [
-        Retailer(
-            id=str(row['PROFILE_ID']),
-            name=str(row.get('PROFILE_NAME', 'N/A')),
-            latitude=float(row['LATITUDE']),
-            longitude=float(row['LONGITUDE']),
-        ) for _, row in retailer_info_df.iterrows()
-    ]
+def build_retailers_by_change(dataset: DatasetSnapshot, provider_col: str, change_status: str) -> bytes:
+    changed_retailer_ids = get_retailer_timeline(dataset).changed_profile_ids(provider_col, change_status)
+    board_df = dataset.board
+    if not changed_retailer_ids or board_df.empty:
+        return serialize_list(Retailer, [])
+
+    # Get the full retailer info (name, location) for the ones that changed, from the board data.
+    # Only retailers with coordinates can be placed on the map.
+    mask = board_df['PROFILE_ID'].isin(changed_retailer_ids).to_numpy(copy=True)
+    mask &= board_df['LATITUDE'].notna().to_numpy() & board_df['LONGITUDE'].notna().to_numpy()
+    retailer_info_df = board_df[mask]
+    retailer_info_df = retailer_info_df[~retailer_info_df['PROFILE_ID'].duplicated().to_numpy()]
+
+    return serialize_list(Retailer, [
+        {"id": str(profile_id), "name": str(name), "latitude": lat, "longitude": lon}
+        for profile_id, name, lat, lon in zip(
+            retailer_info_df['PROFILE_ID'].tolist(),
+            retailer_info_df['PROFILE_NAME'].tolist(),
+            retailer_info_df['LATITUDE'].to_numpy(dtype=np.float64).tolist(),
+            retailer_info_df['LONGITUDE'].to_numpy(dtype=np.float64).tolist(),
+        )
+    ])
 
 
 @router.get("/posm/comparison", response_model=PosmComparisonData)
@@ -260,29 +331,35 @@ async def fetch_posm_comparison_data_api(
     profileId: str = Query(...),
     batch1Id: str = Query(...),
     batch2Id: str = Query(...),
-    posm_df_raw: pd.DataFrame = Depends(get_posm_df)
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
     """
     Gets all the data needed for the side-by-side comparison modal, showing two
     specific batches for a single retailer.
     """
+    posm_df_raw = dataset.posm
     if posm_df_raw.empty:
         raise HTTPException(status_code=404, detail="POSM data not available")
 
-    # Filter the main dataframe to just the selected retailer.
-    df_profile = posm_df_raw[posm_df_raw['PROFILE_ID'].astype(str) == profileId].copy()
-    if df_profile.empty:
+    # The retailer's rows are looked up in the timeline index instead of scanning the frame.
+    timeline = get_retailer_timeline(dataset)
+    if timeline.positions(profileId).size == 0:
         raise HTTPException(status_code=404, detail=f"Retailer with PROFILE_ID {profileId} not found")
 
     # This is a small helper function defined inside the endpoint.
     def get_batch_details(batch_id: str) -> PosmBatchDetails:
         """Finds one specific batch and extracts its details (image and provider shares)."""
-        batch_df = df_profile[df_profile['CAPTURE_PHASE'].astype(str) == batch_id]
-        if batch_df.empty:
+        # CAPTURE_PHASE is stored as an integer, so the batch ID is parsed instead of
+        # turning the whole column into strings. Anything that isn't a whole number can't match.
+        try:
+            position = timeline.batch_position(profileId, int(batch_id))
+        except ValueError:
+            position = None
+        if position is None:
             # Return placeholder data if the batch isn't found.
             return PosmBatchDetails(image="/assets/sample-retailer-placeholder.png", shares=[], maxCapturePhase=batch_id)
 
-        batch_entry = batch_df.iloc[0]
+        batch_entry = posm_df_raw.iloc[position]
         shares = []
         for provider_name in PROVIDER_NAMES_FOR_COMPARISON:
             col = f"{provider_name.upper()}_AREA_PERCENTAGE"
@@ -318,25 +395,13 @@ async def fetch_posm_comparison_data_api(
 
 
 @router.get("/posm/available-batches/{profile_id}", response_model=List[FilterOption])
-async def fetch_available_batches_for_profile(profile_id: str, posm_df: pd.DataFrame = Depends(get_posm_df)):
+async def fetch_available_batches_for_profile(profile_id: str, dataset: DatasetSnapshot = Depends(get_dataset_snapshot)):
     """
     A simple endpoint that finds all the unique capture phases (batches) available
     for a single retailer, used to populate the batch selection dropdowns.
+    The phases come sorted from the retailer timeline index.
     """
-    if posm_df.empty: return []
-    
-    # Find all rows for the given retailer ID.
-    df_profile = posm_df[posm_df['PROFILE_ID'].astype(str) == profile_id]
-    if df_profile.empty: return []
-        
-    # Get the unique, non-empty phase numbers.
-    unique_phases = df_profile['CAPTURE_PHASE'].dropna().unique()
-    
-    # Try to sort them numerically, but fall back to string sorting if they aren't all numbers.
-    try:
-        sorted_phases = sorted(unique_phases, key=lambda x: int(float(x)))
-    except (ValueError, TypeError):
-        sorted_phases = sorted(unique_phases, key=lambda x: str(x))
-    
+    if dataset.posm.empty: return []
+
     # Format them for the frontend dropdown.
-    return [FilterOption(value=str(phase), label=f"Batch {phase}") for phase in sorted_phases]
\ No newline at end of file
+    return [FilterOption(value=str(phase), label=f"Batch {phase}") for phase in get_retailer_timeline(dataset).phases(profile_id)]
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import List, Optional
-import pandas as pd
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
 import numpy as np
 
-from app.models import Retailer
-from app.dependencies import get_boards_df, get_posm_df
+from app.models import Retailer, RetailerClustersResponse, PageParams
+from app.dependencies import get_dataset_snapshot
+from app.dataset import DatasetSnapshot
+from app.schema import positive_mask, str_or_none_list, value_matrix
+from app.cache import serialize_response
+from app.serialization import serialize_table_list
+from app.pagination import RowTable, resolve_page, ndjson_lines, NDJSON_MEDIA_TYPE
+from app.executors import data_executor
 
-from app.routers.options import filter_df_by_board_type, PROVIDERS_CONFIG_OPTIONS_INTERNAL as RETAILER_PROVIDERS_CONFIG # Use a consistent provider config
+from app.indexes import ClusterHierarchy, get_geo_index, get_spatial_index
+from app.routers.options import board_type_mask, BOARD_TYPE_SUFFIXES, PROVIDERS_CONFIG_OPTIONS_INTERNAL as RETAILER_PROVIDERS_CONFIG # Use a consistent provider config
 
 router = APIRouter()
 
@@ -18,6 +25,28 @@ def get_provider_name_from_value_for_retailers_r(value: str) -> Optional[str]:
     return None
 
 
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """Parses a 'minLon,minLat,maxLon,maxLat' viewport (the order of Leaflet's toBBoxString)."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be 'minLon,minLat,maxLon,maxLat'")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox minimums must not exceed its maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_near(near: str, radius: Optional[float]) -> Tuple[float, float, float]:
+    """Parses a 'lat,lon' point and the radius (in km) around it."""
+    try:
+        lat, lon = (float(part) for part in near.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="near must be 'lat,lon'")
+    if radius is None or radius < 0:
+        raise HTTPException(status_code=400, detail="near needs a non-negative radius (in km)")
+    return lat, lon, radius
+
+
 @router.get("/retailers", response_model=List[Retailer])
 async def fetch_retailers_api(
     provider: Optional[str] = Query(None),
@@ -29,52 +58,194 @@ async def fetch_retailers_api(
     retailerId: Optional[str] = Query(None),
     context: str = Query("board"),
     boardType: Optional[str] = Query(None, alias="boardType"), # Added boardType for board context
-    board_df: pd.DataFrame = Depends(get_boards_df),
-    posm_df: pd.DataFrame = Depends(get_posm_df)
+    # Only the retailers visible in a map viewport: 'minLon,minLat,maxLon,maxLat'.
+    bbox: Optional[str] = Query(None),
+    # Only the retailers within `radius` km of a point: 'lat,lon'.
+    near: Optional[str] = Query(None),
+    radius: Optional[float] = Query(None),
+    page: PageParams = Depends(),
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
 ):
-    df_source = board_df if context == "board" else posm_df
+    """
+    Returns the retailers (one per retailer ID, with coordinates) matching the filters.
+    `bbox` and `near`/`radius` narrow them down to an area, using the spatial index.
+    The list can be paged and sorted, or streamed as NDJSON with `format=ndjson`
+    (a `{"count": ...}` line first, then one retailer per line).
+    """
+    # The filtering and serialization run in the data pool, off the event loop.
+    return await data_executor.run(
+        retailers_response, dataset, context, page, provider=provider, province=province or salesRegion,
+        district=district or salesDistrict, dsDivision=dsDivision,
+        retailerId=retailerId, boardType=boardType,
+        bbox=parse_bbox(bbox) if bbox else None,
+        near=parse_near(near, radius) if near else None,
+    )
+
+
+def retailers_response(dataset: DatasetSnapshot, context: str, page: PageParams, **filters) -> Response:
+    """Builds the retailer list for the `retailers_mask` filters and serializes (or streams) the requested page."""
+    table = build_retailers_table(dataset, context, retailers_mask(dataset, context, **filters))
+    positions, headers = resolve_page(page, table, Retailer)
+    if page.format == 'ndjson':
+        return StreamingResponse(
+            ndjson_lines({"count": table.length}, table.iter_rows(positions), Retailer),
+            media_type=NDJSON_MEDIA_TYPE, headers=headers,
+        )
+    return Response(content=serialize_table_list(Retailer, table, positions), media_type="application/json", headers=headers)
+
+
+@router.get("/retailers/clusters", response_model=RetailerClustersResponse)
+async def fetch_retailer_clusters_api(
+    zoom: int = Query(..., ge=0, le=24),
+    # Only the clusters visible in a map viewport: 'minLon,minLat,maxLon,maxLat'.
+    bbox: Optional[str] = Query(None),
+    provider: Optional[str] = Query(None),
+    context: str = Query("board"),
+    boardType: Optional[str] = Query(None, alias="boardType"),
+    dataset: DatasetSnapshot = Depends(get_dataset_snapshot)
+):
+    """
+    Returns the retailer markers of a map zoom level merged into clusters, each with
+    its retailer count, centroid and per-provider totals (boards in the board context,
+    retailers showing the provider in the POSM context).
+    The clusters of every zoom level are built once per dataset version and filter
+    combination, so a request only selects the clusters of one level inside the bbox.
+    """
+    return await data_executor.run(
+        retailer_clusters_response, dataset, zoom, parse_bbox(bbox) if bbox else None, context, provider, boardType
+    )
+
+
+def retailer_clusters_response(
+    dataset: DatasetSnapshot, zoom: int, bbox: Optional[Tuple[float, float, float, float]],
+    context: str, provider: Optional[str], boardType: Optional[str]
+) -> Response:
+    """Serializes the clusters of one zoom level inside the bbox."""
+    hierarchy = get_retailer_clusters(dataset, context, provider, boardType)
+    clusters = hierarchy.clusters(zoom, bbox)
+    provider_values = retailer_cluster_providers()
+    counts = clusters["count"].tolist()
+    content = {
+        "zoom": zoom,
+        "count": int(clusters["count"].sum()),
+        "clusters": [
+            {
+                "latitude": latitude,
+                "longitude": longitude,
+                "count": count,
+                "providerTotals": dict(zip(provider_values, totals)),
+                "retailerId": hierarchy.ids[first] if count == 1 else None,
+            }
+            for latitude, longitude, count, totals, first in zip(
+                clusters["latitude"].tolist(), clusters["longitude"].tolist(), counts,
+                clusters["totals"].tolist(), clusters["first"].tolist(),
+            )
+        ],
+    }
+    return Response(content=serialize_response(RetailerClustersResponse, content), media_type="application/json")
+
+
+def retailer_cluster_providers() -> List[str]:
+    return [p_config["value"] for p_config in RETAILER_PROVIDERS_CONFIG if p_config["value"] != "all"]
+
+
+def get_retailer_clusters(
+    dataset: DatasetSnapshot, context: str, provider: Optional[str] = None, boardType: Optional[str] = None
+) -> ClusterHierarchy:
+    """Returns the cluster hierarchy for a filter combination, built once per dataset version."""
+    provider = None if not provider or provider == 'all' else provider
+    boardType = None if context != "board" or not boardType or boardType == 'all' else boardType
+    return dataset.derived(
+        ("retailer_clusters", context, provider, boardType),
+        lambda: build_cluster_hierarchy(dataset, context, provider, boardType),
+    )
+
+
+def build_cluster_hierarchy(dataset: DatasetSnapshot, context: str, provider: Optional[str], boardType: Optional[str]) -> ClusterHierarchy:
+    """Clusters the retailers (the first row of each, as in `/retailers`) matching the provider and board type."""
+    df_source = dataset.board if context == "board" else dataset.posm
+    provider_values = retailer_cluster_providers()
+    mask = retailers_mask(
+        dataset, context, provider=provider, province=None, district=None,
+        dsDivision=None, retailerId=None, boardType=boardType,
+    )
+    if not mask.any():
+        return ClusterHierarchy([], np.empty(0), np.empty(0), np.zeros((0, len(provider_values)), dtype=np.int64))
+    retailers_df = df_source[mask]
+    retailers_df = retailers_df[~retailers_df['PROFILE_ID'].duplicated().to_numpy()]
+
+    provider_names = [get_provider_name_from_value_for_retailers_r(value).upper() for value in provider_values]
+    if context == "board":
+        # The boards of each provider, of the requested type or of every type.
+        suffixes = BOARD_TYPE_SUFFIXES.get(boardType.lower(), []) if boardType else []
+        suffixes = suffixes or ['_NAME_BOARD', '_SIDE_BOARD', '_TIN_BOARD']
+        totals = np.stack([
+            value_matrix(retailers_df, [f"{name}{suffix}" for suffix in suffixes]).sum(axis=1)
+            for name in provider_names
+        ], axis=1)
+    else:
+        # Whether the retailer shows each provider at all.
+        totals = value_matrix(retailers_df, [f"{name}_AREA_PERCENTAGE" for name in provider_names]) > 0
+    return ClusterHierarchy(
+        [str(value) for value in retailers_df['PROFILE_ID'].tolist()],
+        retailers_df['LATITUDE'].to_numpy(dtype=np.float64),
+        retailers_df['LONGITUDE'].to_numpy(dtype=np.float64),
+        totals.astype(np.int64),
+    )
+
+
+def retailers_mask(
+    dataset: DatasetSnapshot,
+    context: str,
+    provider: Optional[str],
+    province: Optional[str],
+    district: Optional[str],
+    dsDivision: Optional[str],
+    retailerId: Optional[str],
+    boardType: Optional[str],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    near: Optional[Tuple[float, float, float]] = None,
+) -> np.ndarray:
+    """
+    Returns a boolean mask over the board or POSM rows (per `context`) that match the
+    retailer filters and have a retailer ID and coordinates.
+    """
+    # Only the frame for the requested context is loaded. It is shared by every request,
+    # so the filters below build up a boolean mask instead of copying or modifying it.
+    df_source = dataset.board if context == "board" else dataset.posm
     if df_source.empty:
-        return []
+        return np.zeros(len(df_source), dtype=bool)
 
-    retailers_filtered_df = df_source.copy()
+    # The area filters are looked up in the spatial index of this dataset version first,
+    # since a map viewport usually selects far fewer rows than the other filters.
+    mask = np.ones(len(df_source), dtype=bool)
+    if bbox is not None or near is not None:
+        spatial_index = get_spatial_index(dataset, context)
+        if bbox is not None:
+            mask &= spatial_index.mask(spatial_index.within_bbox(*bbox))
+        if near is not None:
+            mask &= spatial_index.mask(spatial_index.within_radius(*near))
+        if not mask.any():
+            return mask
 
-    # Apply boardType filter first if context is 'board'
+    # Apply boardType filter if context is 'board'
     if context == "board" and boardType and boardType != 'all':
-        retailers_filtered_df = filter_df_by_board_type(retailers_filtered_df, boardType)
-        if retailers_filtered_df.empty:
-            return []
-
-    effective_province = province or salesRegion
-    effective_district = district or salesDistrict
-
-    # Geographic filtering
-    province_col_actual = 'PROVINCE' if 'PROVINCE' in retailers_filtered_df.columns else 'SALES_REGION'
-    if effective_province and effective_province != 'all' and province_col_actual in retailers_filtered_df.columns:
-        if province_col_actual in retailers_filtered_df: # Check column existence
-            retailers_filtered_df[f"{province_col_actual}_LOWER_UNDERSCORE"] = retailers_filtered_df[province_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-            retailers_filtered_df = retailers_filtered_df[retailers_filtered_df[f"{province_col_actual}_LOWER_UNDERSCORE"] == effective_province.lower()]
-    if retailers_filtered_df.empty: return []
-
-
-    district_col_actual = 'DISTRICT' if 'DISTRICT' in retailers_filtered_df.columns else 'SALES_DISTRICT'
-    if effective_district and effective_district != 'all' and district_col_actual in retailers_filtered_df.columns:
-        if district_col_actual in retailers_filtered_df: # Check column existence
-            retailers_filtered_df[f"{district_col_actual}_LOWER_UNDERSCORE"] = retailers_filtered_df[district_col_actual].astype(str).str.lower().str.replace(' ', '_', regex=False)
-            retailers_filtered_df = retailers_filtered_df[retailers_filtered_df[f"{district_col_actual}_LOWER_UNDERSCORE"] == effective_district.lower()]
-    if retailers_filtered_df.empty: return []
-    
-    if dsDivision and dsDivision != 'all' and 'DS_DIVISION' in retailers_filtered_df.columns:
-        if 'DS_DIVISION' in retailers_filtered_df: # Check column existence
-            retailers_filtered_df["DS_DIVISION_LOWER_UNDERSCORE"] = retailers_filtered_df['DS_DIVISION'].astype(str).str.lower().str.replace(' ', '_', regex=False)
-            retailers_filtered_df = retailers_filtered_df[retailers_filtered_df["DS_DIVISION_LOWER_UNDERSCORE"] == dsDivision.lower()]
-    if retailers_filtered_df.empty: return []
+        mask &= board_type_mask(df_source, boardType)
+        if not mask.any():
+            return mask
+
+    # Geographic filtering, using the precomputed geography index of this dataset version.
+    mask &= get_geo_index(dataset, context).mask(
+        province=province, district=district, dsDivision=dsDivision
+    )
+    if not mask.any(): return mask
 
 
     # Provider-specific filtering for retailers
     if provider and provider != 'all':
         provider_name_actual = get_provider_name_from_value_for_retailers_r(provider)
-        if provider_name_actual and not retailers_filtered_df.empty:
-            condition = pd.Series(False, index=retailers_filtered_df.index)
+        if provider_name_actual:
+            condition = np.zeros(len(df_source), dtype=bool)
             if context == "board":
                 provider_prefix = provider_name_actual.upper()
                 # Define which board columns to check based on boardType filter
@@ -90,55 +261,56 @@ async def fetch_retailers_api(
                 
                 board_cols = [f"{provider_prefix}{s}" for s in board_suffixes_to_check_provider]
                 for col in board_cols:
-                    if col in retailers_filtered_df.columns:
-                        condition = condition | (pd.to_numeric(retailers_filtered_df[col], errors='coerce').fillna(0) > 0)
+                    if col in df_source.columns:
+                        condition |= positive_mask(df_source[col])
             elif context == "posm":
                 posm_col = f"{provider_name_actual.upper()}_AREA_PERCENTAGE"
-                if posm_col in retailers_filtered_df.columns:
-                    condition = pd.to_numeric(retailers_filtered_df[posm_col], errors='coerce').fillna(0) > 0
+                if posm_col in df_source.columns:
+                    condition = positive_mask(df_source[posm_col])
             
-            if condition.any():
-                 retailers_filtered_df = retailers_filtered_df[condition]
-            else: 
-                 retailers_filtered_df = pd.DataFrame(columns=retailers_filtered_df.columns)
-    if retailers_filtered_df.empty: return []
+            mask &= condition
+    if not mask.any(): return mask
 
 
     if retailerId and retailerId != 'all':
-        retailers_filtered_df['PROFILE_ID_STR'] = retailers_filtered_df['PROFILE_ID'].astype(str)
-        retailers_filtered_df = retailers_filtered_df[retailers_filtered_df['PROFILE_ID_STR'] == retailerId]
+        mask &= (df_source['PROFILE_ID'] == retailerId).to_numpy()
 
-    if retailers_filtered_df.empty:
-        return []
+    if not mask.any():
+        return mask
 
     required_cols = ['PROFILE_ID', 'PROFILE_NAME', 'LATITUDE', 'LONGITUDE']
-    if not all(col in retailers_filtered_df.columns for col in required_cols):
-        print(f"Warning: Retailer data missing one of required columns: {required_cols} after filtering. Columns available: {retailers_filtered_df.columns.tolist()}")
-        return [] 
-    
-    retailers_filtered_df['LATITUDE'] = pd.to_numeric(retailers_filtered_df['LATITUDE'], errors='coerce')
-    retailers_filtered_df['LONGITUDE'] = pd.to_numeric(retailers_filtered_df['LONGITUDE'], errors='coerce')
-    retailers_filtered_df.dropna(subset=['PROFILE_ID', 'LATITUDE', 'LONGITUDE'], inplace=True)
+    if not all(col in df_source.columns for col in required_cols):
+        print(f"Warning: Retailer data missing one of required columns: {required_cols} after filtering. Columns available: {df_source.columns.tolist()}")
+        return np.zeros(len(df_source), dtype=bool) 
     
-    if retailers_filtered_df.empty:
-        return []
-
-    unique_retailers_df = retailers_filtered_df.drop_duplicates(subset=['PROFILE_ID'])
-
-    output_retailers = []
-    for _, row_series in unique_retailers_df.iterrows():
-        row = row_series.to_dict()
-        province_val = row.get('PROVINCE') if 'PROVINCE' in row else row.get('SALES_REGION')
-        district_val = row.get('DISTRICT') if 'DISTRICT' in row else row.get('SALES_DISTRICT')
-        image_identifier_val = row.get('S3_ARN')
-
-        output_retailers.append(Retailer(
-            id=str(row['PROFILE_ID']),
-            name=str(row.get('PROFILE_NAME', 'N/A')),
-            latitude=float(row['LATITUDE']),
-            longitude=float(row['LONGITUDE']),
-            imageIdentifier=str(image_identifier_val) if pd.notna(image_identifier_val) else None,
-            province=str(province_val) if pd.notna(province_val) else None,
-            district=str(district_val) if pd.notna(district_val) else None
-        ))
-    return output_retailers
\ No newline at end of file
+    # Only rows with a retailer ID and valid coordinates can be placed on the map.
+    mask &= df_source['PROFILE_ID'].notna().to_numpy()
+    mask &= df_source['LATITUDE'].notna().to_numpy()
+    mask &= df_source['LONGITUDE'].notna().to_numpy()
+    return mask
+
+
+def build_retailers_table(dataset: DatasetSnapshot, context: str, mask: np.ndarray) -> RowTable:
+    """Builds one retailer entry per retailer ID from the rows selected by `mask`, as columns."""
+    df_source = dataset.board if context == "board" else dataset.posm
+    if not mask.any():
+        return RowTable({})
+    retailers_filtered_df = df_source[mask]
+
+    # One entry per retailer: the first of its rows.
+    unique_retailers_df = retailers_filtered_df[~retailers_filtered_df['PROFILE_ID'].duplicated().to_numpy()]
+
+    def str_column(*candidates: str) -> list:
+        # The first candidate column present is used, e.g. PROVINCE, falling back to SALES_REGION.
+        col = next((c for c in candidates if c in unique_retailers_df.columns), None)
+        return str_or_none_list(unique_retailers_df[col]) if col else [None] * len(unique_retailers_df)
+
+    return RowTable({
+        'id': [str(value) for value in unique_retailers_df['PROFILE_ID'].tolist()],
+        'name': [str(value) for value in unique_retailers_df['PROFILE_NAME'].tolist()],
+        'latitude': unique_retailers_df['LATITUDE'].to_numpy(dtype=np.float64).tolist(),
+        'longitude': unique_retailers_df['LONGITUDE'].to_numpy(dtype=np.float64).tolist(),
+        'imageIdentifier': str_column('S3_ARN'),
+        'province': str_column('PROVINCE', 'SALES_REGION'),
+        'district': str_column('DISTRICT', 'SALES_DISTRICT'),
+    })
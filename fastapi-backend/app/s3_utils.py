@@ -1,46 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
 from .config import settings
-from typing import List, Dict, Any, Optional
-# import boto3 # Uncomment for real S3
-# from botocore.exceptions import ClientError # Uncomment for real S3
 
-def generate_presigned_url(s3_arn: str, expiration: int = 3600) -> Optional[str]:
+try:
+    import boto3
+    from botocore.config import Config
+except ImportError:  # Without boto3, S3 ARNs are answered with mock (picsum) URLs.
+    boto3 = None
+
+# One S3 client per process. Creating a client is expensive (it loads the service
+# model), while signing a URL with an existing one is a local HMAC computation.
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                    config=Config(signature_version='s3v4'),
+                )
+    return _s3_client
+
+
+@lru_cache(maxsize=65536)
+def parse_s3_arn(s3_arn: str) -> Optional[Tuple[str, str]]:
+    """Splits an ARN like 'arn:aws:s3:::bucket/path/to/key.jpeg' into (bucket, key). Returns None if it isn't one."""
+    if not s3_arn or "arn:aws:s3:::" not in s3_arn:
+        return None
+    bucket_name_key = s3_arn.split(":::", 1)[1]
+    bucket_name, _, object_key = bucket_name_key.partition('/')
+    if not bucket_name or not object_key:
+        return None
+    return bucket_name, object_key
+
+
+class PresignedUrlCache:
     """
-    Generate a presigned URL for an S3 object.
-    Mocked for now. Replace with actual Boto3 logic.
+    Presigned URLs by ARN, reused until shortly before they expire.
+
+    An entry is served while more than `refresh_margin` seconds of its lifetime are left,
+    so a client never receives a URL that is about to stop working; after that it is
+    signed again (replacing the old entry). The cache holds at most `max_entries` URLs
+    and drops the least recently used ones first.
+    """
+
+    def __init__(self, max_entries: int, refresh_margin: int):
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, s3_arn: str, expiration: int) -> Optional[Tuple[str, float]]:
+        """Returns the cached URL and its expiry time, or None if it must be signed (again)."""
+        key = (s3_arn, expiration)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] - time.time() <= self.refresh_margin:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, s3_arn: str, expiration: int, url: str, signed_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        key = (s3_arn, expiration)
+        with self._lock:
+            self._entries[key] = (url, signed_at + expiration)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "maxEntries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+presigned_url_cache = PresignedUrlCache(
+    max_entries=settings.S3_URL_CACHE_MAX_ENTRIES,
+    refresh_margin=settings.S3_URL_REFRESH_MARGIN_SECONDS,
+)
+
+
+def _mock_url(s3_arn: str) -> str:
+    # Extract a unique part from ARN for picsum seed
+    unique_part = s3_arn.split('/')[-1] if '/' in s3_arn else "image"
+    return f"https://picsum.photos/seed/{unique_part.replace('.jpeg','').replace('.png','')}/400/300"
+
+
+def presign(s3_arn: str, expiration: int = 3600) -> Tuple[str, Optional[float]]:
+    """
+    Returns a URL for an image identifier and the time it stops working (None for
+    URLs that don't expire, such as the mock and placeholder ones).
+    S3 URLs are signed locally with the shared client and cached until shortly before they expire.
     """
-    if not s3_arn or not isinstance(s3_arn, str) or "arn:aws:s3:::" not in s3_arn:
+    if not s3_arn or not isinstance(s3_arn, str) or parse_s3_arn(s3_arn) is None:
         # If ARN is invalid or placeholder, return a generic placeholder
         object_key_part = s3_arn.split('/')[-1] if s3_arn else "placeholder_image"
-        return f"https://picsum.photos/seed/{object_key_part}/400/300"
+        return f"https://picsum.photos/seed/{object_key_part}/400/300", None
 
-    try:
-        # --- Real Boto3 Logic (Example) ---
-        # s3_client = boto3.client(
-        #     's3',
-        #     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        #     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        #     region_name=settings.AWS_REGION
-        # )
-        # arn_parts = s3_arn.split(":::")
-        # bucket_name_key = arn_parts[1]
-        # bucket_name = bucket_name_key.split('/')[0]
-        # object_key = '/'.join(bucket_name_key.split('/')[1:])
-
-        # response = s3_client.generate_presigned_url(
-        #     'get_object',
-        #     Params={'Bucket': bucket_name, 'Key': object_key},
-        #     ExpiresIn=expiration
-        # )
-        # return response
-        # --- End Real Boto3 Logic ---
-        
-        # Mock implementation:
-        # Extract a unique part from ARN for picsum seed
-        unique_part = s3_arn.split('/')[-1] if '/' in s3_arn else "image"
-        return f"https://picsum.photos/seed/{unique_part.replace('.jpeg','').replace('.png','')}/400/300"
+    if boto3 is None:
+        return _mock_url(s3_arn), None
+
+    cached = presigned_url_cache.get(s3_arn, expiration)
+    if cached is not None:
+        return cached
 
+    try:
+        bucket_name, object_key = parse_s3_arn(s3_arn)
+        signed_at = time.time()
+        url = get_s3_client().generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': object_key},
+            ExpiresIn=expiration
+        )
+        presigned_url_cache.put(s3_arn, expiration, url, signed_at)
+        return url, signed_at + expiration
     except Exception as e:
         print(f"Error generating presigned URL for {s3_arn}: {e}")
         # Fallback for any error during S3 interaction, or if it's not a valid S3 ARN
         object_key_part = s3_arn.split('/')[-1] if s3_arn else "error_image"
-        return f"https://picsum.photos/seed/{object_key_part}/400/300"
\ No newline at end of file
+        return f"https://picsum.photos/seed/{object_key_part}/400/300", None
+
+
+def generate_presigned_url(s3_arn: str, expiration: int = 3600) -> Optional[str]:
+    """
+    Generate a presigned URL for an S3 object.
+    The URL is signed locally with the shared client and cached until shortly before it expires.
+    Without boto3 installed, a mock (picsum) URL is returned instead.
+    """
+    return presign(s3_arn, expiration)[0]
+
+
+def generate_presigned_urls(identifiers: Iterable[Optional[str]], expiration: int = 3600) -> Tuple[Dict[str, str], Optional[float]]:
+    """
+    Signs many identifiers at once, each distinct one only once (missing ones are skipped).
+    Returns the URL of every identifier and the earliest time one of them expires.
+    """
+    urls: Dict[str, str] = {}
+    earliest_expiry: Optional[float] = None
+    for identifier in dict.fromkeys(i for i in identifiers if i):
+        url, expires_at = presign(identifier, expiration)
+        urls[identifier] = url
+        if expires_at is not None and (earliest_expiry is None or expires_at < earliest_expiry):
+            earliest_expiry = expires_at
+    return urls, earliest_expiry
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# Column prefixes of the four providers, as they appear in both CSV files.
+PROVIDER_PREFIXES = ["DIALOG", "MOBITEL", "HUTCH", "AIRTEL"]
+BOARD_SUFFIXES = ["_NAME_BOARD", "_SIDE_BOARD", "_TIN_BOARD"]
+
+BOARD_COUNT_COLUMNS = [f"{p}{s}" for s in BOARD_SUFFIXES for p in PROVIDER_PREFIXES] + [
+    "TOTAL_NAME_BOARD_COUNT", "TOTAL_SIDE_BOARD_COUNT", "TOTAL_TIN_BOARD_COUNT",
+]
+POSM_COUNT_COLUMNS = [f"{p}_COUNT" for p in PROVIDER_PREFIXES]
+PERCENTAGE_COLUMNS = [f"{p}_AREA_PERCENTAGE" for p in PROVIDER_PREFIXES]
+
+GEOGRAPHY_COLUMNS = [
+    "PROVINCE", "DISTRICT", "DS_DIVISION", "GN_DIVISION",
+    "SALES_DISTRICT", "SALES_REGION", "SALES_AREA",
+]
+
+# Nullable integer dtype used for counts and capture phases. Missing values stay
+# missing (the API returns them as null) instead of being turned into 0 or a float.
+COUNT_DTYPE = "Int16"
+PERCENTAGE_DTYPE = "float32"
+COORDINATE_DTYPE = "float64"
+GEOGRAPHY_DTYPE = "category"
+
+# The retailer key. It is read as text and normalized once, so routers can compare it
+# with the `retailerId` query parameter directly.
+PROFILE_ID_COLUMN = "PROFILE_ID"
+
+BOARD_SCHEMA: Dict[str, str] = {
+    **{col: COUNT_DTYPE for col in BOARD_COUNT_COLUMNS},
+    **{col: GEOGRAPHY_DTYPE for col in GEOGRAPHY_COLUMNS},
+    "LATITUDE": COORDINATE_DTYPE,
+    "LONGITUDE": COORDINATE_DTYPE,
+    "CAPTURE_PHASE": COUNT_DTYPE,
+}
+
+POSM_SCHEMA: Dict[str, str] = {
+    **{col: COUNT_DTYPE for col in POSM_COUNT_COLUMNS},
+    **{col: PERCENTAGE_DTYPE for col in PERCENTAGE_COLUMNS},
+    **{col: GEOGRAPHY_DTYPE for col in GEOGRAPHY_COLUMNS + ["SHAPEISO", "SHAPEID"]},
+    "LATITUDE": COORDINATE_DTYPE,
+    "LONGITUDE": COORDINATE_DTYPE,
+    "CAPTURE_PHASE": COUNT_DTYPE,
+}
+
+# Passed to `pd.read_csv` so that columns which must stay text are never parsed as numbers.
+CSV_READ_DTYPES = {PROFILE_ID_COLUMN: str}
+
+
+def canonical_profile_id(values: pd.Series) -> pd.Series:
+    """
+    Normalizes retailer IDs to a canonical string key: surrounding whitespace and a
+    trailing '.0' (left over when an ID column was once saved as floats) are removed,
+    and empty values become missing.
+    """
+    text = values.astype("string").str.strip().str.replace(r"\.0+$", "", regex=True)
+    text = text.mask(text == "")
+    return text.astype(object).where(text.notna(), np.nan)
+
+
+def _coerce_counts(values: pd.Series, dtype: str, issues: List[str], label: str) -> pd.Series:
+    numeric = pd.to_numeric(values, errors="coerce")
+    invalid = numeric.isna() & values.notna()
+    if invalid.any():
+        examples = values[invalid].astype(str).unique()[:3].tolist()
+        issues.append(f"{label}: {int(invalid.sum())} non-numeric value(s) treated as missing, e.g. {examples}")
+
+    info = np.iinfo(pd.api.types.pandas_dtype(dtype).numpy_dtype)
+    out_of_range = (numeric < 0) | (numeric > info.max)
+    if out_of_range.any():
+        issues.append(f"{label}: {int(out_of_range.sum())} negative or too large value(s) treated as missing")
+        numeric = numeric.mask(out_of_range)
+
+    fractional = numeric.notna() & (numeric != np.trunc(numeric))
+    if fractional.any():
+        issues.append(f"{label}: {int(fractional.sum())} fractional value(s) truncated to whole numbers")
+        numeric = np.trunc(numeric)
+
+    return numeric.astype(dtype)
+
+
+def _coerce_floats(values: pd.Series, dtype: str, issues: List[str], label: str, lower=None, upper=None) -> pd.Series:
+    numeric = pd.to_numeric(values, errors="coerce")
+    invalid = numeric.isna() & values.notna()
+    if invalid.any():
+        examples = values[invalid].astype(str).unique()[:3].tolist()
+        issues.append(f"{label}: {int(invalid.sum())} non-numeric value(s) treated as missing, e.g. {examples}")
+    if lower is not None and upper is not None:
+        out_of_range = (numeric < lower) | (numeric > upper)
+        if out_of_range.any():
+            issues.append(f"{label}: {int(out_of_range.sum())} value(s) outside [{lower}, {upper}]")
+    return numeric.astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str], name: str) -> pd.DataFrame:
+    """
+    Converts the columns of a freshly read CSV to their declared dtypes and reports
+    any values that don't fit, once, at load time. Columns that are not in the
+    schema are left as pandas inferred them.
+    """
+    if df.empty:
+        return df
+
+    issues: List[str] = []
+    missing = [col for col in schema if col not in df.columns]
+    if missing:
+        issues.append(f"missing column(s) {missing}")
+
+    converted = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        label = f"{name}.{col}"
+        if dtype == COUNT_DTYPE:
+            converted[col] = _coerce_counts(df[col], dtype, issues, label)
+        elif dtype == PERCENTAGE_DTYPE:
+            converted[col] = _coerce_floats(df[col], dtype, issues, label, lower=0, upper=100)
+        elif dtype == COORDINATE_DTYPE:
+            converted[col] = _coerce_floats(df[col], dtype, issues, label)
+        elif dtype == GEOGRAPHY_DTYPE:
+            # Blank names are the same as missing ones.
+            text = df[col].astype("string").str.strip()
+            converted[col] = text.mask(text == "").astype(object).where(text.notna(), np.nan).astype(dtype)
+        else:
+            converted[col] = df[col].astype(dtype)
+
+    if PROFILE_ID_COLUMN in df.columns:
+        converted[PROFILE_ID_COLUMN] = canonical_profile_id(df[PROFILE_ID_COLUMN])
+        missing_ids = int(converted[PROFILE_ID_COLUMN].isna().sum())
+        if missing_ids:
+            issues.append(f"{name}.{PROFILE_ID_COLUMN}: {missing_ids} row(s) without a retailer ID")
+
+    df = df.assign(**converted)
+
+    for issue in issues:
+        print(f"Warning: data check for {name}: {issue}")
+    return df
+
+
+def positive_mask(values: pd.Series) -> np.ndarray:
+    """Returns a boolean mask of the values greater than 0; missing values count as 0."""
+    return values.gt(0).to_numpy(dtype=bool, na_value=False)
+
+
+def normalize_geo_name(value) -> str:
+    """Turns a name like "Western Province" into the filter value used by the frontend ("western_province")."""
+    return str(value).lower().replace(' ', '_')
+
+
+def str_or_none_list(values: pd.Series) -> list:
+    """Converts a column to a list of Python strings, with None for missing values."""
+    return values.astype(str).astype(object).where(values.notna().to_numpy(), None).tolist()
+
+
+def int_or_none_list(values: pd.Series) -> list:
+    """Converts a numeric column to a list of Python ints, with None for missing values."""
+    if pd.api.types.is_float_dtype(values.dtype):
+        values = np.trunc(values).astype("Int64")
+    return values.astype(object).where(values.notna().to_numpy(), None).tolist()
+
+
+def value_matrix(df: pd.DataFrame, columns: List[str], dtype=np.float64) -> np.ndarray:
+    """
+    Stacks numeric columns into an (n_rows, n_columns) matrix, with missing values
+    (and missing columns) as 0, for whole-column comparisons such as an argmax.
+    """
+    matrix = np.zeros((len(df), len(columns)), dtype=dtype)
+    for i, col in enumerate(columns):
+        if col in df.columns:
+            matrix[:, i] = df[col].to_numpy(dtype=dtype, na_value=0)
+    return matrix
+
+
+def count_matrix(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """Same as `value_matrix`, for count columns (as int32)."""
+    return value_matrix(df, columns, dtype=np.int32)
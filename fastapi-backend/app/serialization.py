@@ -0,0 +1,137 @@
+import json
+import typing
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+
+from app.cache import response_cache, serialize_list, serialize_response
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # Without orjson every response takes the validated path.
+    orjson = None
+
+
+def trusted_serialization_enabled() -> bool:
+    return settings.TRUSTED_SERIALIZATION and orjson is not None
+
+
+@lru_cache(maxsize=None)
+def _field_defaults(model_cls: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    """The fields of a model in declaration order (the order pydantic writes them), with their defaults."""
+    return tuple((name, field.get_default(call_default_factory=True)) for name, field in model_cls.model_fields.items())
+
+
+def row_completer(row_model: Type[BaseModel], exclude: Optional[Set[str]] = None) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Returns a function that turns a row dict from a RowTable into the dict the row model
+    would dump: every field in declaration order, with the model's default for the
+    fields the row doesn't set, and without the `exclude`d fields.
+    """
+    fields = [(name, default) for name, default in _field_defaults(row_model) if not exclude or name not in exclude]
+    return lambda row: {name: row.get(name, default) for name, default in fields}
+
+
+def _rows_field_model(model_cls: Type[BaseModel], rows_field: str) -> Type[BaseModel]:
+    """The row model of a `List[Row]` field, e.g. BoardData for FetchBoardsResponse.data."""
+    return typing.get_args(model_cls.model_fields[rows_field].annotation)[0]
+
+
+def serialize_table_response(
+    model_cls: Type[BaseModel], rows_field: str, table, positions: Optional[Iterable[int]] = None,
+    exclude: Optional[Set[str]] = None, **fields: Any
+) -> bytes:
+    """
+    Serializes a response model whose `rows_field` holds the rows of a RowTable
+    (e.g. FetchBoardsResponse with its `data`), the other fields being given as keywords.
+
+    The table columns are built by the routers with the exact Python types of the row
+    model (str/int/float/None), so in trusted mode the rows are not validated again:
+    they are completed with the model defaults and written by orjson straight from the
+    columns. Otherwise this is the same as `serialize_response`. `exclude` leaves out
+    row fields, e.g. the image URLs that weren't asked for.
+    """
+    if not trusted_serialization_enabled():
+        content = {rows_field: table.rows(positions), **fields}
+        return serialize_response(model_cls, content, exclude={rows_field: {"__all__": exclude}} if exclude else None)
+    complete = row_completer(_rows_field_model(model_cls, rows_field), exclude)
+    content = {
+        name: [complete(row) for row in table.iter_rows(positions)] if name == rows_field else to_jsonable_python(fields[name])
+        for name, _ in _field_defaults(model_cls)
+    }
+    return orjson.dumps(content)
+
+
+def serialize_table_list(row_model: Type[BaseModel], table, positions: Optional[Iterable[int]] = None) -> bytes:
+    """Same as `serialize_table_response`, for a response that is a plain list of `row_model` items."""
+    if not trusted_serialization_enabled():
+        return serialize_list(row_model, table.iter_rows(positions))
+    complete = row_completer(row_model)
+    return orjson.dumps([complete(row) for row in table.iter_rows(positions)])
+
+
+def serialize_row(row_model: Type[BaseModel], exclude: Optional[Set[str]] = None) -> Callable[[Dict[str, Any]], bytes]:
+    """Returns a function serializing one row dict as `row_model` (one NDJSON line, without the newline)."""
+    if not trusted_serialization_enabled():
+        return lambda row: row_model.model_validate(row).model_dump_json(exclude=exclude).encode("utf-8")
+    complete = row_completer(row_model, exclude)
+    return lambda row: orjson.dumps(complete(row))
+
+
+def _same_json(a: Any, b: Any) -> bool:
+    """Compares decoded JSON values, including the number types (1 and 1.0 differ) and the key order."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return list(a) == list(b) and all(_same_json(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same_json(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def contract_check() -> None:
+    """
+    Checks that the trusted path writes the same JSON as the validated path for the
+    row-heavy endpoints, over a range of filters. Run with `python -m app.serialization`.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    if orjson is None:
+        print("orjson is not installed; every response takes the validated path.")
+        return
+    requests = [
+        "/boards", "/boards?provider=dialog", "/boards?boardType=tin&limit=5", "/boards?sort=-DIALOG_NAME_BOARD",
+        "/boards?include=imageUrls&limit=20", "/boards?salesRegion=northern&format=ndjson",
+        "/posm/general", "/posm/general?provider=hutch", "/posm/general?sort=-visibilityPercentage&limit=10",
+        "/posm/general?include=imageUrls&limit=20", "/posm/general?format=ndjson",
+        "/retailers", "/retailers?context=posm", "/retailers?provider=mobitel&format=ndjson",
+    ]
+    original = settings.TRUSTED_SERIALIZATION
+    failures = 0
+    with TestClient(app) as client:
+        for path in requests:
+            url = settings.API_V1_STR + path
+            bodies = []
+            for trusted in (False, True):
+                settings.TRUSTED_SERIALIZATION = trusted
+                # The two paths must not share a cached body.
+                response_cache.clear()
+                response = client.get(url)
+                if "ndjson" in path:
+                    bodies.append([json.loads(line) for line in response.text.splitlines()])
+                else:
+                    bodies.append(response.json())
+            same = _same_json(*bodies)
+            failures += not same
+            print(f"{'ok  ' if same else 'DIFF'} {path}")
+    settings.TRUSTED_SERIALIZATION = original
+    if failures:
+        raise SystemExit(f"{failures} of {len(requests)} responses differ between the trusted and the validated path")
+
+
+if __name__ == "__main__":
+    contract_check()
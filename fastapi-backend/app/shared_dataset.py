@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+try:
+    import pyarrow as pa
+except ImportError:  # Without pyarrow every worker builds its own frames.
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # No file locks (Windows): every worker builds its own frames.
+    fcntl = None
+
+# Bump when the layout of the segments changes, so old segments are not attached to.
+SEGMENT_FORMAT_VERSION = 1
+
+# The segment each frame was last attached to, for /diagnostics/dataset.
+segment_report: Dict[str, Dict[str, Any]] = {}
+
+# The masked (nullable) pandas arrays, by the kind of their values.
+_MASKED_ARRAYS = {"i": pd.arrays.IntegerArray, "u": pd.arrays.IntegerArray, "f": pd.arrays.FloatingArray, "b": pd.arrays.BooleanArray}
+
+
+class SegmentError(Exception):
+    """A shared segment couldn't be created, written or mapped (as opposed to the frame failing to build)."""
+
+
+# What writing or mapping a segment raises: file errors, and Arrow or layout errors for a damaged file.
+SEGMENT_ERRORS = (OSError, ValueError, KeyError) + ((pa.ArrowException,) if pa is not None else ())
+
+
+def sharing_enabled() -> bool:
+    return settings.SHARED_DATASET_ENABLED and pa is not None and fcntl is not None
+
+
+def segment_key(name: str, sources: Iterable[Path]) -> str:
+    """
+    Identifies the frame a segment holds: the files it is built from (by modification
+    time and size) and the code that builds it. Every worker of one deployment computes
+    the same key for the same files, so they all find the segment the first one built.
+    """
+    # app.conditional imports the data loader, which imports this module.
+    from app.conditional import BUILD_ID
+
+    parts: List[Any] = [name, SEGMENT_FORMAT_VERSION, pd.__version__, BUILD_ID]
+    for path in sources:
+        try:
+            stat = path.stat()
+            parts.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            parts.append((str(path), None))
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:16]
+
+
+def _encode_column(series: pd.Series) -> Tuple[Dict[str, Any], List["pa.Array"]]:
+    """
+    Returns the description of a column and the Arrow arrays holding its data, laid out
+    so that `_decode_column` can wrap them without copying: plain values without Arrow
+    null bitmaps (NaN and NaT stay values, masked arrays keep their mask as bytes), and
+    categories as their codes.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) and all(isinstance(value, str) for value in dtype.categories):
+        return {"kind": "category", "categories": list(dtype.categories), "ordered": bool(dtype.ordered)}, [pa.array(series.cat.codes.to_numpy())]
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+        return {"kind": "string", "dtype": str(dtype)}, [pa.array(series.array)]
+    if isinstance(series.array, tuple(_MASKED_ARRAYS.values())):
+        mask = series.isna().to_numpy()
+        values = series.to_numpy(dtype=dtype.numpy_dtype, na_value=False if dtype.kind == "b" else 0)
+        stored = values.view(np.uint8) if dtype.kind == "b" else values
+        return {"kind": "masked", "dtype": str(dtype), "values": values.dtype.str}, [pa.array(stored), pa.array(mask.view(np.uint8))]
+    if isinstance(dtype, np.dtype) and dtype.kind in "iufbMm":
+        values = series.to_numpy()
+        stored = values.view(np.uint8) if dtype.kind == "b" else values.view(np.int64) if dtype.kind in "Mm" else values
+        return {"kind": "numpy", "dtype": dtype.str}, [pa.array(stored)]
+    # Anything else (e.g. the object column of profile IDs) is converted on attach, per worker.
+    return {"kind": "arrow", "dtype": str(dtype)}, [pa.array(series, from_pandas=True)]
+
+
+def _decode_column(spec: Dict[str, Any], arrays: List["pa.Array"]) -> Any:
+    kind = spec["kind"]
+    if kind == "category":
+        codes = arrays[0].to_numpy(zero_copy_only=True)
+        dtype = pd.CategoricalDtype(spec["categories"], ordered=spec["ordered"])
+        return pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+    if kind == "string":
+        return pd.arrays.ArrowStringArray(pa.chunked_array(arrays), dtype=pd.api.types.pandas_dtype(spec["dtype"]))
+    if kind == "masked":
+        values_dtype = np.dtype(spec["values"])
+        values = arrays[0].to_numpy(zero_copy_only=True).view(values_dtype)
+        mask = arrays[1].to_numpy(zero_copy_only=True).view(bool)
+        return _MASKED_ARRAYS[values_dtype.kind](values, mask)
+    if kind == "numpy":
+        return arrays[0].to_numpy(zero_copy_only=True).view(np.dtype(spec["dtype"]))
+    values = arrays[0].to_pandas()
+    return values.astype(object) if spec["dtype"] == "object" else values.astype(spec["dtype"])
+
+
+def frame_to_table(df: pd.DataFrame) -> "pa.Table":
+    """Lays out a frame (with a default RangeIndex) as an Arrow table for `table_to_frame`."""
+    specs, fields = [], {}
+    for i, name in enumerate(df.columns):
+        spec, arrays = _encode_column(df[name])
+        specs.append({"name": name, **spec})
+        for j, array in enumerate(arrays):
+            fields[f"{i}.{j}"] = array
+    table = pa.table(fields) if fields else pa.table({})
+    return table.replace_schema_metadata({"frame": json.dumps({"rows": len(df), "columns": specs})})
+
+
+def table_to_frame(table: "pa.Table") -> pd.DataFrame:
+    """
+    Rebuilds a frame written by `frame_to_table`. The columns wrap the table's buffers,
+    so a table read from a memory-mapped segment gives a frame backed by the segment.
+    The arrays are read-only, as the frames of a snapshot must be anyway.
+    """
+    layout = json.loads(table.schema.metadata[b"frame"])
+    columns = {}
+    for i, spec in enumerate(layout["columns"]):
+        arrays = []
+        j = 0
+        while f"{i}.{j}" in table.column_names:
+            column = table.column(f"{i}.{j}")
+            # One chunk is used as it is; combining chunks would copy them.
+            arrays.append(column.chunk(0) if column.num_chunks == 1 else column.combine_chunks())
+            j += 1
+        columns[spec["name"]] = _decode_column(spec, arrays)
+    # copy=False: the columns stay separate blocks over the shared buffers.
+    return pd.DataFrame(columns, index=pd.RangeIndex(layout["rows"]), copy=False)
+
+
+def _can_share(df: pd.DataFrame) -> bool:
+    index = df.index
+    return not df.empty and isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+
+
+class SharedSegment:
+    """
+    One frame published in shared memory, as an uncompressed Arrow IPC file on a tmpfs
+    (SHARED_DATASET_DIR, /dev/shm by default).
+
+    The first worker to need a frame takes a file lock, builds the frame and writes the
+    segment; the others wait on the lock and then map the segment. Every worker maps
+    it read-only, so the pages exist once however many workers use them. Publishing a
+    new segment for a frame removes the older ones from the directory; a worker still
+    serving an old snapshot keeps its mapping until it lets the snapshot go.
+    """
+
+    def __init__(self, name: str, key: str, directory: Path):
+        self.name = name
+        self.key = key
+        self.directory = directory
+        self.path = directory / f"{name}-{key}.arrow"
+        self.lock_path = directory / f"{name}.lock"
+
+    def attach(self) -> pd.DataFrame:
+        # The mapping stays open for as long as the frame's arrays use it.
+        return table_to_frame(pa.ipc.open_file(pa.memory_map(str(self.path), "r")).read_all())
+
+    def publish(self, df: pd.DataFrame) -> None:
+        tmp = self.path.with_suffix(f".arrow.{os.getpid()}.tmp")
+        table = frame_to_table(df)
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, self.path)
+        # Older segments, and files left half-written by a worker that died while publishing.
+        for old in [*self.directory.glob(f"{self.name}-*.arrow"), *self.directory.glob(f"{self.name}-*.tmp")]:
+            if old != self.path:
+                old.unlink(missing_ok=True)
+
+    def get_or_publish(self, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Maps the segment, building and publishing it first if no worker has yet.
+        Errors of `build` propagate as they are; errors of the segment itself raise
+        SegmentError, unless the frame was already built here and can be served as it is.
+        """
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            lock = open(self.lock_path, "a")
+        except OSError as e:
+            raise SegmentError(e) from e
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                started = time.perf_counter()
+                built: Optional[pd.DataFrame] = None
+                if not self.path.exists():
+                    built = build()
+                    if not _can_share(built):
+                        return built
+                    try:
+                        self.publish(built)
+                    except SEGMENT_ERRORS as e:
+                        print(f"Warning: could not publish the shared segment for {self.name}, keeping it in this worker: {e}")
+                        return built
+                try:
+                    df = self.attach()
+                    size = self.path.stat().st_size
+                except SEGMENT_ERRORS as e:
+                    if built is None:
+                        raise SegmentError(e) from e
+                    print(f"Warning: could not map the shared segment for {self.name}, keeping it in this worker: {e}")
+                    return built
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        segment_report[self.name] = {
+            "segment": self.path.name, "bytes": size, "publishedHere": built is not None,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+        return df
+
+
+def shared_frame(name: str, sources: Iterable[Path], build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Returns the frame `name` built from `sources`, from shared memory when sharing is
+    enabled: built by the first worker, mapped by the rest. Falls back to building it
+    in this process whenever the segment can't be used; `build` runs at most once.
+    """
+    if not sharing_enabled():
+        return build()
+    segment = SharedSegment(name, segment_key(name, sources), Path(settings.SHARED_DATASET_DIR))
+    try:
+        return segment.get_or_publish(build)
+    except SegmentError as e:
+        # A directory that can't be written, a segment that can't be mapped or read, and the like.
+        print(f"Warning: could not use the shared segment for {name}, loading it in this worker: {e}")
+        return build()
+
+
+def publish_dataset() -> None:
+    """
+    Builds the shared segments of the current source files, so that the workers started
+    afterwards only map them. Run with `python -m app.shared_dataset` before starting
+    uvicorn with several workers.
+    """
+    from app.data_loader import load_dataframes
+    # Run as a script this module is `__main__`; the data loader reports to `app.shared_dataset`.
+    from app.shared_dataset import segment_report as loader_report
+
+    if not sharing_enabled():
+        print("The shared dataset is disabled (SHARED_DATASET_ENABLED, or pyarrow/fcntl missing).")
+        return
+    load_dataframes()
+    for name, report in loader_report.items():
+        print(f"{name}: {report['segment']} ({report['bytes'] / 1e6:.1f} MB) in {settings.SHARED_DATASET_DIR}")
+
+
+if __name__ == "__main__":
+    publish_dataset()
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.executors import BoundedExecutor
+
+
+def test_cancelled_queued_call_releases_its_slot():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=2)
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(ran.append, "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["queued"] == 1
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert pool.stats()["queued"] == 0
+
+        release.set()
+        await running
+        # The slot is free again: the queue takes as many calls as before.
+        assert await asyncio.gather(*(pool.run(lambda: True) for _ in range(3))) == [True] * 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    stats = pool.stats()
+    assert ran == []
+    assert (stats["active"], stats["queued"], stats["cancelled"]) == (0, 0, 1)
+
+
+def test_full_queue_is_rejected_with_503():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(lambda: None)
+        assert error.value.status_code == 503
+        release.set()
+        await running
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert pool.stats()["rejected"] == 1
@@ -7,6 +7,7 @@ import {
   ImageInfo,
   GeoJsonCollection,
   FilterOption,
+  FilterFacets,
   BoardFiltersState,
   PosmGeneralFiltersState,
   ProviderMetric,
@@ -94,6 +95,23 @@ export const fetchDsDivisions = async (provider?: string, province?: string, dis
   }
 };
 
+// All three geography levels (with row counts) for the current filters, in one request.
+export const fetchFilterFacets = async (provider?: string, province?: string, district?: string, context: 'board' | 'posm' = 'board', boardType?: string): Promise<FilterFacets> => {
+  console.log(`Fetching filter facets (LIVE) for provider: ${provider}, province: ${province}, district: ${district}, context: ${context}, boardType: ${boardType}`);
+  try {
+    const params: any = { context };
+    if (provider && provider !== 'all') params.provider = provider;
+    if (province && province !== 'all') params.province = province;
+    if (district && district !== 'all') params.district = district;
+    if (context === 'board' && boardType && boardType !== 'all') params.boardType = boardType;
+    const response = await apiClient.get('/options/facets', { params });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch filter facets:", error);
+    return { provinces: [], districts: [], dsDivisions: [] };
+  }
+};
+
 export const fetchRetailers = async (filters: any, context: 'board' | 'posm' = 'board'): Promise<Retailer[]> => {
     console.log(`Fetching retailers with filters (LIVE) for ${context}:`, filters);
     try {
@@ -167,6 +185,20 @@ export const fetchImageInfo = async (imageIdentifier: string): Promise<ImageInfo
   }
 };
 
+export const fetchImageInfoBatch = async (imageIdentifiers: string[]): Promise<Record<string, ImageInfo>> => {
+  const identifiers = Array.from(new Set(imageIdentifiers.filter(Boolean)));
+  if (identifiers.length === 0) {
+    return {};
+  }
+  try {
+    const response = await apiClient.post('/image-info/batch', { identifiers });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch image info batch:", error);
+    return {};
+  }
+};
+
 export const fetchGeoDistricts = async (): Promise<GeoJsonCollection> => {
   console.log('Fetching GeoJSON for districts (LIVE)');
   try {
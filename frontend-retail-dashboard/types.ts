@@ -7,6 +7,16 @@ export interface FilterOption {
   label: string;
 }
 
+export interface FacetOption extends FilterOption {
+  count: number; // Number of matching rows
+}
+
+export interface FilterFacets {
+  provinces: FacetOption[];
+  districts: FacetOption[];
+  dsDivisions: FacetOption[];
+}
+
 export interface Retailer {
   id: string;
   name:string;
@@ -51,6 +61,8 @@ export interface BoardData {
   // For Dual Image Display (if you plan to use specific board images)
   originalBoardImageIdentifier?: string;
   detectedBoardImageIdentifier?: string;
+  originalBoardImageUrl?: string | null; // Only with include=imageUrls
+  detectedBoardImageUrl?: string | null;
   
   [key: string]: any; // Allows any other properties if needed for full flexibility
 }
@@ -79,6 +91,8 @@ export interface PosmData {
 
   originalPosmImageIdentifier?: string; // S3_ARN from posm.csv
   detectedPosmImageIdentifier?: string; // INF_S3_ARN from posm.csv for the main detected object
+  originalPosmImageUrl?: string | null; // Only with include=imageUrls
+  detectedPosmImageUrl?: string | null;
 
   [key: string]: any; // For flexibility if backend sends more fields not strictly typed here
 }